@@ -0,0 +1,86 @@
+"""Admin endpoints: opt-in production profiling (requires ADMIN_TOKEN)."""
+import secrets
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response
+
+from ..config import ADMIN_TOKEN, ADMIN_TOKEN_HEADER, PROFILER_SAMPLE_INTERVAL_MS
+from ..services.profiler import PROFILER
+
+router = APIRouter()
+
+_EXPORT_TYPES = {
+    "pstats": ("application/octet-stream", "profile.pstats"),
+    "text": ("text/plain; charset=utf-8", "profile.txt"),
+    "collapsed": ("text/plain; charset=utf-8", "profile.collapsed"),
+    "memory": ("text/plain; charset=utf-8", "tracemalloc.txt"),
+}
+
+
+def require_admin(x_admin_token: Optional[str] = Header(None, alias=ADMIN_TOKEN_HEADER)):
+    """Admin endpoints are hidden (404) unless ADMIN_TOKEN is configured."""
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not x_admin_token or not secrets.compare_digest(x_admin_token, ADMIN_TOKEN):
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+
+
+@router.post("/profile/start", dependencies=[Depends(require_admin)])
+async def start_profile(
+    mode: str = Query("cprofile", description="cprofile or sample"),
+    requests: Optional[int] = Query(10, description="cprofile: number of requests to profile"),
+    seconds: Optional[float] = Query(None, description="Time window in seconds"),
+    trace_memory: bool = Query(False, description="Also record a tracemalloc snapshot"),
+):
+    """Arm the profiler for the next N requests and/or a time window."""
+    try:
+        return PROFILER.start(
+            mode=mode,
+            requests=requests,
+            seconds=seconds,
+            trace_memory=trace_memory,
+            sample_interval=PROFILER_SAMPLE_INTERVAL_MS / 1000.0,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+
+@router.post("/profile/stop", dependencies=[Depends(require_admin)])
+async def stop_profile():
+    """Finish the running session early."""
+    try:
+        return PROFILER.stop()
+    except LookupError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+
+@router.get("/profile/status", dependencies=[Depends(require_admin)])
+async def profile_status():
+    status = PROFILER.status()
+    if status is None:
+        raise HTTPException(status_code=404, detail="No profiling session")
+    return status
+
+
+@router.get("/profile/download", dependencies=[Depends(require_admin)])
+async def download_profile(
+    format: str = Query("pstats", description="pstats, text, collapsed or memory"),
+):
+    """Download the finished session's output."""
+    if format not in _EXPORT_TYPES:
+        raise HTTPException(status_code=400, detail=f"Unknown format. Use one of {list(_EXPORT_TYPES)}")
+    PROFILER.status()  # finalize an expired cProfile session
+    try:
+        body = PROFILER.export(format)
+    except LookupError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    media_type, filename = _EXPORT_TYPES[format]
+    return Response(
+        content=body,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
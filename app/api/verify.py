@@ -1,12 +1,29 @@
-"""Face verification API: verify 3 images (same person) and optional store."""
+"""Face verification API: verify 3 images (same person), optional store, bulk jobs."""
+import asyncio
+import itertools
 import logging
+import shutil
+import tempfile
 import time
-from typing import List, Optional
+import zipfile
+from contextlib import nullcontext
+from typing import IO, AsyncIterator, Dict, Iterator, List, Optional, Tuple
 
 import numpy as np
-from fastapi import APIRouter, File, Form, HTTPException, UploadFile
-
+from fastapi import APIRouter, File, Form, HTTPException, Query, Request, UploadFile
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+
+from ..config import (
+    BULK_CONCURRENCY,
+    FACE_THUMBNAIL_QUALITY,
+    FACE_THUMBNAIL_SIZE,
+    PRELOAD_MODELS,
+    VERIFY_EARLY_EXIT,
+)
 from ..schemas.response import (
+    BulkJobResult,
+    CompactVerificationResponse,
     ImageAnalysis,
     QualityCheck,
     StoredImageInfo,
@@ -14,12 +31,23 @@ from ..schemas.response import (
     VerificationResponse,
     VerifyAndStoreResponse,
 )
+from ..services.admission import LIMITER
+from ..services.bulk import BulkJob, iter_archive_jobs, iter_manifest_jobs
+from ..services.cache import get_cache
+from ..services.deadline import check_deadline
 from ..services.embedding import EmbeddingExtractor
 from ..services.face_detector import FaceDetector
+from ..services.metrics import MODEL_LOAD_SECONDS, STARTUP_TIMINGS, record_rejection, record_startup, stage
+from ..services.profiler import PROFILER
 from ..services.quality_check import QualityChecker
+from ..services.runtime import runtime_info
 from ..services.similarity import SimilarityComputer
-from ..services.storage import save_verified_batch
+from ..services.singleflight import SingleFlight, content_key
+from ..services.storage import save_verified_batch_async
+from ..utils.buffer_pool import FRAME_POOL, memory_info, release_frame
+from ..utils.frames import split_frames
 from ..utils.image_utils import ImageProcessor
+from ..utils.upload import HEADER_PROBE_BYTES, check_image_bytes, read_image_upload, read_request_body
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
@@ -28,70 +56,258 @@ face_detector = None
 embedding_extractor = None
 similarity_computer = None
 
+IMAGE_NAMES = ["image1", "image2", "image3"]
+
+# Retries of a still-running job (same image bytes) share its result
+_verify_flight = SingleFlight("verify")
+_store_flight = SingleFlight("verify_and_store")
+
 
 def get_services():
     global face_detector, embedding_extractor, similarity_computer
     if face_detector is None:
         logger.info("Initializing face detection services...")
-        face_detector = FaceDetector()
+        load_start = time.perf_counter()
+        detector = FaceDetector()
+        if PRELOAD_MODELS:
+            detector.load()
         embedding_extractor = EmbeddingExtractor()
         similarity_computer = SimilarityComputer()
+        face_detector = detector
+        MODEL_LOAD_SECONDS.set(time.perf_counter() - load_start)
+        record_startup("model_load", time.perf_counter() - load_start)
         logger.info("Services initialized")
     return face_detector, embedding_extractor, similarity_computer
 
 
-@router.post("/verify", response_model=VerificationResponse)
-async def verify_faces(
-    image1: UploadFile = File(...),
-    image2: UploadFile = File(...),
-    image3: UploadFile = File(...),
-):
-    """Verify that 3 images contain the same person. Does not store images."""
-    start_time = time.time()
+async def _read_uploads(images: List[UploadFile]) -> List[bytes]:
+    blobs = []
+    for img_file, img_name in zip(images, IMAGE_NAMES):
+        with stage("read"):
+            blobs.append(await read_image_upload(img_file, img_name))
+    return blobs
+
+
+async def _run_blocking(fn, *args):
+    """Run CPU/IO-bound pipeline work off the event loop."""
+    return await run_in_threadpool(PROFILER.run_in_worker, fn, *args)
+
+
+def _face_thumbnail(img_array: np.ndarray, face_info: Dict) -> Optional[bytes]:
+    """Aligned face-crop WebP from the decoded (resized) image; None if disabled or it fails."""
+    if not FACE_THUMBNAIL_SIZE:
+        return None
     try:
-        detector, extractor, comparator = get_services()
-        images, image_names = [image1, image2, image3], ["image1", "image2", "image3"]
-        embeddings, image_analyses = [], []
+        with stage("thumbnail"):
+            crop = ImageProcessor.face_thumbnail(
+                img_array, face_info["bbox"], face_info.get("eyes"), FACE_THUMBNAIL_SIZE
+            )
+            return ImageProcessor.encode_webp(crop, FACE_THUMBNAIL_QUALITY)
+    except Exception as e:
+        logger.warning("Face thumbnail failed: %s", e)
+        return None
+
 
-        for img_file, img_name in zip(images, image_names):
-            analysis = ImageAnalysis(image_name=img_name, face_detected=False)
-            img_bytes = await img_file.read()
+def _thumbnail_from_bytes(img_bytes: bytes, face_info: Dict) -> Optional[bytes]:
+    """Thumbnail for a cached result: decode again, since the cache holds no pixels."""
+    if not FACE_THUMBNAIL_SIZE:
+        return None
+    with FRAME_POOL.lease():
+        with stage("decode"):
             img_array = ImageProcessor.bytes_to_numpy(img_bytes)
-            if img_array is None:
-                raise HTTPException(status_code=400, detail=f"{img_name}: Invalid image format")
-            img_array = ImageProcessor.resize_image(img_array)
+        if img_array is None:
+            return None
+        return _face_thumbnail(ImageProcessor.resize_image(img_array), face_info)
 
-            success, face, message = detector.detect_single_face(img_array)
-            if not success:
-                raise HTTPException(status_code=400, detail=f"{img_name}: {message}")
 
-            analysis.face_detected = True
-            analysis.face_info = detector.get_face_info(face)
-            area = face["facial_area"]
-            bbox = np.array([area["x"], area["y"], area["x"] + area["w"], area["y"] + area["h"]])
+def _analyze_image(img_bytes: bytes, thumbnail: bool = False) -> Dict:
+    """
+    Decode, detect, quality-check and embed one image.
 
-            status, quality_details = QualityChecker.perform_all_checks(
-                image=img_array, bbox=bbox, det_score=face["confidence"]
+    Returns a cacheable result dict: either ``face_info``/``quality_checks``/
+    ``embedding``, or ``rejected`` with ``status_code``/``reason``/``message``.
+    With ``thumbnail``, a successful result also carries ``thumbnail`` (WebP
+    bytes, not cacheable).
+    """
+    # Frames are pooled until the analysis returns; the result holds no pixels
+    with FRAME_POOL.lease():
+        return _analyze_frames(img_bytes, thumbnail)
+
+
+def _analyze_frames(img_bytes: bytes, thumbnail: bool) -> Dict:
+    detector, extractor, _ = get_services()
+    check_deadline("decode")
+    with stage("decode"):
+        img_array = ImageProcessor.bytes_to_numpy(img_bytes)
+    if img_array is None:
+        return {"rejected": True, "status_code": 400, "reason": "invalid_image", "message": "Invalid image format"}
+    with stage("resize"):
+        resized = ImageProcessor.resize_image(img_array)
+    if resized is not img_array:
+        # The full-size decode is no longer needed; let the next stage reuse it
+        release_frame(img_array)
+        img_array = resized
+
+    check_deadline("detect")
+    success, face, message = detector.detect_single_face(img_array)
+    if not success:
+        return {
+            "rejected": True,
+            "status_code": 400,
+            "reason": "face_detection",
+            "message": message,
+            # no face / multiple faces is a property of the image; a detector error is not
+            "cacheable": not message.startswith("Face detection error"),
+        }
+
+    face_info = detector.get_face_info(face)
+    area = face["facial_area"]
+    bbox = np.array([area["x"], area["y"], area["x"] + area["w"], area["y"] + area["h"]])
+
+    with stage("quality"):
+        status, quality_details = QualityChecker.perform_all_checks(
+            image=img_array, bbox=bbox, det_score=face["confidence"]
+        )
+    if status == "REJECT":
+        failed = [f"{n}: {d['message']}" for n, d in quality_details.items() if not d.get("passed", True)]
+        return {
+            "rejected": True,
+            "status_code": 400,
+            "reason": "quality",
+            "message": f"Quality check failed - {'; '.join(failed)}",
+        }
+
+    embedding = extractor.extract_embedding(face)
+    if embedding is None or not extractor.validate_embedding(embedding):
+        return {
+            "rejected": True,
+            "status_code": 500,
+            "reason": "embedding",
+            "message": "Failed to extract face embedding",
+            "cacheable": False,
+        }
+    entry = {"face_info": face_info, "quality_checks": quality_details, "embedding": embedding}
+    if thumbnail:
+        entry["thumbnail"] = _face_thumbnail(img_array, face_info)
+    return entry
+
+
+def _process_image(
+    img_bytes: bytes, img_name: str, digest: str, thumbnail: bool = False
+) -> Tuple[ImageAnalysis, np.ndarray, Optional[bytes]]:
+    """
+    Cached per-image analysis. Raises HTTPException on rejection.
+
+    Returns (analysis, embedding, thumbnail); thumbnail is None unless requested.
+    """
+    detector, _, _ = get_services()
+    cache = get_cache()
+    key = f"face:{detector.result_key}:{digest}"
+    entry = None
+    if cache is not None:
+        with stage("cache"):
+            entry = cache.get(key)
+    thumb = None
+    if entry is None:
+        entry = _analyze_image(img_bytes, thumbnail)
+        thumb = entry.pop("thumbnail", None)
+        if cache is not None and entry.pop("cacheable", True):
+            cache.set(key, entry)
+
+    if entry.get("rejected"):
+        record_rejection(entry["reason"])
+        raise HTTPException(status_code=entry["status_code"], detail=f"{img_name}: {entry['message']}")
+
+    analysis = ImageAnalysis(
+        image_name=img_name,
+        face_detected=True,
+        face_info=entry["face_info"],
+        quality_checks={n: QualityCheck(**d) for n, d in entry["quality_checks"].items()},
+    )
+    if thumbnail and thumb is None:
+        thumb = _thumbnail_from_bytes(img_bytes, entry["face_info"])
+    return analysis, entry["embedding"], thumb
+
+
+async def _analyze_images(
+    blobs: List[bytes],
+    digests: List[str],
+    thumbnails: bool = False,
+    early_exit: bool = False,
+    admit: bool = True,
+) -> Tuple[List[ImageAnalysis], List[np.ndarray], List[Optional[bytes]]]:
+    """
+    Analyze images in order. With ``early_exit``, stop as soon as a pair is
+    below the same-person threshold; the lists then cover only the images
+    processed so far. With ``admit``, holds an INFERENCE_CONCURRENCY slot
+    for the analysis only (may raise 503 / 504).
+    """
+    _, _, comparator = get_services()
+    image_analyses, embeddings, thumbs = [], [], []
+    async with LIMITER.slot() if admit else nullcontext():
+        for img_bytes, img_name, digest in zip(blobs, IMAGE_NAMES, digests):
+            analysis, embedding, thumb = await _run_blocking(
+                _process_image, img_bytes, img_name, digest, thumbnails
             )
-            analysis.quality_checks = {n: QualityCheck(**d) for n, d in quality_details.items()}
-            if status == "REJECT":
-                failed = [f"{n}: {d['message']}" for n, d in quality_details.items() if not d.get("passed", True)]
-                raise HTTPException(status_code=400, detail=f"{img_name}: Quality check failed - {'; '.join(failed)}")
+            image_analyses.append(analysis)
+            embeddings.append(embedding)
+            thumbs.append(thumb)
+            if early_exit and len(embeddings) < len(blobs) and len(embeddings) >= 2:
+                with stage("similarity"):
+                    decided = comparator.is_decided_different(embeddings)
+                if decided:
+                    logger.info("Early exit after %d of %d images: different person", len(embeddings), len(blobs))
+                    break
+    return image_analyses, embeddings, thumbs
+
+
+def _compare(embeddings: List[np.ndarray]):
+    _, _, comparator = get_services()
+    partial = len(embeddings) < len(IMAGE_NAMES)
+    with stage("similarity"):
+        similarities = comparator.compute_pairwise_similarities(embeddings, partial=partial)
+        result, confidence, analysis_details = comparator.verify_same_person(similarities)
+    if partial:
+        analysis_details["early_exit"] = True
+        analysis_details["images_processed"] = len(embeddings)
+    if result != "SAME_PERSON":
+        record_rejection("different_person")
+    return similarities, result, confidence, analysis_details
 
-            embedding = extractor.extract_embedding(face)
-            if embedding is None or not extractor.validate_embedding(embedding):
-                raise HTTPException(status_code=500, detail=f"{img_name}: Failed to extract face embedding")
 
-            embeddings.append(embedding)
-            image_analyses.append(analysis)
+def _early_exit(flag: Optional[bool]) -> bool:
+    return VERIFY_EARLY_EXIT if flag is None else flag
 
-        similarities = comparator.compute_pairwise_similarities(embeddings)
-        result, confidence, analysis_details = comparator.verify_same_person(similarities)
+
+@router.post("/verify", response_model=VerificationResponse)
+async def verify_faces(
+    image1: UploadFile = File(...),
+    image2: UploadFile = File(...),
+    image3: UploadFile = File(...),
+    early_exit: Optional[bool] = Query(None, description="Stop once the result is decided (default: VERIFY_EARLY_EXIT)"),
+):
+    """Verify that 3 images contain the same person. Does not store images."""
+    blobs = await _read_uploads([image1, image2, image3])
+    digests = [ImageProcessor.content_hash(b) for b in blobs]
+    early = _early_exit(early_exit)
+    key = content_key("verify", digests, "early" if early else "full")
+    return await _verify_flight.do(key, lambda: _verify(blobs, digests, early))
+
+
+async def _verify(
+    blobs: List[bytes], digests: List[str], early_exit: bool = False, admit: bool = True
+) -> VerificationResponse:
+    start_time = time.time()
+    try:
+        image_analyses, embeddings, _ = await _analyze_images(blobs, digests, early_exit=early_exit, admit=admit)
+        similarities, result, confidence, analysis_details = _compare(embeddings)
         msg = (
             f"All 3 images contain the SAME person (confidence: {confidence:.2%})"
             if result == "SAME_PERSON"
             else f"Images contain DIFFERENT persons (confidence: {confidence:.2%})"
         )
+        if len(embeddings) < len(blobs):
+            msg += f"; stopped after {len(embeddings)} of {len(blobs)} images"
         logger.info("Verify completed in %.2fs: %s", time.time() - start_time, result)
         return VerificationResponse(
             result=result,
@@ -105,92 +321,45 @@ async def verify_faces(
         raise
     except Exception as e:
         logger.exception("Verify error: %s", e)
+        record_rejection("internal_error")
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
 
-@router.post("/verify-and-store", response_model=VerifyAndStoreResponse)
 @router.post("/verify-and-store", response_model=VerifyAndStoreResponse)
 async def verify_and_store_faces(
     image1: UploadFile = File(...),
     image2: UploadFile = File(...),
     image3: UploadFile = File(...),
     user_id: Optional[str] = Form(None),
+    early_exit: Optional[bool] = Query(None, description="Stop once the result is decided (default: VERIFY_EARLY_EXIT)"),
 ):
     """
     Verify that all 3 images are the same person. If yes, mark verified and store
     images in DB; return stored image IDs. If not, return 400 and do not store.
     """
-    start_time = time.time()
     images = [image1, image2, image3]
-    image_names = ["image1", "image2", "image3"]
-
+    blobs = await _read_uploads(images)
+    digests = [ImageProcessor.content_hash(b) for b in blobs]
+    files = [(f.filename or f"{name}.jpg", f.content_type) for f, name in zip(images, IMAGE_NAMES)]
+    early = _early_exit(early_exit)
+    # A retry of a running job gets the same stored records instead of a second copy
+    key = content_key("verify_and_store", digests, user_id)
+    return await _store_flight.do(key, lambda: _verify_and_store(blobs, digests, files, user_id, early))
+
+
+async def _verify_and_store(
+    blobs: List[bytes],
+    digests: List[str],
+    files: List[Tuple[str, Optional[str]]],
+    user_id: Optional[str],
+    early_exit: bool = False,
+) -> VerifyAndStoreResponse:
+    start_time = time.time()
     try:
-        detector, extractor, comparator = get_services()
-        embeddings = []
-        image_analyses: List[ImageAnalysis] = []
-        image_data_list: List[tuple] = []  # (bytes, filename, mimetype)
-
-        for idx, (img_file, img_name) in enumerate(zip(images, image_names), 1):
-            analysis = ImageAnalysis(image_name=img_name, face_detected=False)
-            img_bytes = await img_file.read()
-            img_array = ImageProcessor.bytes_to_numpy(img_bytes)
-
-            if img_array is None:
-                analysis.error = "Invalid or corrupted image"
-                image_analyses.append(analysis)
-                raise HTTPException(
-                    status_code=400,
-                    detail=f"{img_name}: Invalid image format"
-                )
-
-            img_array = ImageProcessor.resize_image(img_array)
-            success, face, message = detector.detect_single_face(img_array)
-            if not success:
-                analysis.error = message
-                image_analyses.append(analysis)
-                raise HTTPException(status_code=400, detail=f"{img_name}: {message}")
-
-            analysis.face_detected = True
-            face_info = detector.get_face_info(face)
-            analysis.face_info = face_info
-            area = face["facial_area"]
-            bbox = np.array([
-                area["x"], area["y"],
-                area["x"] + area["w"], area["y"] + area["h"]
-            ])
-            status, quality_details = QualityChecker.perform_all_checks(
-                image=img_array, bbox=bbox, det_score=face["confidence"]
-            )
-            analysis.quality_checks = {
-                name: QualityCheck(**details)
-                for name, details in quality_details.items()
-            }
-            if status == "REJECT":
-                failed_checks = [
-                    f"{name}: {details['message']}"
-                    for name, details in quality_details.items()
-                    if not details.get("passed", True)
-                ]
-                analysis.error = "; ".join(failed_checks)
-                image_analyses.append(analysis)
-                raise HTTPException(
-                    status_code=400,
-                    detail=f"{img_name}: Quality check failed - {analysis.error}"
-                )
-            image_analyses.append(analysis)
-
-            embedding = extractor.extract_embedding(face)
-            if embedding is None or not extractor.validate_embedding(embedding):
-                raise HTTPException(
-                    status_code=500,
-                    detail=f"{img_name}: Failed to extract face embedding"
-                )
-            embeddings.append(embedding)
-            filename = img_file.filename or f"{img_name}.jpg"
-            image_data_list.append((img_bytes, filename, img_file.content_type))
-
-        similarities = comparator.compute_pairwise_similarities(embeddings)
-        result, confidence, analysis_details = comparator.verify_same_person(similarities)
+        image_analyses, embeddings, thumbnails = await _analyze_images(
+            blobs, digests, thumbnails=True, early_exit=early_exit
+        )
+        similarities, result, confidence, _ = _compare(embeddings)
 
         if result != "SAME_PERSON":
             processing_time = time.time() - start_time
@@ -204,8 +373,18 @@ async def verify_and_store_faces(
                 }
             )
 
+        # Nobody will read the response: don't upload or insert anything.
+        # Once storage starts it runs to completion (no orphaned uploads)
+        check_deadline("storage_upload")
+
         # Store all 3 images and create DB records
-        records = save_verified_batch(image_data_list, user_id)
+        image_data_list = [(img_bytes, filename, mimetype) for img_bytes, (filename, mimetype) in zip(blobs, files)]
+        detector, _, _ = get_services()
+        records = await save_verified_batch_async(
+            image_data_list, user_id, embeddings, detector.model_version, thumbnails,
+            [a.face_info["confidence"] for a in image_analyses],
+            run_blocking=_run_blocking,
+        )
         stored = [
             StoredImageInfo(
                 id=r.id,
@@ -213,6 +392,7 @@ async def verify_and_store_faces(
                 original_filename=r.original_filename,
                 mimetype=r.mimetype,
                 size_bytes=r.size_bytes,
+                thumbnail_path=r.thumbnail_path,
             )
             for r in records
         ]
@@ -230,12 +410,149 @@ async def verify_and_store_faces(
         raise
     except Exception as e:
         logger.exception("Verify-and-store error: %s", e)
+        record_rejection("internal_error")
         raise HTTPException(
             status_code=500,
             detail=f"Internal server error: {str(e)}"
         )
 
 
+# =====================================================
+# RAW (server-to-server)
+# =====================================================
+@router.post("/verify-raw", response_model=CompactVerificationResponse, response_model_exclude_none=True)
+async def verify_raw(
+    request: Request,
+    store: bool = Query(False, description="Store the images when they are the same person, like /verify-and-store"),
+    user_id: Optional[str] = Query(None, description="With store: owner of the stored images"),
+    early_exit: Optional[bool] = Query(None, description="Stop once the result is decided (default: VERIFY_EARLY_EXIT)"),
+):
+    """
+    /verify and /verify-and-store for server-to-server callers: the 3 images
+    come as one length-prefixed binary body (app/utils/frames.py) instead of
+    multipart, and the response leaves out the per-image analyses.
+    """
+    with stage("read"):
+        body = await read_request_body(request)
+        try:
+            blobs = split_frames(body, len(IMAGE_NAMES))
+        except ValueError as e:
+            record_rejection("invalid_body")
+            raise HTTPException(status_code=400, detail=str(e))
+        if len(blobs) != len(IMAGE_NAMES):
+            record_rejection("invalid_body")
+            raise HTTPException(status_code=400, detail=f"Expected {len(IMAGE_NAMES)} images, got {len(blobs)}")
+        files = []
+        for blob, name in zip(blobs, IMAGE_NAMES):
+            check_image_bytes(blob, name)
+            image_format = ImageProcessor.sniff_header(blob[:HEADER_PROBE_BYTES])[0].lower()
+            files.append((f"{name}.{'jpg' if image_format == 'jpeg' else image_format}", f"image/{image_format}"))
+    digests = [ImageProcessor.content_hash(b) for b in blobs]
+    early = _early_exit(early_exit)
+    # Same flight keys as the multipart endpoints: retries over either path share a job
+    if store:
+        key = content_key("verify_and_store", digests, user_id)
+        stored = await _store_flight.do(key, lambda: _verify_and_store(blobs, digests, files, user_id, early))
+        return CompactVerificationResponse(
+            result=stored.result,
+            confidence=stored.confidence,
+            similarity=stored.similarity,
+            stored_image_ids=[image.id for image in stored.stored_images],
+        )
+    key = content_key("verify", digests, "early" if early else "full")
+    verified = await _verify_flight.do(key, lambda: _verify(blobs, digests, early))
+    return CompactVerificationResponse(
+        result=verified.result, confidence=verified.confidence, similarity=verified.similarity
+    )
+
+
+# =====================================================
+# BULK
+# =====================================================
+# Bulk jobs in flight across all bulk requests; the rest of the pool stays free
+# for interactive requests
+_bulk_slots = asyncio.Semaphore(BULK_CONCURRENCY)
+
+
+def _spool(upload: UploadFile) -> IO[bytes]:
+    """Copy an upload to a private disk-backed temp file that outlives the request form."""
+    tmp = tempfile.TemporaryFile()
+    upload.file.seek(0)
+    shutil.copyfileobj(upload.file, tmp, 1024 * 1024)
+    tmp.seek(0)
+    return tmp
+
+
+async def _run_bulk_job(job: BulkJob, early_exit: bool) -> BulkJobResult:
+    index, job_id, load = job
+    async with _bulk_slots:
+        try:
+            with stage("read"):
+                blobs = await run_in_threadpool(load)
+            digests = [ImageProcessor.content_hash(b) for b in blobs]
+            key = content_key("verify", digests, "early" if early_exit else "full")
+            # Bulk jobs are bounded by BULK_CONCURRENCY, not the interactive slots
+            result = await _verify_flight.do(key, lambda: _verify(blobs, digests, early_exit, admit=False))
+        except HTTPException as e:
+            return BulkJobResult(index=index, job_id=job_id, status_code=e.status_code, detail=e.detail)
+        except Exception as e:
+            logger.exception("Bulk job %s failed: %s", job_id, e)
+            record_rejection("internal_error")
+            return BulkJobResult(
+                index=index, job_id=job_id, status_code=500, detail=f"Internal server error: {str(e)}"
+            )
+    return BulkJobResult(index=index, job_id=job_id, status_code=200, result=result)
+
+
+async def _bulk_stream(jobs: Iterator[BulkJob], early_exit: bool, source: IO[bytes]) -> AsyncIterator[bytes]:
+    """
+    One NDJSON line per job, in completion order. At most BULK_CONCURRENCY jobs
+    are pending per request, and the next ones are only read once the client
+    has taken finished results, so memory does not grow with the job count.
+    """
+    pending = set()
+    try:
+        while True:
+            for job in itertools.islice(jobs, BULK_CONCURRENCY - len(pending)):
+                pending.add(asyncio.create_task(_run_bulk_job(job, early_exit)))
+            if not pending:
+                break
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                yield task.result().model_dump_json(exclude_none=True).encode() + b"\n"
+    finally:
+        # client went away: stop the remaining jobs
+        for task in pending:
+            task.cancel()
+        source.close()
+
+
+@router.post("/verify-bulk", response_class=StreamingResponse)
+async def verify_bulk(
+    archive: Optional[UploadFile] = File(None, description="ZIP with one directory of 3 images per job"),
+    manifest: Optional[UploadFile] = File(None, description="NDJSON, one job per line (stored image ids / local paths)"),
+    early_exit: Optional[bool] = Query(None, description="Stop once the result is decided (default: VERIFY_EARLY_EXIT)"),
+):
+    """
+    Verify many 3-image jobs in one request. Streams one NDJSON
+    ``BulkJobResult`` line per job as soon as it finishes. Does not store images.
+    """
+    if (archive is None) == (manifest is None):
+        raise HTTPException(status_code=400, detail="Send exactly one of 'archive' or 'manifest'")
+    source = await run_in_threadpool(_spool, archive or manifest)
+    if archive is not None:
+        try:
+            jobs = iter_archive_jobs(await run_in_threadpool(zipfile.ZipFile, source))
+        except zipfile.BadZipFile:
+            source.close()
+            raise HTTPException(status_code=400, detail="archive: not a valid ZIP file")
+    else:
+        jobs = iter_manifest_jobs(source)
+    return StreamingResponse(
+        _bulk_stream(jobs, _early_exit(early_exit), source), media_type="application/x-ndjson"
+    )
+
+
 # =====================================================
 # HEALTH
 # =====================================================
@@ -245,17 +562,20 @@ async def health_check():
 
     try:
         detector, _, _ = get_services()
-        # FaceDetector has no .app; consider loaded if singleton exists
-        model_loaded = detector is not None
+        model_loaded = detector is not None and detector.loaded
 
         return HealthResponse(
             status="healthy" if model_loaded else "initializing",
             model_loaded=model_loaded,
-            version="1.0.0"
+            version="1.0.0",
+            startup=STARTUP_TIMINGS or None,
+            runtime=runtime_info(),
+            memory=memory_info(),
         )
     except Exception:
         return HealthResponse(
             status="unhealthy",
             model_loaded=False,
-            version="1.0.0"
+            version="1.0.0",
+            startup=STARTUP_TIMINGS or None,
         )
@@ -6,6 +6,8 @@ from pathlib import Path
 
 from dotenv import load_dotenv
 
+from app.services.runtime import available_cpus, parse_cpu_list
+
 # Load .env from project root; override=True so project .env wins over system/shell env
 _env_path = Path(__file__).resolve().parent.parent / ".env"
 load_dotenv(dotenv_path=_env_path, override=True)
@@ -42,3 +44,119 @@ API_KEY = os.getenv("API_KEY", "")  # empty = no auth
 # Limits
 MAX_IMAGE_SIZE_MB = int(os.getenv("MAX_IMAGE_SIZE_MB", "10"))
 MAX_IMAGE_SIZE_BYTES = MAX_IMAGE_SIZE_MB * 1024 * 1024
+
+# Admin endpoints (profiling): empty = disabled
+ADMIN_TOKEN_HEADER = "X-Admin-Token"
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+PROFILER_SAMPLE_INTERVAL_MS = float(os.getenv("PROFILER_SAMPLE_INTERVAL_MS", "5"))
+
+# Upload limits: the body cap is enforced while the request streams in; per-image
+# size and pixel limits once the multipart form is spooled, before decoding
+MAX_IMAGE_PIXELS = int(os.getenv("MAX_IMAGE_PIXELS", str(40_000_000)))  # decompression-bomb guard
+MAX_REQUEST_BODY_BYTES = int(
+    os.getenv("MAX_REQUEST_BODY_BYTES", str(3 * MAX_IMAGE_SIZE_BYTES + 1024 * 1024))
+)
+
+# Result cache (detection + quality + embedding per image content hash)
+# CACHE_BACKEND: memory (in-process only) | sqlite | redis | none
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory").strip().lower()
+CACHE_URL = os.getenv("CACHE_URL", "")  # sqlite file path or redis://host:port/db
+CACHE_TTL_SECONDS = int(os.getenv("CACHE_TTL_SECONDS", str(24 * 3600)))
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "10000"))  # in-process tier
+CACHE_SHARED_MAX_ENTRIES = int(os.getenv("CACHE_SHARED_MAX_ENTRIES", "1000000"))  # sqlite tier
+
+# Face selection when an image has several faces:
+#   single   = reject any image with more than one face
+#   dominant = keep the face whose area x confidence score is FACE_DOMINANCE_RATIO
+#              times the runner-up's; only that face is embedded
+FACE_SELECTION_MODE = os.getenv("FACE_SELECTION_MODE", "single").strip().lower()
+FACE_DOMINANCE_RATIO = float(os.getenv("FACE_DOMINANCE_RATIO", "2.5"))
+
+# Detect faces on a proxy image with this long side (px), then embed an aligned
+# crop cut from the full-resolution frame; 0 = detect and embed on the full frame
+# (default until app.jobs.regression shows FAR/FRR unchanged with a proxy)
+DETECTION_MAX_SIZE = int(os.getenv("DETECTION_MAX_SIZE", "0"))
+
+# Reusable decode / resize / colour-conversion buffers, per process (MB; 0 = off).
+# Caps the memory the pool keeps; frames beyond it are allocated normally
+FRAME_POOL_MB = int(os.getenv("FRAME_POOL_MB", "256"))
+FRAME_POOL_BYTES = FRAME_POOL_MB * 1024 * 1024
+
+# Model weights: DeepFace reads them from MODEL_DIR/.deepface/weights (bundle them
+# into the image). Downloading missing weights at runtime is only allowed when
+# MODEL_DIR is unset, unless MODEL_ALLOW_DOWNLOAD says otherwise.
+MODEL_DIR = os.getenv("MODEL_DIR", "").strip()
+MODEL_ALLOW_DOWNLOAD = os.getenv(
+    "MODEL_ALLOW_DOWNLOAD", "0" if MODEL_DIR else "1"
+).lower() in ("1", "true", "yes")
+# Load the model during startup (not on the first request)
+PRELOAD_MODELS = os.getenv("PRELOAD_MODELS", "1").lower() in ("1", "true", "yes")
+
+# CPU / thread pools (applied by app.services.runtime before NumPy/OpenCV/TF load)
+#   CPU_AFFINITY: pin the process to these CPUs, e.g. "0-3" (empty = no pinning)
+#   CPU_THREADS: threads for OpenCV, TF intra-op and BLAS pools (0 = CPUs available
+#       to the container: cgroup quota and affinity included)
+#   TF_INTER_OP_THREADS: TF inter-op pool (0 = min(2, CPU_THREADS))
+CPU_AFFINITY = parse_cpu_list(os.getenv("CPU_AFFINITY", ""))
+CPU_COUNT = available_cpus(CPU_AFFINITY)
+CPU_THREADS = int(os.getenv("CPU_THREADS", "0")) or CPU_COUNT
+TF_INTER_OP_THREADS = int(os.getenv("TF_INTER_OP_THREADS", "0")) or min(2, CPU_THREADS)
+
+# Admission control on the inference endpoints
+#   INFERENCE_CONCURRENCY: requests processed at once (0 = unlimited); others queue
+#   ADMISSION_MAX_QUEUE: waiting requests beyond this get 503
+#   ADMISSION_TARGET_QUEUE_MS: when the average queue wait exceeds this, new
+#       requests that would have to queue are shed with 503 until it recovers
+#   ADMISSION_MAX_QUEUE_WAIT_MS: a queued request gives up with 503 after this
+#   RATE_LIMIT_PER_MINUTE / RATE_LIMIT_BURST: token bucket per API key (or client IP);
+#       0 = off (default). All callers presenting API_KEY share one bucket, so
+#       size it for the whole upstream service, not for one end user
+INFERENCE_CONCURRENCY = int(os.getenv("INFERENCE_CONCURRENCY", str(CPU_COUNT)))
+ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", "32"))
+ADMISSION_TARGET_QUEUE_MS = float(os.getenv("ADMISSION_TARGET_QUEUE_MS", "500"))
+ADMISSION_MAX_QUEUE_WAIT_MS = float(os.getenv("ADMISSION_MAX_QUEUE_WAIT_MS", "5000"))
+RATE_LIMIT_PER_MINUTE = float(os.getenv("RATE_LIMIT_PER_MINUTE", "0"))
+RATE_LIMIT_BURST = int(os.getenv("RATE_LIMIT_BURST", "20"))
+
+# Request deadline on the inference paths: the caller's budget in ms from the
+# X-Request-Timeout-Ms header, capped by REQUEST_TIMEOUT_MS (0 = no server-side
+# limit). Queue wait, decode, inference and storage are skipped once it passes
+REQUEST_DEADLINE_HEADER = "X-Request-Timeout-Ms"
+REQUEST_TIMEOUT_MS = float(os.getenv("REQUEST_TIMEOUT_MS", "0"))
+
+# Bulk verification (/api/verify-bulk)
+#   BULK_CONCURRENCY: jobs processed at once across all bulk requests (leaves
+#       inference capacity for interactive requests)
+#   BULK_MAX_BODY_BYTES: request body limit for bulk archives / manifests
+#   BULK_LOCAL_ROOT: manifest "path" entries are read from under this directory
+#       (empty = local paths not allowed)
+BULK_CONCURRENCY = int(os.getenv("BULK_CONCURRENCY", str(max(1, CPU_COUNT // 2))))
+BULK_MAX_BODY_BYTES = int(os.getenv("BULK_MAX_BODY_BYTES", str(1024 * 1024 * 1024)))
+BULK_LOCAL_ROOT = os.getenv("BULK_LOCAL_ROOT", "").strip()
+
+# Face-crop thumbnail saved with each stored image (aligned, square, WebP); 0 = off
+FACE_THUMBNAIL_SIZE = int(os.getenv("FACE_THUMBNAIL_SIZE", "160"))
+FACE_THUMBNAIL_QUALITY = int(os.getenv("FACE_THUMBNAIL_QUALITY", "90"))
+
+# Lifecycle of locally stored originals (python -m app.jobs.storage_lifecycle), by
+# age since verified_at (created_at when unverified); 0 days = tier disabled
+#   LIFECYCLE_RECOMPRESS_DAYS: re-encode as JPEG, long side <= LIFECYCLE_MAX_SIDE
+#   LIFECYCLE_ARCHIVE_DAYS: move into packed segments under ARCHIVE_DIR
+#   LIFECYCLE_IO_MB_PER_S: read + write budget of the job (0 = unthrottled)
+LIFECYCLE_RECOMPRESS_DAYS = float(os.getenv("LIFECYCLE_RECOMPRESS_DAYS", "30"))
+LIFECYCLE_ARCHIVE_DAYS = float(os.getenv("LIFECYCLE_ARCHIVE_DAYS", "180"))
+LIFECYCLE_MAX_SIDE = int(os.getenv("LIFECYCLE_MAX_SIDE", "1920"))
+LIFECYCLE_JPEG_QUALITY = int(os.getenv("LIFECYCLE_JPEG_QUALITY", "85"))
+LIFECYCLE_SEGMENT_MB = int(os.getenv("LIFECYCLE_SEGMENT_MB", "256"))
+LIFECYCLE_IO_MB_PER_S = float(os.getenv("LIFECYCLE_IO_MB_PER_S", "20"))
+ARCHIVE_DIR = Path(os.getenv("ARCHIVE_DIR", "") or UPLOAD_DIR / "archive")
+
+# Async DB driver for the request path (aiosqlite for SQLite, asyncpg for PostgreSQL).
+# ASYNC_DATABASE_URL overrides the URL derived from DATABASE_URL. DB_ASYNC=0 = sync
+# sessions in worker threads.
+DB_ASYNC = os.getenv("DB_ASYNC", "1").lower() in ("1", "true", "yes")
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL", "")
+
+# Early exit: stop processing further images once a pair is below the same-person
+# threshold (response then omits the skipped images). Per request: ?early_exit=true|false
+VERIFY_EARLY_EXIT = os.getenv("VERIFY_EARLY_EXIT", "0").lower() in ("1", "true", "yes")
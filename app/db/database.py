@@ -1,9 +1,12 @@
-from sqlalchemy import create_engine
+import logging
+from sqlalchemy import create_engine, inspect, text
 from sqlalchemy.orm import sessionmaker, declarative_base, Session
 from functools import lru_cache
-from typing import Generator
+from typing import Generator, Optional
 
-from app.config import DATABASE_URL
+from app.config import ASYNC_DATABASE_URL, DB_ASYNC, DATABASE_URL
+
+logger = logging.getLogger(__name__)
 
 SQLALCHEMY_DATABASE_URL = DATABASE_URL
 
@@ -25,9 +28,79 @@ engine = get_engine()
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+
+# ================= ASYNC =================
+
+def to_async_url(url: str) -> Optional[str]:
+    """Async driver URL for a sync DATABASE_URL (aiosqlite / asyncpg); None if unsupported."""
+    if url.startswith("sqlite://"):
+        return "sqlite+aiosqlite://" + url[len("sqlite://"):]
+    for prefix in ("postgresql+psycopg2://", "postgresql://", "postgres://"):
+        if url.startswith(prefix):
+            return "postgresql+asyncpg://" + url[len(prefix):]
+    return None
+
+
+@lru_cache()
+def get_async_engine():
+    """
+    Async engine for the request path, or None when DB_ASYNC is off, the URL
+    has no async driver mapping, or the driver isn't installed (callers then
+    use SessionLocal in a worker thread).
+    """
+    if not DB_ASYNC:
+        return None
+    url = ASYNC_DATABASE_URL or to_async_url(SQLALCHEMY_DATABASE_URL)
+    if url is None:
+        logger.info("No async driver for %s; using the sync engine", SQLALCHEMY_DATABASE_URL.split(":", 1)[0])
+        return None
+    try:
+        from sqlalchemy.ext.asyncio import create_async_engine
+
+        return create_async_engine(url, echo=False)
+    except ImportError as e:
+        logger.warning("Async DB driver unavailable (%s); using the sync engine", e)
+        return None
+
+
+@lru_cache()
+def get_async_sessionmaker():
+    """async_sessionmaker bound to get_async_engine(), or None (see there)."""
+    async_engine = get_async_engine()
+    if async_engine is None:
+        return None
+    from sqlalchemy.ext.asyncio import async_sessionmaker
+
+    return async_sessionmaker(async_engine, expire_on_commit=False, autoflush=False)
+
+
+async def dispose_async_engine() -> None:
+    async_engine = get_async_engine()
+    if async_engine is not None:
+        await async_engine.dispose()
+
 Base = declarative_base()
 
 
+def add_missing_columns(bind=None) -> None:
+    """
+    Add nullable columns that exist on the models but not yet in the DB.
+    create_all() only creates missing tables; this covers additive model changes.
+    """
+    bind = bind or engine
+    inspector = inspect(bind)
+    with bind.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {c["name"] for c in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing or not column.nullable:
+                    continue
+                col_type = column.type.compile(dialect=bind.dialect)
+                conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN "{column.name}" {col_type}'))
+
+
 def get_session() -> Generator[Session, None, None]:
     db = SessionLocal()
     try:
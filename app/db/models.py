@@ -6,7 +6,7 @@ Keep schema minimal to match the dating-app verification flow.
 """
 
 from datetime import datetime
-from sqlalchemy import Column, Integer, String, DateTime, Boolean
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, Float, LargeBinary
 
 from .database import Base
 
@@ -24,7 +24,35 @@ class Image(Base):
     verified = Column(Boolean, default=False, nullable=False)
     verified_at = Column(DateTime, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
+    # Aligned square face crop (WebP), same storage backend as storage_path
+    thumbnail_path = Column(String, nullable=True)
+    # Face embedding (L2-normalized little-endian float32) and the model that produced it
+    embedding = Column(LargeBinary, nullable=True)
+    embedding_model = Column(String, nullable=True)
+    face_confidence = Column(Float, nullable=True)
+    # Min similarity to the same user's other images; set by the backfill job
+    match_score = Column(Float, nullable=True)
+    rescored_at = Column(DateTime, nullable=True)
+    # Lifecycle of a local original (app.jobs.storage_lifecycle):
+    # None = as uploaded, "recompressed", "archived" (storage_path is a pack: reference)
+    storage_tier = Column(String, nullable=True)
+    tiered_at = Column(DateTime, nullable=True)
 
     def mark_verified(self):
         self.verified = True
-        self.verified_at = datetime.utcnow()
\ No newline at end of file
+        self.verified_at = datetime.utcnow()
+
+
+class FaceCluster(Base):
+    """One image of a cross-user near-duplicate cluster; written by app.jobs.cluster_faces."""
+
+    __tablename__ = "face_clusters"
+
+    id = Column(Integer, primary_key=True)
+    # Start time of the clustering run (UTC, ISO 8601); each run adds a new set of rows
+    run_id = Column(String, nullable=False, index=True)
+    cluster = Column(Integer, nullable=False)
+    image_id = Column(Integer, nullable=False, index=True)
+    user_id = Column(String, nullable=True)
+    # Highest similarity of this image to any other image in the cluster
+    max_similarity = Column(Float, nullable=False)
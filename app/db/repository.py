@@ -0,0 +1,79 @@
+"""
+Async repository for ``Image`` rows (request path).
+
+Writes go out as one multi-row ``INSERT ... RETURNING`` per batch; reads use
+keyset-friendly queries. Sessions come from ``get_async_sessionmaker()``.
+"""
+from typing import Dict, List, Optional, Sequence
+
+from sqlalchemy import insert, select
+
+from .database import get_async_sessionmaker
+from .models import Image
+
+
+def order_like(rows: Sequence[Dict], images: Sequence[Image]) -> List[Image]:
+    """
+    Put RETURNING results back in input order, matched on the unique
+    storage_path (sort_by_parameter_order would split the insert into one
+    statement per row on SQLite).
+    """
+    by_path = {image.storage_path: image for image in images}
+    return [by_path[row["storage_path"]] for row in rows]
+
+
+class ImageRepository:
+    """Async reads/writes of Image rows on one async_sessionmaker."""
+
+    def __init__(self, sessionmaker=None):
+        self._sessionmaker = sessionmaker or get_async_sessionmaker()
+        if self._sessionmaker is None:
+            raise RuntimeError("Async database engine is not available")
+
+    async def add_many(self, rows: Sequence[Dict]) -> List[Image]:
+        """
+        Insert rows (column dicts) in one statement and one transaction.
+
+        Returns the new Image objects (ids and defaults filled) in input order.
+        """
+        if not rows:
+            return []
+        async with self._sessionmaker() as session:
+            async with session.begin():
+                result = await session.scalars(insert(Image).returning(Image), list(rows))
+                return order_like(rows, result.all())
+
+    async def get(self, image_id: int) -> Optional[Image]:
+        async with self._sessionmaker() as session:
+            return await session.get(Image, image_id)
+
+    async def get_many(self, image_ids: Sequence[int]) -> List[Image]:
+        """Images by id, in the order of ``image_ids`` (missing ids are skipped)."""
+        async with self._sessionmaker() as session:
+            rows = (await session.scalars(select(Image).where(Image.id.in_(image_ids)))).all()
+        by_id = {r.id: r for r in rows}
+        return [by_id[i] for i in image_ids if i in by_id]
+
+    async def list_for_user(
+        self, user_id: str, after_id: int = 0, limit: int = 100
+    ) -> List[Image]:
+        """A user's images by ascending id; pass the last id seen as ``after_id`` to page."""
+        async with self._sessionmaker() as session:
+            result = await session.scalars(
+                select(Image)
+                .where(Image.user_id == user_id, Image.id > after_id)
+                .order_by(Image.id)
+                .limit(limit)
+            )
+            return list(result.all())
+
+
+_repository: Optional[ImageRepository] = None
+
+
+def get_image_repository() -> Optional[ImageRepository]:
+    """Process-wide repository, or None when the async engine is unavailable."""
+    global _repository
+    if _repository is None and get_async_sessionmaker() is not None:
+        _repository = ImageRepository()
+    return _repository
@@ -0,0 +1,370 @@
+"""
+Offline re-embedding and re-scoring of stored images.
+
+    python -m app.jobs.backfill [--workers 4] [--page-size 256] [--chunk-size 8]
+                                [--fetch-concurrency 16] [--checkpoint PATH]
+                                [--restart] [--force] [--from-originals]
+                                [--skip-embed] [--skip-score]
+
+Pass 1 (embed): pages through ``images`` by id, fetches bytes through the
+storage backend (local UPLOAD_DIR paths or Cloudinary URLs) with bounded
+concurrency while the previous page is being embedded, runs detection and
+embedding in a process pool, and writes ``embedding``/``embedding_model``/
+``face_confidence`` back with one bulk UPDATE per page. Rows with a stored
+face thumbnail are embedded straight from it (small download, no detection)
+unless ``--from-originals``. Thumbnail embeddings come from a lossy, smaller
+crop than the request path embeds, so they are tagged with their own
+``embedding_model`` (``<model>-thumb``) and never mixed with full-frame ones;
+``--from-originals`` upgrades them. Rows already embedded by the current model
+are skipped unless ``--force``.
+
+Pass 2 (score): pages through users and sets each image's ``match_score`` to
+its minimum cosine similarity against the same user's other images embedded
+by the same model (full-frame and thumbnail embeddings are scored apart).
+
+Progress is checkpointed after every page; rerunning resumes where it stopped.
+"""
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+from sqlalchemy import func, or_, select, true, update
+
+from app.config import CPU_COUNT, CPU_THREADS, UPLOAD_DIR
+from app.db import models  # noqa: F401 — register ORM
+from app.db.database import Base, SessionLocal, add_missing_columns, engine
+from app.db.models import Image
+from app.services.embedding import EmbeddingExtractor
+from app.services.runtime import configure_runtime
+from app.services.storage import load_image_bytes
+from app.utils.buffer_pool import FRAME_POOL
+from app.utils.image_utils import ImageProcessor
+
+logger = logging.getLogger("app.jobs.backfill")
+
+DEFAULT_CHECKPOINT = UPLOAD_DIR.parent / "backfill.checkpoint.json"
+# embedding_model suffix of embeddings computed from stored face thumbnails
+THUMBNAIL_MODEL_SUFFIX = "-thumb"
+
+# (image_id, bytes, fetch error, bytes are a face thumbnail, stored face confidence)
+EmbedItem = Tuple[int, Optional[bytes], Optional[str], bool, Optional[float]]
+# (image_id, embedding bytes, face confidence, error, embedded from a thumbnail)
+EmbedResult = Tuple[int, Optional[bytes], Optional[float], Optional[str], bool]
+
+
+# ================= WORKER PROCESS =================
+
+_worker = None
+
+
+def _init_worker(threads: int) -> None:
+    global _worker
+    from app.services.face_detector import FaceDetector
+
+    configure_runtime(threads, min(2, threads))
+
+    # TF/DeepFace load once per worker process
+    detector = FaceDetector()
+    detector.load()
+    _worker = (detector, EmbeddingExtractor())
+
+
+def _worker_model_version() -> str:
+    return _worker[0].model_version
+
+
+def _embed_thumbnail(image_id: int, data: bytes, confidence: Optional[float]) -> EmbedResult:
+    detector, extractor = _worker
+    thumb = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+    if thumb is None:
+        return image_id, None, None, "Invalid thumbnail", True
+    face = cv2.cvtColor(ImageProcessor.thumbnail_face_region(thumb), cv2.COLOR_BGR2RGB)
+    embedding = extractor.extract_embedding({"encoding": detector.embed_aligned_face(face)})
+    if embedding is None or not extractor.validate_embedding(embedding):
+        return image_id, None, None, "Failed to extract face embedding", True
+    return image_id, EmbeddingExtractor.to_bytes(embedding), confidence, None, True
+
+
+def _embed_chunk(items: List[EmbedItem]) -> List[EmbedResult]:
+    detector, extractor = _worker
+    results = []
+    for image_id, data, error, is_thumbnail, confidence in items:
+        if data is None:
+            results.append((image_id, None, None, error, False))
+            continue
+        if is_thumbnail:
+            results.append(_embed_thumbnail(image_id, data, confidence))
+            continue
+        with FRAME_POOL.lease():
+            img = ImageProcessor.bytes_to_numpy(data)
+            if img is None:
+                results.append((image_id, None, None, "Invalid image format", False))
+                continue
+            img = ImageProcessor.resize_image(img)
+            success, face, message = detector.detect_single_face(img)
+        if not success:
+            results.append((image_id, None, None, message, False))
+            continue
+        embedding = extractor.extract_embedding(face)
+        if embedding is None or not extractor.validate_embedding(embedding):
+            results.append((image_id, None, None, "Failed to extract face embedding", False))
+            continue
+        results.append((image_id, EmbeddingExtractor.to_bytes(embedding), float(face["confidence"]), None, False))
+    return results
+
+
+# ================= CHECKPOINT =================
+
+def load_checkpoint(path: Path) -> Dict:
+    if not path.exists():
+        return {}
+    return json.loads(path.read_text())
+
+
+def save_checkpoint(path: Path, state: Dict) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    tmp.write_text(json.dumps(state, indent=2))
+    os.replace(tmp, path)
+
+
+class _Progress:
+    def __init__(self, label: str, total: int):
+        self.label = label
+        self.total = total
+        self.done = 0
+        self.failed = 0
+        self.start = time.perf_counter()
+
+    def update(self, done: int, failed: int = 0) -> None:
+        self.done += done
+        self.failed += failed
+        elapsed = time.perf_counter() - self.start
+        rate = self.done / elapsed if elapsed > 0 else 0.0
+        logger.info(
+            "%s: %d/%d rows (%.1f rows/s), %d failed",
+            self.label, self.done, self.total, rate, self.failed,
+        )
+
+
+# ================= PASS 1: EMBED =================
+
+def _pending_filter(model_version: str, force: bool, from_originals: bool):
+    if force:
+        return true()
+    done = [model_version]
+    if not from_originals:
+        # Already embedded from its thumbnail; --from-originals upgrades those
+        done.append(model_version + THUMBNAIL_MODEL_SUFFIX)
+    return or_(Image.embedding_model.is_(None), Image.embedding_model.not_in(done))
+
+
+def _fetch_page(fetch_pool: ThreadPoolExecutor, rows, use_thumbnails: bool) -> List[EmbedItem]:
+    def fetch(row):
+        if use_thumbnails and row.thumbnail_path:
+            try:
+                return row.id, load_image_bytes(row.thumbnail_path), None, True, row.face_confidence
+            except Exception as e:
+                logger.debug("Thumbnail for image %d unavailable, using original: %s", row.id, e)
+        try:
+            return row.id, load_image_bytes(row.storage_path), None, False, None
+        except Exception as e:
+            return row.id, None, f"Fetch failed: {e}", False, None
+
+    return list(fetch_pool.map(fetch, rows))
+
+
+def run_embed_pass(args, pool: ProcessPoolExecutor, model_version: str, state: Dict, checkpoint: Path) -> None:
+    last_id = state.get("embed_last_id", 0)
+    pending = _pending_filter(model_version, args.force, args.from_originals)
+    with SessionLocal() as db:
+        total = db.scalar(select(func.count()).select_from(Image).where(pending, Image.id > last_id))
+    progress = _Progress("embed", total)
+    logger.info("Embedding %d rows with %s (resuming after id %d)", total, model_version, last_id)
+
+    def next_page(after_id: int):
+        with SessionLocal() as db:
+            return db.execute(
+                select(Image.id, Image.storage_path, Image.thumbnail_path, Image.face_confidence)
+                .where(pending, Image.id > after_id)
+                .order_by(Image.id)
+                .limit(args.page_size)
+            ).all()
+
+    with ThreadPoolExecutor(args.fetch_concurrency) as fetch_pool, ThreadPoolExecutor(1) as prefetch:
+        use_thumbnails = not args.from_originals
+        rows = next_page(last_id)
+        fetched = prefetch.submit(_fetch_page, fetch_pool, rows, use_thumbnails) if rows else None
+        while fetched is not None:
+            items = fetched.result()
+            # Overlap: fetch the next page while this one is embedded
+            rows = next_page(items[-1][0])
+            fetched = prefetch.submit(_fetch_page, fetch_pool, rows, use_thumbnails) if rows else None
+
+            chunks = [items[i:i + args.chunk_size] for i in range(0, len(items), args.chunk_size)]
+            results = [r for chunk in pool.map(_embed_chunk, chunks) for r in chunk]
+
+            now = datetime.utcnow()
+            ok = [
+                {
+                    "id": i,
+                    "embedding": emb,
+                    "embedding_model": model_version + THUMBNAIL_MODEL_SUFFIX if from_thumbnail else model_version,
+                    "face_confidence": conf,
+                    "rescored_at": now,
+                }
+                for i, emb, conf, _, from_thumbnail in results
+                if emb is not None
+            ]
+            failed = [(i, err) for i, emb, _, err, _ in results if emb is None]
+            for image_id, err in failed:
+                logger.debug("Image %d not embedded: %s", image_id, err)
+            if ok:
+                with SessionLocal() as db:
+                    db.execute(update(Image), ok)
+                    db.commit()
+
+            state["embed_last_id"] = items[-1][0]
+            state["embedded"] = state.get("embedded", 0) + len(ok)
+            state["embed_failed"] = state.get("embed_failed", 0) + len(failed)
+            save_checkpoint(checkpoint, state)
+            progress.update(len(items), len(failed))
+
+
+# ================= PASS 2: SCORE =================
+
+def _min_pairwise(embeddings: np.ndarray) -> np.ndarray:
+    """Each row's minimum cosine similarity to the other rows (clipped to [0, 1])."""
+    sims = embeddings @ embeddings.T
+    np.fill_diagonal(sims, np.inf)
+    return np.clip(sims.min(axis=1), 0.0, 1.0)
+
+
+def run_score_pass(args, model_version: str, state: Dict, checkpoint: Path) -> None:
+    from app.services.similarity import SimilarityComputer
+
+    threshold = SimilarityComputer.SAME_PERSON_THRESHOLD
+    # One resume position per embedding model
+    last_user_key = f"score_last_user:{model_version}"
+    last_user = state.get(last_user_key, "")
+    scoped = (Image.embedding_model == model_version, Image.user_id.is_not(None))
+    with SessionLocal() as db:
+        total = db.scalar(select(func.count()).select_from(Image).where(*scoped, Image.user_id > last_user))
+    progress = _Progress(f"score {model_version}", total)
+
+    while True:
+        with SessionLocal() as db:
+            users = db.scalars(
+                select(Image.user_id)
+                .where(*scoped, Image.user_id > last_user)
+                .group_by(Image.user_id)
+                .order_by(Image.user_id)
+                .limit(args.page_size)
+            ).all()
+            if not users:
+                break
+            rows = db.execute(
+                select(Image.id, Image.user_id, Image.embedding)
+                .where(*scoped, Image.user_id.in_(users))
+                .order_by(Image.user_id, Image.id)
+            ).all()
+
+        by_user: Dict[str, list] = {}
+        for row in rows:
+            by_user.setdefault(row.user_id, []).append(row)
+        now = datetime.utcnow()
+        updates, below = [], 0
+        for user_rows in by_user.values():
+            if len(user_rows) < 2:
+                continue
+            matrix = np.stack([EmbeddingExtractor.from_bytes(r.embedding) for r in user_rows])
+            scores = _min_pairwise(matrix)
+            below += int((scores < threshold).sum())
+            updates.extend(
+                {"id": r.id, "match_score": float(s), "rescored_at": now}
+                for r, s in zip(user_rows, scores)
+            )
+        if updates:
+            with SessionLocal() as db:
+                db.execute(update(Image), updates)
+                db.commit()
+
+        last_user = users[-1]
+        state[last_user_key] = last_user
+        state["below_threshold"] = state.get("below_threshold", 0) + below
+        save_checkpoint(checkpoint, state)
+        progress.update(len(rows))
+
+    logger.info(
+        "Scoring done: %d images below threshold %.2f",
+        state.get("below_threshold", 0), threshold,
+    )
+
+
+# ================= ENTRY POINT =================
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Re-embed and re-score stored images.")
+    parser.add_argument("--workers", type=int, default=max(1, CPU_COUNT - 1))
+    parser.add_argument("--page-size", type=int, default=256, help="DB rows per page")
+    parser.add_argument("--chunk-size", type=int, default=8, help="Images per worker task")
+    parser.add_argument("--fetch-concurrency", type=int, default=16, help="Parallel image downloads/reads")
+    parser.add_argument("--checkpoint", type=Path, default=DEFAULT_CHECKPOINT)
+    parser.add_argument("--restart", action="store_true", help="Ignore an existing checkpoint")
+    parser.add_argument("--force", action="store_true", help="Re-embed rows already on the current model")
+    parser.add_argument(
+        "--from-originals", action="store_true",
+        help="Always download and detect on the original image, even when a face thumbnail exists",
+    )
+    parser.add_argument("--skip-embed", action="store_true")
+    parser.add_argument("--skip-score", action="store_true")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s [%(name)s] %(message)s")
+    Base.metadata.create_all(bind=engine)
+    add_missing_columns(engine)
+
+    # Split the CPU budget between workers so their pools don't oversubscribe;
+    # env vars set here are inherited by the spawned workers before NumPy loads
+    worker_threads = max(1, CPU_THREADS // args.workers)
+    configure_runtime(worker_threads, min(2, worker_threads))
+
+    # spawn: TensorFlow is not fork-safe
+    pool = ProcessPoolExecutor(
+        max_workers=args.workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker,
+        initargs=(worker_threads,),
+    )
+    with pool:
+        model_version = pool.submit(_worker_model_version).result()
+        state = {} if args.restart else load_checkpoint(args.checkpoint)
+        if state.get("model_version") != model_version or state.get("finished_at"):
+            if state.get("model_version") not in (None, model_version):
+                logger.info("Checkpoint is for %s; starting over", state.get("model_version"))
+            # Already-embedded rows are skipped by embedding_model, so a fresh run is cheap
+            state = {"model_version": model_version}
+        state["started_at"] = state.get("started_at") or datetime.utcnow().isoformat()
+
+        start = time.perf_counter()
+        if not args.skip_embed:
+            run_embed_pass(args, pool, model_version, state, args.checkpoint)
+    if not args.skip_score:
+        for version in (model_version, model_version + THUMBNAIL_MODEL_SUFFIX):
+            run_score_pass(args, version, state, args.checkpoint)
+    state["finished_at"] = datetime.utcnow().isoformat()
+    save_checkpoint(args.checkpoint, state)
+    logger.info("Backfill finished in %.1fs: %s", time.perf_counter() - start, state)
+
+
+if __name__ == "__main__":
+    main()
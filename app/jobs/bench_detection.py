@@ -0,0 +1,144 @@
+"""
+Detection latency and agreement: full-frame vs low-resolution proxy detection.
+
+    python -m app.jobs.bench_detection IMAGES_DIR [--sizes 0,480,640,960]
+                                       [--repeat 3] [--out results.json]
+
+Every image under IMAGES_DIR is decoded and capped at 1920 px like a request,
+then run through ``FaceDetector.detect_single_face`` once per
+``DETECTION_MAX_SIZE`` value (0 = the single-resolution path: detect on the
+full frame, DeepFace embeds from it). Reports per setting the p50/p95 of the
+detect stage and of detection + embedding, and, against the full-frame run,
+how often the detect/reject decision agrees, the face-box IoU and the
+embedding cosine similarity.
+"""
+import argparse
+import json
+import logging
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from app.config import CPU_AFFINITY, CPU_THREADS, TF_INTER_OP_THREADS
+from app.services.face_detector import FaceDetector
+from app.services.metrics import start_request_timer
+from app.services.runtime import configure_runtime
+from app.utils.image_utils import ImageProcessor
+
+logger = logging.getLogger("app.jobs.bench_detection")
+
+IMAGE_SUFFIXES = {".jpg", ".jpeg", ".png"}
+
+
+def _int_list(value: str) -> List[int]:
+    return [int(v) for v in value.split(",") if v.strip()]
+
+
+def _iou(a: List[int], b: List[int]) -> float:
+    ix = max(0, min(a[2], b[2]) - max(a[0], b[0]))
+    iy = max(0, min(a[3], b[3]) - max(a[1], b[1]))
+    inter = ix * iy
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+def _pct(samples: List[float]) -> Dict[str, float]:
+    if not samples:
+        return {"p50": 0.0, "p95": 0.0}
+    return {
+        "p50": round(float(np.percentile(samples, 50)), 1),
+        "p95": round(float(np.percentile(samples, 95)), 1),
+    }
+
+
+def run_setting(detector: FaceDetector, images: List[np.ndarray], repeat: int) -> Dict:
+    detect_ms, total_ms = [], []
+    faces = []
+    for image in images:
+        ok, face = False, None
+        for _ in range(repeat):
+            timer = start_request_timer()
+            ok, face, _ = detector.detect_single_face(image)
+            durations = timer.durations
+            detect_ms.append(durations.get("detect", 0.0) * 1000)
+            total_ms.append(sum(durations.values()) * 1000)
+        if ok:
+            area = face["facial_area"]
+            bbox = [area["x"], area["y"], area["x"] + area["w"], area["y"] + area["h"]]
+            embedding = face["encoding"] / (np.linalg.norm(face["encoding"]) or 1.0)
+            faces.append((bbox, embedding))
+        else:
+            faces.append(None)
+    return {"detect_ms": _pct(detect_ms), "total_ms": _pct(total_ms), "faces": faces}
+
+
+def compare(faces: List, reference: List) -> Dict:
+    agree = sum((f is None) == (r is None) for f, r in zip(faces, reference))
+    both = [(f, r) for f, r in zip(faces, reference) if f is not None and r is not None]
+    ious = [_iou(f[0], r[0]) for f, r in both]
+    cosines = [float(np.dot(f[1], r[1])) for f, r in both]
+    return {
+        "decision_agreement": round(agree / len(reference), 4) if reference else None,
+        "mean_iou": round(float(np.mean(ious)), 4) if ious else None,
+        "mean_cosine": round(float(np.mean(cosines)), 4) if cosines else None,
+        "min_cosine": round(float(np.min(cosines)), 4) if cosines else None,
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Benchmark proxy-resolution face detection.")
+    parser.add_argument("images", type=Path, help="directory of face images (searched recursively)")
+    parser.add_argument("--sizes", type=_int_list, default=[0, 480, 640, 960],
+                        help="DETECTION_MAX_SIZE values to compare; 0 = full frame (default: 0,480,640,960)")
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per image and setting")
+    parser.add_argument("--out", type=Path, help="write the summary as JSON")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s [%(name)s] %(message)s")
+    configure_runtime(CPU_THREADS, TF_INTER_OP_THREADS, CPU_AFFINITY)
+    paths = sorted(p for p in args.images.rglob("*") if p.suffix.lower() in IMAGE_SUFFIXES)
+    images = []
+    for path in paths:
+        image = ImageProcessor.bytes_to_numpy(path.read_bytes())
+        if image is None:
+            logger.warning("Skipping %s: not a decodable image", path)
+            continue
+        images.append(ImageProcessor.resize_image(image))
+    if not images:
+        parser.error(f"No images under {args.images}")
+
+    sizes = [0] + [s for s in args.sizes if s]
+    reference = None
+    summary = []
+    for size in sizes:
+        detector = FaceDetector(detection_size=size)
+        detector.load()
+        detector.detect_single_face(images[0])  # warm-up
+        logger.info("DETECTION_MAX_SIZE=%d on %d images x %d ...", size, len(images), args.repeat)
+        result = run_setting(detector, images, args.repeat)
+        if reference is None:
+            reference = result["faces"]
+        row = {
+            "detection_size": size,
+            "detect_ms": result["detect_ms"],
+            "total_ms": result["total_ms"],
+            "faces_found": sum(f is not None for f in result["faces"]),
+            **compare(result["faces"], reference),
+        }
+        summary.append(row)
+
+    print(f"\n{'size':>6} {'detect p50':>11} {'detect p95':>11} {'total p50':>10} "
+          f"{'faces':>6} {'agree':>6} {'IoU':>6} {'cos':>6} {'min cos':>8}")
+    for row in summary:
+        print(
+            f"{row['detection_size'] or 'full':>6} {row['detect_ms']['p50']:>11.1f} {row['detect_ms']['p95']:>11.1f} "
+            f"{row['total_ms']['p50']:>10.1f} {row['faces_found']:>6} {row['decision_agreement'] or 0:>6.3f} "
+            f"{row['mean_iou'] or 0:>6.3f} {row['mean_cosine'] or 0:>6.3f} {row['min_cosine'] or 0:>8.3f}"
+        )
+    if args.out:
+        args.out.write_text(json.dumps({"images": len(images), "results": summary}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
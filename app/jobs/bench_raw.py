@@ -0,0 +1,136 @@
+"""
+Request overhead of the framed binary endpoint vs multipart.
+
+    python -m app.jobs.bench_raw DATASET [--requests 200] [--no-cache]
+                                 [--url http://localhost:8000] [--out results.json]
+
+Sends the same triplets (DATASET layout as app.jobs.regression) alternately
+to ``POST /api/verify`` (multipart) and ``POST /api/verify-raw`` (one
+length-prefixed body) and reports, per endpoint, p50 / p95 of the client
+latency and of the server time (``total`` in Server-Timing, which includes
+multipart parsing: FastAPI parses the form before the handler runs, outside
+the ``read`` stage), and the request body size.
+
+With the result cache on (default) every triplet is sent once before timing,
+so the timed requests skip inference and what remains is transport, parsing
+and response encoding; ``--no-cache`` times the whole pipeline. Runs the app
+in-process unless ``--url`` points at a running server (its own cache
+settings then apply).
+"""
+import argparse
+import json
+import logging
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from app.jobs.regression import isolate_run, load_dataset, parse_server_timing, post_verify
+from app.utils.frames import FRAMES_MEDIA_TYPE, encode_frames
+
+logger = logging.getLogger("app.jobs.bench_raw")
+
+
+def post_verify_raw(client, images: Sequence[bytes], **params):
+    """Client helper: the 3 images as one framed body (params: store, user_id, early_exit)."""
+    return client.post(
+        "/api/verify-raw",
+        content=encode_frames(images),
+        headers={"Content-Type": FRAMES_MEDIA_TYPE},
+        params={k: str(v).lower() if isinstance(v, bool) else v for k, v in params.items() if v is not None},
+    )
+
+
+def _multipart_size(images: Sequence[bytes]) -> int:
+    from httpx import Request
+
+    files = [(f"image{i}", (f"image{i}.jpg", data, "image/jpeg")) for i, data in enumerate(images, 1)]
+    request = Request("POST", "http://bench/api/verify", files=files)
+    return len(request.read())
+
+
+def run(client, payloads: List[List[bytes]], requests: int, warm: bool) -> List[Dict]:
+    senders = {
+        "multipart": lambda images: post_verify(
+            client, [(f"image{i}.jpg", data) for i, data in enumerate(images, 1)], False
+        ),
+        "raw": lambda images: post_verify_raw(client, images, early_exit=False),
+    }
+    if warm:
+        for images in payloads:
+            senders["raw"](images)
+    samples = {name: {"client": [], "server": []} for name in senders}
+    for i in range(requests):
+        images = payloads[i % len(payloads)]
+        for name, send in senders.items():
+            start = time.perf_counter()
+            response = send(images)
+            elapsed = (time.perf_counter() - start) * 1000
+            if response.status_code >= 500:
+                raise RuntimeError(f"{name}: HTTP {response.status_code}: {response.text}")
+            samples[name]["client"].append(elapsed)
+            samples[name]["server"].append(
+                parse_server_timing(response.headers.get("server-timing", "")).get("total", 0.0)
+            )
+
+    body_bytes = {
+        "multipart": float(np.mean([_multipart_size(p) for p in payloads])),
+        "raw": float(np.mean([len(encode_frames(p)) for p in payloads])),
+    }
+    results = []
+    for name, stages in samples.items():
+        client, server = np.asarray(stages["client"]), np.asarray(stages["server"])
+        results.append({
+            "endpoint": name,
+            "requests": requests,
+            "p50_ms": round(float(np.percentile(client, 50)), 2),
+            "p95_ms": round(float(np.percentile(client, 95)), 2),
+            "server_p50_ms": round(float(np.percentile(server, 50)), 2),
+            "server_p95_ms": round(float(np.percentile(server, 95)), 2),
+            "body_bytes": round(body_bytes[name]),
+        })
+    return results
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Benchmark /api/verify-raw against multipart /api/verify.")
+    parser.add_argument("dataset", type=Path, help="same/ and different/ triplet folders (see app.jobs.regression)")
+    parser.add_argument("--requests", type=int, default=200, help="timed requests per endpoint")
+    parser.add_argument("--no-cache", action="store_true", help="time the full pipeline, not just request handling")
+    parser.add_argument("--url", help="benchmark a running server instead of the app in-process")
+    parser.add_argument("--out", type=Path, help="write the results as JSON")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s [%(name)s] %(message)s")
+    payloads = [[p.read_bytes() for p in images] for _, _, images in load_dataset(args.dataset)]
+    if not payloads:
+        parser.error(f"No triplets under {args.dataset}")
+
+    logger.info("%d triplets, %d requests per endpoint ...", len(payloads), args.requests)
+    if args.url:
+        import httpx
+
+        with httpx.Client(base_url=args.url, timeout=60) as client:
+            results = run(client, payloads, args.requests, not args.no_cache)
+    else:
+        isolate_run(CACHE_BACKEND="none" if args.no_cache else "memory", RATE_LIMIT_PER_MINUTE=0.0)
+        from fastapi.testclient import TestClient
+
+        from app.main import app
+
+        with TestClient(app) as client:
+            results = run(client, payloads, args.requests, not args.no_cache)
+
+    print(f"\n{'endpoint':>10} {'p50 ms':>8} {'p95 ms':>8} {'server p50':>11} {'server p95':>11} {'body KB':>8}")
+    for row in results:
+        print(
+            f"{row['endpoint']:>10} {row['p50_ms']:>8.2f} {row['p95_ms']:>8.2f} "
+            f"{row['server_p50_ms']:>11.2f} {row['server_p95_ms']:>11.2f} {row['body_bytes'] / 1024:>8.1f}"
+        )
+    if args.out:
+        args.out.write_text(json.dumps({"triplets": len(payloads), "cached": not args.no_cache, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+Throughput of /api/verify across thread-pool settings and request concurrency.
+
+    python -m app.jobs.bench_threads DATASET [--threads 1,2,4] [--concurrency 1,2,4,8]
+                                     [--requests 48] [--out results.json]
+
+Thread pools are sized when NumPy / OpenCV / TensorFlow load, so every
+``CPU_THREADS`` value runs in a fresh child process. Each child sends
+``--requests`` verifications through the app in-process at every concurrency
+level (triplets from the same DATASET layout as app.jobs.regression, result
+cache and rate limit off, no admission limit) and reports requests/s and
+p50/p95 latency. Per-library env vars (OMP_NUM_THREADS, ...) are cleared for
+the children so CPU_THREADS alone decides.
+"""
+import argparse
+import json
+import logging
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from app.services.runtime import BLAS_ENV_VARS, available_cpus, parse_cpu_list
+
+logger = logging.getLogger("app.jobs.bench_threads")
+
+
+def _child(dataset: Path, threads: int, concurrency: List[int], requests: int) -> None:
+    """Run inside the child: one JSON line per concurrency level on stdout."""
+    # Same isolation as app.jobs.regression.isolate_run (not imported: it
+    # loads NumPy), patched into app.config so a project .env cannot win; no
+    # admission limit so concurrency is what the pools see
+    import app.config as config
+
+    config.CACHE_BACKEND = "none"
+    config.RATE_LIMIT_PER_MINUTE = 0.0
+    config.INFERENCE_CONCURRENCY = 0
+    config.CPU_THREADS = threads
+    config.TF_INTER_OP_THREADS = min(2, threads)
+    # app.main configures the thread pools on import, before NumPy loads
+    from app.main import app
+
+    import numpy as np
+    from fastapi.testclient import TestClient
+
+    from app.jobs.regression import load_dataset, post_verify
+    from app.services.runtime import runtime_info
+
+    payloads = [[(p.name, p.read_bytes()) for p in images] for _, _, images in load_dataset(dataset)]
+    with TestClient(app) as client:
+        post_verify(client, payloads[0], False)  # warm-up: model load, first-call allocations
+
+        def one(i: int) -> float:
+            start = time.perf_counter()
+            response = post_verify(client, payloads[i % len(payloads)], False)
+            if response.status_code >= 500:
+                raise RuntimeError(f"HTTP {response.status_code}: {response.text}")
+            return (time.perf_counter() - start) * 1000
+
+        for level in concurrency:
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=level) as pool:
+                latencies = np.asarray(list(pool.map(one, range(requests))))
+            elapsed = time.perf_counter() - start
+            print(json.dumps({
+                "threads": runtime_info()["cpu_threads"],
+                "concurrency": level,
+                "requests_per_s": round(requests / elapsed, 2),
+                "p50_ms": round(float(np.percentile(latencies, 50)), 1),
+                "p95_ms": round(float(np.percentile(latencies, 95)), 1),
+            }), flush=True)
+
+
+def _run_setting(threads: int, args) -> List[Dict]:
+    env = {k: v for k, v in os.environ.items() if k not in BLAS_ENV_VARS}
+    env.pop("TF_NUM_INTRAOP_THREADS", None)
+    env.pop("TF_NUM_INTEROP_THREADS", None)
+    cmd = [
+        sys.executable, "-m", "app.jobs.bench_threads", str(args.dataset), "--child", str(threads),
+        "--concurrency", ",".join(map(str, args.concurrency)), "--requests", str(args.requests),
+    ]
+    proc = subprocess.run(cmd, env=env, stdout=subprocess.PIPE, check=True, text=True)
+    return [json.loads(line) for line in proc.stdout.splitlines() if line.startswith("{")]
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Benchmark verify throughput across thread settings.")
+    parser.add_argument("dataset", type=Path, help="same/ and different/ triplet folders (see app.jobs.regression)")
+    parser.add_argument("--threads", type=parse_cpu_list, help="CPU_THREADS values, e.g. 1,2,4 (default: 1, 2, 4 and all available CPUs)")
+    parser.add_argument("--concurrency", type=parse_cpu_list, default=[1, 2, 4, 8])
+    parser.add_argument("--requests", type=int, default=48, help="verifications per concurrency level")
+    parser.add_argument("--out", type=Path, help="write all results as JSON")
+    parser.add_argument("--child", type=int, metavar="THREADS", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        logging.basicConfig(level=logging.WARNING)
+        _child(args.dataset, args.child, args.concurrency, args.requests)
+        return
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s [%(name)s] %(message)s")
+    cpus = available_cpus()
+    threads = args.threads or sorted({1, 2, 4, cpus} & set(range(1, cpus + 1)))
+    results = []
+    for t in threads:
+        logger.info("CPU_THREADS=%d ...", t)
+        results.extend(_run_setting(t, args))
+
+    print(f"\n{'threads':>7} {'concurrency':>11} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8}")
+    for r in results:
+        print(
+            f"{r['threads']:>7} {r['concurrency']:>11} {r['requests_per_s']:>8.2f} "
+            f"{r['p50_ms']:>8.1f} {r['p95_ms']:>8.1f}"
+        )
+    best = max(results, key=lambda r: r["requests_per_s"])
+    print(f"\nBest: CPU_THREADS={best['threads']} at concurrency {best['concurrency']} "
+          f"({best['requests_per_s']:.2f} req/s, {cpus} CPUs available)")
+    if args.out:
+        args.out.write_text(json.dumps({"cpus": cpus, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,318 @@
+"""
+Offline near-duplicate face clustering across users.
+
+    python -m app.jobs.cluster_faces [--store embeddings.fvemb] [--threshold 0.75]
+                                     [--block-rows 4096] [--workers N]
+                                     [--out clusters.jsonl] [--db]
+                                     [--min-users 2] [--model NAME] [--verified-only]
+
+Finds every group of stored images linked by pairs whose cosine similarity is
+at or above the threshold (single linkage) and that spans at least
+``--min-users`` different ``user_id`` values: the same face on several
+accounts.
+
+Embeddings come from an EmbeddingStore file (``--store``; exported from the
+DB first when the file does not exist, or to a temporary file without
+``--store``), memory-mapped so the worker processes share the page cache. The
+N x N similarity matrix is never materialized: rows are split into blocks of
+``--block-rows`` and each task multiplies one row block against itself and
+every later block (upper triangle only) as float32 tiles, returning just the
+pairs above the threshold. The parent merges pairs into a union-find over row
+indices as tasks finish, so memory is O(rows) plus one tile per worker.
+
+Clusters are written as NDJSON (``--out``) and/or as ``face_clusters`` rows
+tagged with the run's start time (``--db``).
+"""
+import argparse
+import json
+import logging
+import multiprocessing
+import shutil
+import tempfile
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import insert, select
+
+from app.config import CPU_COUNT, CPU_THREADS
+from app.db.database import Base, SessionLocal, engine
+from app.db.models import FaceCluster, Image
+from app.jobs.export_embeddings import _default_model, export
+from app.services.embedding_store import EmbeddingStore
+from app.services.runtime import configure_runtime
+from app.services.similarity import SimilarityComputer
+
+logger = logging.getLogger("app.jobs.cluster_faces")
+
+# (row indices, row indices, similarity) of linked pairs
+Pairs = Tuple[np.ndarray, np.ndarray, np.ndarray]
+
+
+# ================= UNION-FIND =================
+
+class UnionFind:
+    """Disjoint sets over row indices 0..n-1 in one integer array."""
+
+    def __init__(self, n: int):
+        self.parent = np.arange(n, dtype=np.int32 if n < 2**31 else np.int64)
+
+    def find(self, x: int) -> int:
+        parent = self.parent
+        while parent[x] != x:
+            # path halving
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return int(x)
+
+    def union_pairs(self, rows: np.ndarray, cols: np.ndarray) -> None:
+        parent = self.parent
+        for a, b in zip(rows.tolist(), cols.tolist()):
+            ra, rb = self.find(a), self.find(b)
+            if ra != rb:
+                # smaller index becomes the root, so roots are stable across runs
+                if ra < rb:
+                    parent[rb] = ra
+                else:
+                    parent[ra] = rb
+
+    def roots(self) -> np.ndarray:
+        """Root of every row (fully compressed, vectorized)."""
+        parent = self.parent
+        while True:
+            grand = parent[parent]
+            if np.array_equal(grand, parent):
+                return parent
+            parent = grand
+
+
+# ================= WORKER PROCESS =================
+
+_store: Optional[EmbeddingStore] = None
+
+
+def _open_store(path: str) -> None:
+    global _store
+    _store = EmbeddingStore.load(path, mmap=True)
+
+
+def _init_worker(path: str, threads: int) -> None:
+    configure_runtime(threads, 1)
+    _open_store(path)
+
+
+def _row_block_pairs(start: int, block_rows: int, threshold: float) -> Pairs:
+    """Pairs between rows ``start:start + block_rows`` and every row at or after ``start``."""
+    a = _store.block(start, block_rows)
+    found = []
+    for j in range(start, len(_store), block_rows):
+        b = a if j == start else _store.block(j, block_rows)
+        rows, cols, sims = SimilarityComputer.pairs_above(a, b, threshold, upper=j == start)
+        found.append((rows + start, cols + j, sims))
+    return (
+        np.concatenate([f[0] for f in found]).astype(np.int32),
+        np.concatenate([f[1] for f in found]).astype(np.int32),
+        np.concatenate([f[2] for f in found]),
+    )
+
+
+def find_pairs(path: Path, count: int, block_rows: int, threshold: float, workers: int) -> Iterator[Pairs]:
+    """Pairs above ``threshold``, one row block at a time (at most 2 x workers blocks pending)."""
+    starts = range(0, count, block_rows)
+    if workers <= 1:
+        _open_store(str(path))
+        for start in starts:
+            yield _row_block_pairs(start, block_rows, threshold)
+        return
+
+    # spawn: workers map the store themselves; nothing large is pickled
+    pool = ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker,
+        initargs=(str(path), max(1, CPU_THREADS // workers)),
+    )
+    with pool:
+        # Block 0 has the most tiles; submitting in order keeps the tail short
+        pending = deque()
+        for start in starts:
+            pending.append(pool.submit(_row_block_pairs, start, block_rows, threshold))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+# ================= USERS =================
+
+def _user_codes(ids: np.ndarray, page_size: int) -> Tuple[np.ndarray, List[str]]:
+    """Per-row int32 user code aligned with ``ids`` (-1 = no user_id) and the code -> user_id table."""
+    codes = np.full(len(ids), -1, dtype=np.int32)
+    users: Dict[str, int] = {}
+    if not len(ids):
+        return codes, []
+    order = np.argsort(ids, kind="stable")
+    sorted_ids = ids[order]
+    last_id, max_id = int(sorted_ids[0]) - 1, int(sorted_ids[-1])
+    while True:
+        with SessionLocal() as db:
+            rows = db.execute(
+                select(Image.id, Image.user_id)
+                .where(Image.id > last_id, Image.id <= max_id)
+                .order_by(Image.id)
+                .limit(page_size)
+            ).all()
+        if not rows:
+            break
+        page_ids = np.fromiter((r.id for r in rows), dtype=np.int64, count=len(rows))
+        page_codes = np.fromiter(
+            (-1 if r.user_id is None else users.setdefault(r.user_id, len(users)) for r in rows),
+            dtype=np.int32, count=len(rows),
+        )
+        pos = np.minimum(np.searchsorted(sorted_ids, page_ids), len(sorted_ids) - 1)
+        hit = sorted_ids[pos] == page_ids
+        codes[order[pos[hit]]] = page_codes[hit]
+        last_id = rows[-1].id
+    return codes, list(users)
+
+
+# ================= CLUSTERS =================
+
+def cluster(
+    path: Path, threshold: float, block_rows: int, workers: int, min_users: int, page_size: int
+) -> List[Dict]:
+    """Cross-user clusters, most users first."""
+    store = EmbeddingStore.load(path, mmap=True)
+    n = len(store)
+    ids = np.asarray(store.ids)
+    codes, user_names = _user_codes(ids, page_size)
+
+    sets = UnionFind(n)
+    best = np.full(n, -np.inf, dtype=np.float32)
+    blocks = -(-n // block_rows)
+    tiles_total = blocks * (blocks + 1) // 2
+    tiles_done = pairs_total = 0
+    start = time.perf_counter()
+    for i, (rows, cols, sims) in enumerate(find_pairs(path, n, block_rows, threshold, workers)):
+        sets.union_pairs(rows, cols)
+        np.maximum.at(best, rows, sims)
+        np.maximum.at(best, cols, sims)
+        tiles_done += blocks - i
+        pairs_total += len(rows)
+        elapsed = time.perf_counter() - start
+        logger.info(
+            "Block %d/%d: %d/%d tiles, %d pairs >= %.2f (%.0f rows^2/s)",
+            i + 1, blocks, tiles_done, tiles_total, pairs_total, threshold,
+            tiles_done * block_rows * block_rows / max(elapsed, 1e-9),
+        )
+
+    linked = np.flatnonzero(np.isfinite(best))
+    if not len(linked):
+        return []
+    roots = sets.roots()[linked]
+    order = np.argsort(roots, kind="stable")
+    groups = np.split(linked[order], np.flatnonzero(np.diff(roots[order])) + 1)
+
+    clusters = []
+    for group in groups:
+        group_codes = codes[group]
+        users = np.unique(group_codes[group_codes >= 0])
+        if len(users) < min_users:
+            continue
+        clusters.append({
+            "size": len(group),
+            "users": [user_names[c] for c in users],
+            "max_similarity": round(float(best[group].max()), 4),
+            "images": [
+                {
+                    "image_id": int(ids[r]),
+                    "user_id": user_names[codes[r]] if codes[r] >= 0 else None,
+                    "max_similarity": round(float(best[r]), 4),
+                }
+                for r in group
+            ],
+        })
+    clusters.sort(key=lambda c: (-len(c["users"]), -c["size"], c["images"][0]["image_id"]))
+    return [{"cluster": k, **c} for k, c in enumerate(clusters)]
+
+
+def write_file(out: Path, clusters: List[Dict], run_id: str) -> None:
+    out.parent.mkdir(parents=True, exist_ok=True)
+    with open(out, "w") as f:
+        for c in clusters:
+            f.write(json.dumps({"run_id": run_id, **c}) + "\n")
+
+
+def write_db(clusters: List[Dict], run_id: str, page_size: int) -> None:
+    Base.metadata.create_all(bind=engine, tables=[FaceCluster.__table__])
+    rows = [
+        {"run_id": run_id, "cluster": c["cluster"], **image}
+        for c in clusters
+        for image in c["images"]
+    ]
+    with SessionLocal() as db:
+        for i in range(0, len(rows), page_size):
+            db.execute(insert(FaceCluster), rows[i:i + page_size])
+        db.commit()
+
+
+# ================= ENTRY POINT =================
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Cluster near-duplicate faces across users.")
+    parser.add_argument("--store", type=Path, help="EmbeddingStore file; exported from the DB if missing")
+    parser.add_argument("--threshold", type=float, default=SimilarityComputer.SAME_PERSON_THRESHOLD)
+    parser.add_argument("--block-rows", type=int, default=4096, help="rows per tile side")
+    parser.add_argument("--workers", type=int, default=max(1, CPU_COUNT - 1))
+    parser.add_argument("--min-users", type=int, default=2, help="report clusters spanning this many users")
+    parser.add_argument("--out", type=Path, help="write clusters as NDJSON")
+    parser.add_argument("--db", action="store_true", help="insert clusters into the face_clusters table")
+    parser.add_argument("--model", help="embedding_model to export (default: most common)")
+    parser.add_argument("--dtype", choices=["float16", "int8"], default="float16", help="dtype when exporting")
+    parser.add_argument("--verified-only", action="store_true", help="export only verified images")
+    parser.add_argument("--page-size", type=int, default=10000, help="DB rows per page")
+    args = parser.parse_args(argv)
+    if not args.out and not args.db:
+        parser.error("Nothing to write: pass --out and/or --db")
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s [%(name)s] %(message)s")
+    # Split the CPU budget between workers; inherited by the spawned workers
+    configure_runtime(max(1, CPU_THREADS // max(1, args.workers)), 1)
+    run_id = datetime.utcnow().isoformat(timespec="seconds")
+    start = time.perf_counter()
+
+    tmpdir = None
+    path = args.store
+    if path is None or not path.exists():
+        model = args.model or _default_model()
+        if model is None:
+            parser.error("No embeddings in the database; run app.jobs.backfill first")
+        if path is None:
+            tmpdir = tempfile.mkdtemp(prefix="cluster_faces.")
+            path = Path(tmpdir) / "embeddings.fvemb"
+        logger.info("Exporting %s embeddings to %s", model, path)
+        export(path, args.dtype, model, args.verified_only, args.page_size)
+
+    try:
+        clusters = cluster(path, args.threshold, args.block_rows, args.workers, args.min_users, args.page_size)
+    finally:
+        if tmpdir:
+            shutil.rmtree(tmpdir, ignore_errors=True)
+
+    if args.out:
+        write_file(args.out, clusters, run_id)
+    if args.db:
+        write_db(clusters, run_id, args.page_size)
+    logger.info(
+        "Run %s: %d clusters spanning >= %d users (%d images) in %.1fs",
+        run_id, len(clusters), args.min_users, sum(c["size"] for c in clusters),
+        time.perf_counter() - start,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Export stored image embeddings to a compact memory-mapped EmbeddingStore file.
+
+    python -m app.jobs.export_embeddings OUT.fvemb [--dtype float16|int8] [--model NAME]
+                                         [--verified-only] [--page-size 10000]
+
+Reads ``images.embedding`` (written at store time and by app.jobs.backfill)
+page by page, keeping only rows produced by one embedding model (default:
+the most common one), and writes them with the image id as row id.
+"""
+import argparse
+import logging
+import time
+from pathlib import Path
+from typing import List, Optional
+
+import numpy as np
+from sqlalchemy import func, select
+
+from app.db.database import SessionLocal
+from app.db.models import Image
+from app.services.embedding import EmbeddingExtractor
+from app.services.embedding_store import EmbeddingStore
+
+logger = logging.getLogger("app.jobs.export_embeddings")
+
+
+def _default_model() -> Optional[str]:
+    with SessionLocal() as db:
+        row = db.execute(
+            select(Image.embedding_model, func.count())
+            .where(Image.embedding_model.is_not(None))
+            .group_by(Image.embedding_model)
+            .order_by(func.count().desc())
+            .limit(1)
+        ).first()
+    return row[0] if row else None
+
+
+def export(out: Path, dtype: str, model: str, verified_only: bool, page_size: int) -> EmbeddingStore:
+    filters = [Image.embedding_model == model, Image.embedding.is_not(None)]
+    if verified_only:
+        filters.append(Image.verified.is_(True))
+    with SessionLocal() as db:
+        total = db.scalar(select(func.count()).select_from(Image).where(*filters))
+
+    store = None
+    last_id = 0
+    while True:
+        with SessionLocal() as db:
+            rows = db.execute(
+                select(Image.id, Image.embedding)
+                .where(*filters, Image.id > last_id)
+                .order_by(Image.id)
+                .limit(page_size)
+            ).all()
+        if not rows:
+            break
+        matrix = np.stack([EmbeddingExtractor.from_bytes(r.embedding) for r in rows])
+        if store is None:
+            store = EmbeddingStore(model, matrix.shape[1], dtype, capacity=max(total, 1))
+        store.add(np.fromiter((r.id for r in rows), dtype=np.int64, count=len(rows)), matrix)
+        last_id = rows[-1].id
+        logger.info("Exported %d/%d embeddings", len(store), total)
+
+    if store is None:
+        store = EmbeddingStore(model, EmbeddingExtractor().embedding_dim, dtype, capacity=1)
+    store.save(out)
+    return store
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Export image embeddings to a compact store file.")
+    parser.add_argument("out", type=Path)
+    parser.add_argument("--dtype", choices=["float16", "int8"], default="float16")
+    parser.add_argument("--model", help="embedding_model to export (default: most common)")
+    parser.add_argument("--verified-only", action="store_true")
+    parser.add_argument("--page-size", type=int, default=10000)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s [%(name)s] %(message)s")
+    model = args.model or _default_model()
+    if model is None:
+        parser.error("No embeddings in the database; run app.jobs.backfill first")
+    start = time.perf_counter()
+    store = export(args.out, args.dtype, model, args.verified_only, args.page_size)
+    logger.info(
+        "Wrote %d x %d %s embeddings (%s, %.1f MB) to %s in %.1fs",
+        len(store), store.dim, store.dtype, store.model_name,
+        store.nbytes / 1e6, args.out, time.perf_counter() - start,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,348 @@
+"""
+Golden-dataset accuracy and latency regression check.
+
+    python -m app.jobs.regression DATASET [--baseline eval/baseline.json]
+                                  [--update-baseline] [--report out.json]
+                                  [--repeat 1] [--warmup 1] [--early-exit]
+                                  [--stub-model]
+
+Runs every labelled triplet in a local dataset through ``POST /api/verify``
+in-process (full request path: upload parsing, middleware, decode, detection,
+embedding, similarity) and records
+
+- FAR / FRR at ``SAME_PERSON_THRESHOLD``,
+- p50 / p95 latency per pipeline stage (from the Server-Timing header) and
+  end to end,
+- peak RSS of the process.
+
+Dataset layout (no network access; image names are sorted, first three used):
+
+    DATASET/same/<case>/*.jpg        three photos of one person
+    DATASET/different/<case>/*.jpg   at least one photo of someone else
+
+Requests that fail outright (5xx, 429) are not a verdict: they are left out
+of FAR/FRR and counted separately. The result is compared against a stored
+baseline; the exit status is 1 when failed requests appear or FAR/FRR rise or
+latency / peak RSS grow beyond the tolerances, so it can gate CI.
+``--update-baseline`` records the current run as the new baseline (refused
+while requests fail).
+
+``--stub-model`` swaps DeepFace for the deterministic ``StubDeepFace`` from
+``app.jobs.synthetic``. Together with the committed fixture set this runs
+offline with no weights or TensorFlow:
+
+    python -m app.jobs.regression eval/synthetic --stub-model \
+        --baseline eval/synthetic/baseline.json
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import resource
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger("app.jobs.regression")
+
+IMAGE_SUFFIXES = {".jpg", ".jpeg", ".png", ".webp"}
+LABELS = {"same": True, "different": False}
+
+# A triplet: (case id, same_person label, three image paths)
+Triplet = Tuple[str, bool, List[Path]]
+
+
+def load_dataset(root: Path) -> List[Triplet]:
+    triplets = []
+    for label, same in LABELS.items():
+        folder = root / label
+        if not folder.is_dir():
+            continue
+        for case in sorted(p for p in folder.iterdir() if p.is_dir()):
+            images = sorted(p for p in case.iterdir() if p.suffix.lower() in IMAGE_SUFFIXES)
+            if len(images) < 3:
+                logger.warning("Skipping %s: needs 3 images, found %d", case, len(images))
+                continue
+            triplets.append((f"{label}/{case.name}", same, images[:3]))
+    return triplets
+
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def parse_server_timing(header: str) -> Dict[str, float]:
+    """``name;dur=12.3, ...`` -> {name: ms}."""
+    out = {}
+    for part in header.split(","):
+        name, _, params = part.strip().partition(";")
+        if name and params.startswith("dur="):
+            out[name] = float(params[4:])
+    return out
+
+
+def _percentiles(samples: List[float]) -> Dict[str, float]:
+    values = np.asarray(samples, dtype=np.float64)
+    return {
+        "p50": round(float(np.percentile(values, 50)), 2),
+        "p95": round(float(np.percentile(values, 95)), 2),
+    }
+
+
+def request_failed(status_code: int) -> bool:
+    """Server error or rate limit: the pipeline gave no verdict."""
+    return status_code >= 500 or status_code == 429
+
+
+def post_verify(client, files: List[Tuple[str, bytes]], early_exit: bool):
+    upload = [
+        (f"image{i}", (name, data, "application/octet-stream"))
+        for i, (name, data) in enumerate(files, 1)
+    ]
+    return client.post(
+        "/api/verify", files=upload, params={"early_exit": str(early_exit).lower()}
+    )
+
+
+def run(triplets: List[Triplet], repeat: int, warmup: int, early_exit: bool, stub_model: bool = False) -> Dict:
+    """Run the dataset in-process and return the measurements."""
+    from fastapi.testclient import TestClient
+
+    from app.api.verify import get_services
+    from app.main import app
+
+    accepts = {True: 0, False: 0}
+    totals = {True: 0, False: 0}
+    errors: Dict[str, int] = {}
+    failed = 0
+    cases = []
+    request_ms: List[float] = []
+    stage_ms: Dict[str, List[float]] = {}
+
+    with TestClient(app) as client:
+        detector, _, comparator = get_services()
+        payloads = [
+            [(p.name, p.read_bytes()) for p in images] for _, _, images in triplets
+        ]
+        for i in range(min(warmup, len(payloads))):
+            post_verify(client, payloads[i], early_exit)
+
+        for _ in range(repeat):
+            for (case, same, _), files in zip(triplets, payloads):
+                start = time.perf_counter()
+                response = post_verify(client, files, early_exit)
+                elapsed = (time.perf_counter() - start) * 1000
+                request_ms.append(elapsed)
+                for name, ms in parse_server_timing(response.headers.get("Server-Timing", "")).items():
+                    stage_ms.setdefault(name, []).append(ms)
+
+                accepted, min_similarity = None, None
+                if response.status_code == 200:
+                    body = response.json()
+                    accepted = body["result"] == "SAME_PERSON"
+                    min_similarity = body["analysis"].get("min_similarity")
+                else:
+                    errors[str(response.status_code)] = errors.get(str(response.status_code), 0) + 1
+                    if not request_failed(response.status_code):
+                        # Rejected before comparison (no face, quality) counts as "not same"
+                        accepted = False
+                if accepted is None:
+                    # No verdict; counting it as a reject would hide it in FAR
+                    failed += 1
+                else:
+                    totals[same] += 1
+                    accepts[same] += accepted
+                cases.append({
+                    "case": case,
+                    "same_person": same,
+                    "accepted": accepted,
+                    "status": response.status_code,
+                    "min_similarity": min_similarity,
+                    "ms": round(elapsed, 1),
+                })
+
+    far = accepts[False] / totals[False] if totals[False] else 0.0
+    frr = (totals[True] - accepts[True]) / totals[True] if totals[True] else 0.0
+    return {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "model": detector.result_key,
+        "threshold": comparator.SAME_PERSON_THRESHOLD,
+        "early_exit": early_exit,
+        "stub_model": stub_model,
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "triplets": {"same": totals[True], "different": totals[False]},
+        "accuracy": {
+            "far": round(far, 4),
+            "frr": round(frr, 4),
+            "false_accepts": accepts[False],
+            "false_rejects": totals[True] - accepts[True],
+            "errors": errors,
+            "failed_requests": failed,
+        },
+        "latency_ms": {
+            "request": _percentiles(request_ms),
+            "stages": {name: _percentiles(v) for name, v in sorted(stage_ms.items())},
+        },
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "cases": cases,
+    }
+
+
+def compare(
+    current: Dict,
+    baseline: Dict,
+    max_far_increase: float,
+    max_frr_increase: float,
+    latency_tolerance: float,
+    latency_floor_ms: float,
+    rss_tolerance: float,
+) -> List[str]:
+    """Return the regressions of ``current`` against ``baseline`` (empty = pass)."""
+    failures = []
+    now, before = current["accuracy"].get("failed_requests", 0), baseline["accuracy"].get("failed_requests", 0)
+    if now > before:
+        failures.append(
+            f"{now} failed requests (5xx / 429) > baseline {before}: {current['accuracy']['errors']}"
+        )
+    for metric, allowed in (("far", max_far_increase), ("frr", max_frr_increase)):
+        now, before = current["accuracy"][metric], baseline["accuracy"][metric]
+        if now > before + allowed:
+            failures.append(f"{metric.upper()} {now:.4f} > baseline {before:.4f} + {allowed:.4f}")
+
+    def check_latency(label: str, now: Dict[str, float], before: Dict[str, float]) -> None:
+        for pct in ("p50", "p95"):
+            limit = max(before[pct] * (1 + latency_tolerance), before[pct] + latency_floor_ms)
+            if now[pct] > limit:
+                failures.append(
+                    f"{label} {pct} {now[pct]:.1f} ms > {limit:.1f} ms "
+                    f"(baseline {before[pct]:.1f} ms)"
+                )
+
+    check_latency("request", current["latency_ms"]["request"], baseline["latency_ms"]["request"])
+    base_stages = baseline["latency_ms"]["stages"]
+    for name, now in current["latency_ms"]["stages"].items():
+        if name in base_stages:
+            check_latency(f"stage {name}", now, base_stages[name])
+
+    rss_limit = baseline["peak_rss_mb"] * (1 + rss_tolerance)
+    if current["peak_rss_mb"] > rss_limit:
+        failures.append(
+            f"peak RSS {current['peak_rss_mb']:.0f} MB > {rss_limit:.0f} MB "
+            f"(baseline {baseline['peak_rss_mb']:.0f} MB)"
+        )
+    return failures
+
+
+def isolate_run(**settings) -> None:
+    """
+    Force ``app.config`` settings for this process, e.g.
+    ``isolate_run(CACHE_BACKEND="none")``. Must run before ``app.main`` is
+    imported. Env vars cannot do this: the project .env is loaded with
+    override=True and would win over them.
+    """
+    if "app.main" in sys.modules:
+        raise RuntimeError("isolate_run() must be called before app.main is imported")
+    import app.config as config
+
+    for name, value in settings.items():
+        current = getattr(config, name)
+        if current != value:
+            logger.info("Overriding %s=%r with %r for this run", name, current, value)
+        setattr(config, name, value)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Accuracy/latency regression check on a golden dataset.")
+    parser.add_argument("dataset", type=Path, help="directory with same/ and different/ triplet folders")
+    parser.add_argument("--baseline", type=Path, default=Path("eval/baseline.json"))
+    parser.add_argument("--update-baseline", action="store_true", help="write this run as the baseline")
+    parser.add_argument("--report", type=Path, help="also write this run's full report here")
+    parser.add_argument("--repeat", type=int, default=1, help="passes over the dataset (more = steadier latency)")
+    parser.add_argument("--warmup", type=int, default=1, help="untimed triplets before measuring")
+    parser.add_argument("--early-exit", action="store_true", help="measure the early-exit verify mode")
+    parser.add_argument("--stub-model", action="store_true",
+                        help="use the deterministic StubDeepFace (app.jobs.synthetic) instead of DeepFace")
+    parser.add_argument("--max-far-increase", type=float, default=0.0)
+    parser.add_argument("--max-frr-increase", type=float, default=0.02)
+    parser.add_argument("--latency-tolerance", type=float, default=0.25, help="allowed relative p50/p95 growth")
+    parser.add_argument("--latency-floor-ms", type=float, default=5.0, help="ignore growth below this (noise)")
+    parser.add_argument("--rss-tolerance", type=float, default=0.15, help="allowed relative peak RSS growth")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s [%(name)s] %(message)s")
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    triplets = load_dataset(args.dataset)
+    if not any(same for _, same, _ in triplets) or all(same for _, same, _ in triplets):
+        parser.error(f"{args.dataset} needs at least one same/ and one different/ triplet")
+    baseline = None
+    if not args.update_baseline:
+        if not args.baseline.exists():
+            parser.error(f"No baseline at {args.baseline}; run once with --update-baseline")
+        baseline = json.loads(args.baseline.read_text())
+        if baseline.get("stub_model", False) != args.stub_model:
+            parser.error(
+                f"{args.baseline} was recorded {'with' if baseline.get('stub_model') else 'without'} "
+                "--stub-model; the run must match"
+            )
+
+    # Every request must do the full work: no result cache, no rate limit
+    isolate_run(CACHE_BACKEND="none", RATE_LIMIT_PER_MINUTE=0.0)
+    if args.stub_model:
+        import app.services.face_detector as face_detector
+        from app.jobs.synthetic import StubDeepFace
+
+        # No weights to check or download; _load_deepface() keeps a preset module
+        face_detector.MODEL_ALLOW_DOWNLOAD = True
+        face_detector.DeepFace = StubDeepFace
+        logger.info("Using StubDeepFace: checks the harness, not model accuracy")
+    logger.info("Running %d triplets x %d from %s", len(triplets), args.repeat, args.dataset)
+    current = run(triplets, args.repeat, args.warmup, args.early_exit, args.stub_model)
+    accuracy, latency = current["accuracy"], current["latency_ms"]["request"]
+    logger.info(
+        "FAR %.4f FRR %.4f at threshold %.2f | %d failed | request p50 %.1f ms p95 %.1f ms | peak RSS %.0f MB",
+        accuracy["far"], accuracy["frr"], current["threshold"], accuracy["failed_requests"],
+        latency["p50"], latency["p95"], current["peak_rss_mb"],
+    )
+    for name, pct in current["latency_ms"]["stages"].items():
+        logger.info("  %-15s p50 %8.1f ms  p95 %8.1f ms", name, pct["p50"], pct["p95"])
+
+    if args.report:
+        args.report.parent.mkdir(parents=True, exist_ok=True)
+        args.report.write_text(json.dumps(current, indent=2))
+
+    if args.update_baseline:
+        if accuracy["failed_requests"]:
+            logger.error(
+                "Not writing a baseline: %d requests failed (%s)", accuracy["failed_requests"], accuracy["errors"]
+            )
+            sys.exit(1)
+        args.baseline.parent.mkdir(parents=True, exist_ok=True)
+        args.baseline.write_text(json.dumps(current, indent=2))
+        logger.info("Baseline written to %s", args.baseline)
+        return
+
+    for key in ("model", "threshold", "early_exit"):
+        if baseline.get(key) != current[key]:
+            logger.warning("Baseline %s %r differs from current %r", key, baseline.get(key), current[key])
+    failures = compare(
+        current, baseline,
+        args.max_far_increase, args.max_frr_increase,
+        args.latency_tolerance, args.latency_floor_ms, args.rss_tolerance,
+    )
+    if failures:
+        for failure in failures:
+            logger.error("REGRESSION: %s", failure)
+        sys.exit(1)
+    logger.info("No regression against %s", args.baseline)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,444 @@
+"""
+Tiered retention of locally stored originals.
+
+    python -m app.jobs.storage_lifecycle [--recompress-days 30] [--archive-days 180]
+                                         [--max-side 1920] [--quality 85]
+                                         [--io-mb-per-s 20] [--compact-below 0.5]
+                                         [--loop [--interval-minutes 60]] [--dry-run]
+
+Originals saved under UPLOAD_DIR (Cloudinary URLs are left alone) move
+through tiers by age since ``verified_at`` (``created_at`` when unverified):
+
+1. archive (``--archive-days``): appended to a packed segment under
+   ARCHIVE_DIR (``app/services/archive.py``), recompressed on the way if
+   still original; ``storage_path`` becomes a ``pack:`` reference that reads
+   back with one positioned read.
+2. recompress (``--recompress-days``): re-encoded as JPEG with the long side
+   capped at ``--max-side`` (default 1920, the size requests are analysed at)
+   and ``--quality``, keeping EXIF / ICC. Images that would not get smaller
+   keep their original file.
+3. compact: segments whose bytes still referenced by a row fell below
+   ``--compact-below`` of the file are rewritten into the current segment.
+
+Each move writes and fsyncs the new copy first, then swaps it into the row
+with a conditional UPDATE (``WHERE storage_path = <old path>``), so a row
+always points at a complete file and a concurrent change to the row wins.
+Superseded files are deleted ``--grace-minutes`` after the commit, so reads
+that already looked up the old path still succeed; pending deletions live in
+the state file and are finished by the next run.
+
+Rows are processed in id pages and only rows due for a tier are selected, so
+a run is incremental and can be interrupted at any point. All file reads and
+writes are paced to ``--io-mb-per-s`` at low CPU priority so the job can run
+next to the API; ``--loop`` keeps it running, one pass per
+``--interval-minutes``. Run a single instance per UPLOAD_DIR.
+"""
+import argparse
+import logging
+import os
+import time
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import and_, func, not_, or_, select, update
+
+from app.config import (
+    ARCHIVE_DIR,
+    LIFECYCLE_ARCHIVE_DAYS,
+    LIFECYCLE_IO_MB_PER_S,
+    LIFECYCLE_JPEG_QUALITY,
+    LIFECYCLE_MAX_SIDE,
+    LIFECYCLE_RECOMPRESS_DAYS,
+    LIFECYCLE_SEGMENT_MB,
+    UPLOAD_DIR,
+)
+from app.db import models  # noqa: F401 — register ORM
+from app.db.database import Base, SessionLocal, add_missing_columns, engine
+from app.db.models import Image
+from app.jobs.backfill import load_checkpoint, save_checkpoint
+from app.services.archive import (
+    PACK_PREFIX,
+    SegmentWriter,
+    index_path,
+    list_segments,
+    parse_pack_ref,
+)
+from app.services.storage import load_image_bytes
+from app.utils.image_utils import ImageProcessor
+
+logger = logging.getLogger("app.jobs.storage_lifecycle")
+
+DEFAULT_STATE = UPLOAD_DIR.parent / "storage_lifecycle.state.json"
+
+RECOMPRESSED = "recompressed"
+ARCHIVED = "archived"
+
+# (image_id, old storage_path, new storage_path, new size_bytes, new mimetype, new tier)
+Move = Tuple[int, str, str, int, Optional[str], str]
+
+
+# ================= THROTTLE / DELETION =================
+
+class IOThrottle:
+    """Paces file reads and writes to ``bytes_per_second`` (0 = unthrottled), 1 s burst."""
+
+    def __init__(self, bytes_per_second: float):
+        self.rate = bytes_per_second
+        self._next = time.monotonic()
+
+    def __call__(self, nbytes: int) -> None:
+        if self.rate <= 0:
+            return
+        now = time.monotonic()
+        self._next = max(self._next, now - 1.0) + nbytes / self.rate
+        if self._next > now:
+            time.sleep(self._next - now)
+
+
+class PendingDeletes:
+    """Superseded files, deleted once ``grace`` seconds have passed since their swap."""
+
+    def __init__(self, state: Dict, state_path: Path, grace: float):
+        self.state = state
+        self.state_path = state_path
+        self.grace = grace
+        state.setdefault("pending_deletes", [])
+
+    def add(self, paths: List[str]) -> None:
+        if paths:
+            now = time.time()
+            self.state["pending_deletes"].extend([p, now] for p in paths)
+            save_checkpoint(self.state_path, self.state)
+
+    def purge(self) -> int:
+        due = time.time() - self.grace
+        keep, deleted = [], 0
+        for path, since in self.state["pending_deletes"]:
+            if since > due:
+                keep.append([path, since])
+                continue
+            try:
+                os.remove(path)
+                deleted += 1
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.warning("Could not delete %s: %s", path, e)
+                keep.append([path, since])
+        if deleted or len(keep) != len(self.state["pending_deletes"]):
+            self.state["pending_deletes"] = keep
+            save_checkpoint(self.state_path, self.state)
+        return deleted
+
+
+class _Tally:
+    """Per-pass progress: rows, failures and bytes before / after."""
+
+    def __init__(self, label: str, total: int):
+        self.label = label
+        self.total = total
+        self.done = self.failed = self.before = self.after = 0
+        self.start = time.perf_counter()
+
+    def update(self, rows: int, failed: int, moves: List[Move], before: int) -> None:
+        self.done += rows
+        self.failed += failed
+        self.before += before
+        self.after += sum(m[3] for m in moves)
+        logger.info(
+            "%s: %d/%d rows (%.1f rows/s), %d failed, %.1f MB -> %.1f MB",
+            self.label, self.done, self.total, self.done / max(time.perf_counter() - self.start, 1e-9),
+            self.failed, self.before / 2**20, self.after / 2**20,
+        )
+
+
+# ================= FILES =================
+
+def _write_durable(path: Path, data: bytes) -> None:
+    with open(path, "xb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def _read(storage_path: str, throttle: IOThrottle) -> bytes:
+    data = load_image_bytes(storage_path)
+    throttle(len(data))
+    return data
+
+
+def _shrink(data: bytes, args) -> Optional[bytes]:
+    """Recompressed JPEG, or None when it would not be smaller than ``data``."""
+    smaller = ImageProcessor.recompress_jpeg(data, args.max_side, args.quality)
+    return smaller if len(smaller) < len(data) else None
+
+
+# ================= DB =================
+
+def _age():
+    return func.coalesce(Image.verified_at, Image.created_at)
+
+
+def _local():
+    return not_(or_(
+        Image.storage_path.like("http://%"),
+        Image.storage_path.like("https://%"),
+        Image.storage_path.like(f"{PACK_PREFIX}%"),
+    ))
+
+
+def _archive_due(days: float):
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    return and_(_local(), or_(Image.storage_tier.is_(None), Image.storage_tier != ARCHIVED), _age() < cutoff)
+
+
+def _recompress_due(days: float):
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    return and_(_local(), Image.storage_tier.is_(None), _age() < cutoff)
+
+
+def _page(where, after_id: int, page_size: int):
+    with SessionLocal() as db:
+        return db.execute(
+            select(Image.id, Image.storage_path, Image.mimetype, Image.storage_tier)
+            .where(where, Image.id > after_id)
+            .order_by(Image.id)
+            .limit(page_size)
+        ).all()
+
+
+def _swap(moves: List[Move]) -> Tuple[List[Move], List[Move]]:
+    """Point rows at their new copies in one transaction; (swapped, rows that changed meanwhile)."""
+    swapped, lost = [], []
+    now = datetime.utcnow()
+    with SessionLocal() as db:
+        for move in moves:
+            image_id, old, new, size, mimetype, tier = move
+            result = db.execute(
+                update(Image)
+                .where(Image.id == image_id, Image.storage_path == old)
+                .values(storage_path=new, size_bytes=size, mimetype=mimetype, storage_tier=tier, tiered_at=now)
+                .execution_options(synchronize_session=False)
+            )
+            (swapped if result.rowcount == 1 else lost).append(move)
+        db.commit()
+    return swapped, lost
+
+
+def _finish(moves: List[Move], deletes: PendingDeletes, packed: bool = False) -> None:
+    """Swap ``moves`` into the DB, then schedule the superseded files for deletion."""
+    swapped, lost = _swap(moves)
+    # An unchanged path means nothing was written; only the tier was recorded
+    deletes.add([old for _, old, new, *_ in swapped if old != new])
+    for image_id, old, new, *_ in lost:
+        logger.info("Image %d changed while being moved; left as is", image_id)
+        # Lost segment entries stay behind as dead bytes until compaction
+        if not packed and old != new:
+            Path(new).unlink(missing_ok=True)
+
+
+# ================= PASSES =================
+
+def run_archive_pass(args, writer: SegmentWriter, throttle: IOThrottle, deletes: PendingDeletes) -> None:
+    due = _archive_due(args.archive_days)
+    with SessionLocal() as db:
+        total = db.scalar(select(func.count()).select_from(Image).where(due))
+    progress = _Tally("archive", total)
+    last_id = 0
+    while rows := _page(due, last_id, args.page_size):
+        moves, failed, before = [], 0, 0
+        for row in rows:
+            try:
+                data = _read(row.storage_path, throttle)
+                before += len(data)
+                mimetype = row.mimetype
+                if row.storage_tier is None:
+                    smaller = _shrink(data, args)
+                    if smaller is not None:
+                        data, mimetype = smaller, "image/jpeg"
+            except Exception as e:
+                logger.warning("Image %d not archived: %s", row.id, e)
+                failed += 1
+                continue
+            ref = writer.append(row.id, data)
+            throttle(len(data))
+            moves.append((row.id, row.storage_path, ref, len(data), mimetype, ARCHIVED))
+        # Entries must be durable before any row points at them; lost ones are dead bytes
+        writer.sync()
+        if moves:
+            _finish(moves, deletes, packed=True)
+        deletes.purge()
+        last_id = rows[-1].id
+        progress.update(len(rows), failed, moves, before)
+
+
+def run_recompress_pass(args, throttle: IOThrottle, deletes: PendingDeletes) -> None:
+    due = _recompress_due(args.recompress_days)
+    with SessionLocal() as db:
+        total = db.scalar(select(func.count()).select_from(Image).where(due))
+    progress = _Tally("recompress", total)
+    last_id = 0
+    while rows := _page(due, last_id, args.page_size):
+        moves, failed, before = [], 0, 0
+        for row in rows:
+            old = Path(row.storage_path)
+            try:
+                data = _read(row.storage_path, throttle)
+                before += len(data)
+                smaller = _shrink(data, args)
+                if smaller is None:
+                    # Already compact: record the tier so it is not looked at again
+                    moves.append((row.id, row.storage_path, row.storage_path, len(data), row.mimetype, RECOMPRESSED))
+                    continue
+                new = old.with_name(f"{uuid.uuid4().hex}.jpg")
+                _write_durable(new, smaller)
+                throttle(len(smaller))
+            except Exception as e:
+                logger.warning("Image %d not recompressed: %s", row.id, e)
+                failed += 1
+                continue
+            moves.append((row.id, row.storage_path, str(new), len(smaller), "image/jpeg", RECOMPRESSED))
+        if moves:
+            _finish(moves, deletes)
+        deletes.purge()
+        last_id = rows[-1].id
+        progress.update(len(rows), failed, moves, before)
+
+
+def _live_bytes() -> Dict[str, int]:
+    """Bytes still referenced by rows, per segment path."""
+    live: Dict[str, int] = {}
+    last_id = 0
+    packed = Image.storage_path.like(f"{PACK_PREFIX}%")
+    while True:
+        with SessionLocal() as db:
+            rows = db.execute(
+                select(Image.id, Image.storage_path).where(packed, Image.id > last_id).order_by(Image.id).limit(10000)
+            ).all()
+        if not rows:
+            return live
+        for row in rows:
+            segment, _, length = parse_pack_ref(row.storage_path)
+            live[str(segment)] = live.get(str(segment), 0) + length
+        last_id = rows[-1].id
+
+
+def run_compact_pass(args, writer: SegmentWriter, throttle: IOThrottle, deletes: PendingDeletes) -> None:
+    live = _live_bytes()
+    pending = {p for p, _ in deletes.state["pending_deletes"]}
+    for segment in list_segments(ARCHIVE_DIR):
+        if segment == writer.path or str(segment) in pending:
+            continue
+        size = segment.stat().st_size
+        used = live.get(str(segment), 0)
+        if size and used >= args.compact_below * size:
+            continue
+        logger.info("Compacting %s: %.1f of %.1f MB live", segment.name, used / 2**20, size / 2**20)
+        prefix = f"{PACK_PREFIX}{segment}#"
+        last_id, failed = 0, 0
+        while rows := _page(Image.storage_path.startswith(prefix, autoescape=True), last_id, args.page_size):
+            moves = []
+            for row in rows:
+                try:
+                    data = _read(row.storage_path, throttle)
+                except Exception as e:
+                    logger.warning("Image %d not compacted: %s", row.id, e)
+                    failed += 1
+                    continue
+                moves.append((row.id, row.storage_path, writer.append(row.id, data), len(data), row.mimetype, ARCHIVED))
+                throttle(len(data))
+            writer.sync()
+            if moves:
+                _finish(moves, deletes, packed=True)
+            last_id = rows[-1].id
+        if failed:
+            # Rows still point into it; it is retried, and kept, until they are fixed
+            logger.warning("Keeping %s: %d entries could not be read", segment.name, failed)
+            continue
+        deletes.add([str(segment), str(index_path(segment))])
+    deletes.purge()
+
+
+def report(args) -> None:
+    """--dry-run: what each tier would pick up now."""
+    tiers = [("archive", _archive_due, args.archive_days), ("recompress", _recompress_due, args.recompress_days)]
+    with SessionLocal() as db:
+        for name, due, days in tiers:
+            if days <= 0:
+                continue
+            count, size = db.execute(
+                select(func.count(), func.coalesce(func.sum(Image.size_bytes), 0)).where(due(days))
+            ).one()
+            logger.info("%s (older than %g days): %d images, %.1f MB", name, days, count, size / 2**20)
+    live = _live_bytes()
+    for segment in list_segments(ARCHIVE_DIR):
+        size = segment.stat().st_size
+        logger.info("%s: %.1f of %.1f MB live", segment.name, live.get(str(segment), 0) / 2**20, size / 2**20)
+
+
+def run_once(args, throttle: IOThrottle, deletes: PendingDeletes) -> None:
+    start = time.perf_counter()
+    deletes.purge()
+    writer = SegmentWriter(ARCHIVE_DIR, args.segment_mb * 1024 * 1024) if args.archive_days > 0 else None
+    try:
+        if writer is not None:
+            run_archive_pass(args, writer, throttle, deletes)
+        if args.recompress_days > 0:
+            run_recompress_pass(args, throttle, deletes)
+        if writer is not None and args.compact_below > 0:
+            run_compact_pass(args, writer, throttle, deletes)
+    finally:
+        if writer is not None:
+            writer.close()
+    logger.info(
+        "Lifecycle pass done in %.1fs; %d superseded files awaiting deletion",
+        time.perf_counter() - start, len(deletes.state["pending_deletes"]),
+    )
+
+
+# ================= ENTRY POINT =================
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Recompress, archive and compact stored originals.")
+    parser.add_argument("--recompress-days", type=float, default=LIFECYCLE_RECOMPRESS_DAYS,
+                        help="recompress originals older than this (0 = off)")
+    parser.add_argument("--archive-days", type=float, default=LIFECYCLE_ARCHIVE_DAYS,
+                        help="pack originals older than this into archive segments (0 = off)")
+    parser.add_argument("--max-side", type=int, default=LIFECYCLE_MAX_SIDE, help="long side of recompressed images")
+    parser.add_argument("--quality", type=int, default=LIFECYCLE_JPEG_QUALITY, help="JPEG quality of recompressed images")
+    parser.add_argument("--segment-mb", type=int, default=LIFECYCLE_SEGMENT_MB, help="archive segment size")
+    parser.add_argument("--compact-below", type=float, default=0.5,
+                        help="rewrite segments whose live fraction is below this (0 = never)")
+    parser.add_argument("--io-mb-per-s", type=float, default=LIFECYCLE_IO_MB_PER_S,
+                        help="file read + write budget (0 = unthrottled)")
+    parser.add_argument("--grace-minutes", type=float, default=10, help="delay before superseded files are deleted")
+    parser.add_argument("--page-size", type=int, default=200, help="DB rows per page")
+    parser.add_argument("--state", type=Path, default=DEFAULT_STATE, help="pending deletions")
+    parser.add_argument("--loop", action="store_true", help="keep running, one pass per interval")
+    parser.add_argument("--interval-minutes", type=float, default=60)
+    parser.add_argument("--nice", type=int, default=10, help="CPU priority adjustment (0 = unchanged)")
+    parser.add_argument("--dry-run", action="store_true", help="report what is due and exit")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s [%(name)s] %(message)s")
+    Base.metadata.create_all(bind=engine)
+    add_missing_columns(engine)
+    if args.dry_run:
+        report(args)
+        return
+    if args.nice and hasattr(os, "nice"):
+        os.nice(args.nice)
+
+    throttle = IOThrottle(args.io_mb_per_s * 1024 * 1024)
+    deletes = PendingDeletes(load_checkpoint(args.state), args.state, args.grace_minutes * 60)
+    while True:
+        run_once(args, throttle, deletes)
+        if not args.loop:
+            break
+        time.sleep(args.interval_minutes * 60)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+Synthetic regression fixtures and a deterministic stand-in for DeepFace.
+
+    python -m app.jobs.synthetic eval/synthetic [--size 192] [--seed 7]
+
+Writes a small labelled triplet set in the ``app.jobs.regression`` layout:
+every "person" is a disc of one colour on a noisy background, photographed
+three times with jitter in position, lighting and noise. ``StubDeepFace``
+finds the disc as the face and embeds it by projecting its mean colour to
+512 dimensions with a fixed random matrix, so cosine similarity follows how
+close two colours are. The set includes one look-alike pair (a false accept)
+and one harsh-lighting triplet (a false reject), so FAR and FRR are not
+trivially zero.
+
+This exercises the whole request path and the FAR/FRR, latency and RSS
+bookkeeping of the regression check without model weights, TensorFlow or
+network access (``python -m app.jobs.regression eval/synthetic --stub-model``).
+It says nothing about the accuracy of the real model.
+"""
+import argparse
+import logging
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger("app.jobs.synthetic")
+
+EMBEDDING_DIM = 512
+
+RGB = Tuple[int, int, int]
+
+# case -> colours of the three photos, then the lighting offset of each photo
+SAME: Dict[str, Tuple[List[RGB], Sequence[int]]] = {
+    "s01": ([(200, 80, 80)] * 3, (0, 10, -10)),
+    "s02": ([(80, 180, 90)] * 3, (0, -12, 8)),
+    "s03": ([(90, 100, 200)] * 3, (5, 0, -5)),
+    "s04": ([(200, 110, 200)] * 3, (0, 15, -15)),
+    # One photo in harsh light: washed out far enough to be rejected
+    "s05_harsh_light": ([(170, 150, 70)] * 3, (0, 5, 75)),
+}
+DIFFERENT: Dict[str, Tuple[List[RGB], Sequence[int]]] = {
+    "d01": ([(200, 80, 80), (200, 80, 80), (80, 180, 90)], (0, 5, 0)),
+    "d02": ([(90, 100, 200), (200, 200, 80), (90, 100, 200)], (0, 0, -8)),
+    "d03": ([(80, 160, 200), (200, 110, 200), (80, 160, 200)], (-5, 0, 5)),
+    "d04": ([(200, 130, 70), (70, 80, 160), (70, 80, 160)], (0, 0, 0)),
+    # Two people with nearly the same colour: accepted as one
+    "d05_lookalike": ([(80, 190, 170), (80, 190, 170), (75, 180, 185)], (0, 6, -6)),
+}
+
+
+class StubDeepFace:
+    """
+    The subset of the ``DeepFace`` API that ``FaceDetector`` calls.
+
+    ``extract_faces`` reports the central half of the frame as one face;
+    ``represent`` embeds the mean colour of the central half of its input.
+    Deterministic for a given input, no weights and no TensorFlow.
+    """
+
+    _projection = np.random.default_rng(0).standard_normal((EMBEDDING_DIM, 3))
+
+    @staticmethod
+    def build_model(model_name: str, *args, **kwargs):
+        return object()
+
+    @staticmethod
+    def _central_area(image: np.ndarray) -> Dict:
+        h, w = image.shape[:2]
+        return {"x": w // 4, "y": h // 4, "w": w // 2, "h": h // 2}
+
+    @classmethod
+    def extract_faces(cls, img_path: np.ndarray, detector_backend: str = "opencv",
+                      enforce_detection: bool = True, **kwargs) -> List[Dict]:
+        return [{"facial_area": cls._central_area(img_path), "confidence": 0.99}]
+
+    @classmethod
+    def represent(cls, img_path: np.ndarray, model_name: str = "Facenet512",
+                  detector_backend: str = "opencv", enforce_detection: bool = True,
+                  **kwargs) -> List[Dict]:
+        area = cls._central_area(img_path)
+        face = img_path[area["y"]:area["y"] + area["h"], area["x"]:area["x"] + area["w"]]
+        colour = face.reshape(-1, 3).mean(axis=0)
+        embedding = cls._projection @ ((colour - 128.0) / 64.0)
+        return [{"embedding": embedding.tolist(), "facial_area": area}]
+
+
+def render_face(colour: RGB, lighting: int, size: int, rng: np.random.Generator) -> np.ndarray:
+    """One BGR photo: a disc of ``colour`` covering the central half, on a textured background."""
+    image = rng.integers(60, 190, size=(size // 8, size // 8, 3), dtype=np.uint8)
+    image = cv2.resize(image, (size, size), interpolation=cv2.INTER_LINEAR)
+    centre = size // 2 + rng.integers(-size // 32, size // 32 + 1, size=2)
+    bgr = tuple(int(c) for c in reversed(colour))
+    cv2.circle(image, (int(centre[0]), int(centre[1])), int(size * 0.42), bgr, thickness=-1)
+    noisy = image.astype(np.int16) + lighting + rng.normal(0, 6, image.shape).astype(np.int16)
+    return np.clip(noisy, 0, 255).astype(np.uint8)
+
+
+def make_dataset(root: Path, size: int = 192, seed: int = 7) -> int:
+    """Write the synthetic triplets under ``root``; returns the number of images written."""
+    rng = np.random.default_rng(seed)
+    written = 0
+    for label, cases in (("same", SAME), ("different", DIFFERENT)):
+        for case, (colours, lighting) in cases.items():
+            folder = root / label / case
+            folder.mkdir(parents=True, exist_ok=True)
+            for i, (colour, offset) in enumerate(zip(colours, lighting), 1):
+                image = render_face(colour, offset, size, rng)
+                cv2.imwrite(str(folder / f"{i}.jpg"), image, [cv2.IMWRITE_JPEG_QUALITY, 85])
+                written += 1
+    return written
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Write the synthetic regression fixture set.")
+    parser.add_argument("root", type=Path, help="output directory (same/ and different/ are created)")
+    parser.add_argument("--size", type=int, default=192, help="image side in px (face box is half of it)")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s [%(name)s] %(message)s")
+    written = make_dataset(args.root, args.size, args.seed)
+    logger.info("Wrote %d images to %s", written, args.root)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,8 @@
 """Face Verification API — 3-image same-person verification for dating app profile."""
+import time
+
+_import_start = time.perf_counter()
+
 import os
 import logging
 from pathlib import Path
@@ -10,16 +14,44 @@ _env_path = Path(__file__).resolve().parent.parent / ".env"
 if _env_path.exists():
     load_dotenv(dotenv_path=_env_path, override=True)
 
-from fastapi import FastAPI
+# Thread pools and CPU pinning: must be set before NumPy / OpenCV / TensorFlow load
+from app.config import CPU_AFFINITY, CPU_THREADS, TF_INTER_OP_THREADS
+from app.services.runtime import configure_runtime
+
+configure_runtime(CPU_THREADS, TF_INTER_OP_THREADS, CPU_AFFINITY)
+
+from fastapi import FastAPI, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
 
+from app.api.admin import router as admin_router
 from app.api.verify import get_services, router as verify_router
-from app.config import CORS_ORIGINS
+from app.config import BULK_MAX_BODY_BYTES, CORS_ORIGINS, MAX_REQUEST_BODY_BYTES
 from app.db import models  # noqa: F401 — register ORM
-from app.db.database import Base, engine
+from app.db.database import Base, add_missing_columns, dispose_async_engine, engine
+from app.services.admission import AdmissionMiddleware
+from app.services.deadline import DeadlineMiddleware
+from app.services.metrics import (
+    IN_FLIGHT,
+    REQUEST_SECONDS,
+    STARTUP_TIMINGS,
+    record_startup,
+    render_latest,
+    start_request_timer,
+)
+from app.services.profiler import PROFILER
+from app.services.storage import warm_storage
+from app.utils.upload import MaxBodySizeMiddleware
+
+# Heavy libraries (DeepFace/TensorFlow, Cloudinary) are imported during startup, not here
+record_startup("import", time.perf_counter() - _import_start)
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s [%(name)s] %(message)s")
 
+# Endpoints that run inference; rate limits and deadlines apply to these
+INFERENCE_PATHS = ("/api/verify", "/api/verify-and-store", "/api/verify-raw")
+# Long-running bulk endpoints: rate-limited, they bound their own concurrency
+BULK_PATHS = ("/api/verify-bulk",)
+
 app = FastAPI(
     title="Face Verification API",
     description="Verify 3 images are the same person; optionally store verified images.",
@@ -35,8 +67,44 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(
+    MaxBodySizeMiddleware,
+    max_bytes=MAX_REQUEST_BODY_BYTES,
+    path_limits={path: BULK_MAX_BODY_BYTES for path in BULK_PATHS},
+)
+# Outside the body limit: rate-limit before any of the upload is read
+app.add_middleware(AdmissionMiddleware, paths=INFERENCE_PATHS + BULK_PATHS)
+# Outermost: the deadline also bounds the inference queue wait
+app.add_middleware(DeadlineMiddleware, paths=INFERENCE_PATHS)
 
 app.include_router(verify_router, prefix="/api", tags=["verification"])
+app.include_router(admin_router, prefix="/api/admin", tags=["admin"], include_in_schema=False)
+
+_route_paths: set = set()
+
+
+@app.middleware("http")
+async def timing_middleware(request: Request, call_next):
+    """Track in-flight/latency metrics and attach a Server-Timing stage breakdown."""
+    if not _route_paths:
+        _route_paths.update(getattr(r, "path", None) for r in app.routes)
+    path = request.url.path
+    endpoint = path if path in _route_paths else "other"
+    timer = start_request_timer()
+    start = time.perf_counter()
+    IN_FLIGHT.labels(endpoint=endpoint).inc()
+    try:
+        if PROFILER.armed:
+            response = await PROFILER.profile_request(call_next, request)
+        else:
+            response = await call_next(request)
+    finally:
+        IN_FLIGHT.labels(endpoint=endpoint).dec()
+    elapsed = time.perf_counter() - start
+    REQUEST_SECONDS.labels(endpoint=endpoint).observe(elapsed)
+    timer.add("total", elapsed)
+    response.headers["Server-Timing"] = timer.server_timing()
+    return response
 
 
 @app.get("/")
@@ -50,19 +118,41 @@ async def root():
         "endpoints": {
             "verify": "POST /api/verify",
             "verify_and_store": "POST /api/verify-and-store",
+            "verify_raw": "POST /api/verify-raw",
+            "verify_bulk": "POST /api/verify-bulk",
             "health": "GET /api/health",
+            "metrics": "GET /metrics",
         },
     }
 
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus metrics in text exposition format."""
+    body, content_type = render_latest()
+    return Response(content=body, media_type=content_type)
+
+
 @app.on_event("startup")
 async def startup_event():
     """Create DB tables and load face model so /api/health reports healthy."""
     Base.metadata.create_all(bind=engine)
+    add_missing_columns(engine)
     try:
         get_services()
     except Exception as e:
         logging.warning("Model load at startup failed: %s. First request will retry.", e)
+    try:
+        warm_storage()
+    except Exception as e:
+        logging.warning("Storage client warm-up failed: %s", e)
+    record_startup("ready", time.perf_counter() - _import_start)
+    logging.info("Startup timings (s): %s", STARTUP_TIMINGS)
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await dispose_async_engine()
 
 
 if __name__ == "__main__":
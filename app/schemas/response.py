@@ -1,12 +1,13 @@
 from pydantic import BaseModel, Field
-from typing import Dict, List, Optional
+from typing import Any, Dict, List, Optional
 
 
 class SimilarityScores(BaseModel):
     """Pairwise similarity scores between images"""
     img1_img2: float = Field(..., ge=0.0, le=1.0, description="Similarity between image 1 and 2")
-    img1_img3: float = Field(..., ge=0.0, le=1.0, description="Similarity between image 1 and 3")
-    img2_img3: float = Field(..., ge=0.0, le=1.0, description="Similarity between image 2 and 3")
+    # Optional: null when early exit decided the result before image 3 was processed
+    img1_img3: Optional[float] = Field(None, ge=0.0, le=1.0, description="Similarity between image 1 and 3")
+    img2_img3: Optional[float] = Field(None, ge=0.0, le=1.0, description="Similarity between image 2 and 3")
 
 
 class QualityCheck(BaseModel):
@@ -37,6 +38,23 @@ class VerificationResponse(BaseModel):
     message: str = Field(..., description="Human-readable result message")
 
 
+class CompactVerificationResponse(BaseModel):
+    """Response of /api/verify-raw: the decision without per-image analyses"""
+    result: str = Field(..., description="SAME_PERSON or DIFFERENT_PERSON")
+    confidence: float = Field(..., ge=0.0, le=1.0)
+    similarity: SimilarityScores
+    stored_image_ids: Optional[List[int]] = Field(None, description="With store=true: ids of the stored images, in order")
+
+
+class BulkJobResult(BaseModel):
+    """One NDJSON line of /api/verify-bulk: a job's VerificationResponse or its error"""
+    index: int = Field(..., description="Position of the job in the request")
+    job_id: str
+    status_code: int = Field(..., description="HTTP status /api/verify would have returned")
+    result: Optional[VerificationResponse] = None
+    detail: Optional[Any] = Field(None, description="Error detail when status_code is not 200")
+
+
 class ErrorResponse(BaseModel):
     """Error response"""
     error: str
@@ -49,6 +67,9 @@ class HealthResponse(BaseModel):
     status: str
     model_loaded: bool
     version: str
+    startup: Optional[Dict[str, float]] = None  # cold-start timings in seconds
+    runtime: Optional[Dict[str, Any]] = None  # CPU / thread-pool settings in effect
+    memory: Optional[Dict[str, Any]] = None  # RSS and frame buffer pool occupancy
 
 
 class StoredImageInfo(BaseModel):
@@ -58,6 +79,7 @@ class StoredImageInfo(BaseModel):
     original_filename: str
     mimetype: Optional[str] = None
     size_bytes: Optional[int] = None
+    thumbnail_path: Optional[str] = None  # aligned face crop (WebP)
 
 
 class VerifyAndStoreResponse(BaseModel):
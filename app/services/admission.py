@@ -0,0 +1,285 @@
+"""
+Admission control in front of inference.
+
+- ``RateLimiter``: token bucket per client (the configured API key if sent,
+  else client IP).
+  Over-limit requests get 429 with Retry-After.
+- ``ConcurrencyLimiter``: at most ``limit`` requests run inference at once;
+  the rest wait FIFO in a bounded queue. While both the average queue wait
+  and the wait of the oldest queued request are above target, requests that
+  would have to queue are shed with 503 + Retry-After instead of piling up,
+  so admitted requests keep their latency. Handlers hold a slot only around
+  decode / detection / embedding (``LIMITER.slot()``): not while the upload
+  arrives, not during storage I/O, and not while awaiting a coalesced job.
+- ``AdmissionMiddleware``: rate limiting, before the body is read.
+
+Event-loop local; not thread-safe.
+"""
+import asyncio
+import hmac
+import logging
+import math
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Deque, Iterable, Optional, Tuple
+
+from fastapi import HTTPException
+from starlette.responses import JSONResponse
+
+from app.config import (
+    ADMISSION_MAX_QUEUE,
+    ADMISSION_MAX_QUEUE_WAIT_MS,
+    ADMISSION_TARGET_QUEUE_MS,
+    API_KEY,
+    API_KEY_HEADER,
+    INFERENCE_CONCURRENCY,
+    RATE_LIMIT_BURST,
+    RATE_LIMIT_PER_MINUTE,
+)
+from .deadline import deadline_exceeded, expired, remaining
+from .metrics import (
+    ADMISSION_QUEUE_DEPTH,
+    ADMISSION_QUEUE_SECONDS,
+    ADMISSION_SHEDDING,
+    record_rejection,
+    stage,
+)
+
+logger = logging.getLogger(__name__)
+
+# Weight of the newest sample in the moving averages
+_EWMA_ALPHA = 0.2
+
+
+class Overloaded(Exception):
+    """Raised when a request is shed; ``retry_after`` is in seconds."""
+
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+# ================= RATE LIMIT =================
+
+class RateLimiter:
+    """Token bucket per client key, with an LRU cap on tracked clients."""
+
+    def __init__(self, per_minute: float, burst: int, max_clients: int = 10000):
+        self.rate = per_minute / 60.0
+        self.burst = max(1, burst)
+        self.max_clients = max_clients
+        self._buckets: "OrderedDict[str, list]" = OrderedDict()
+
+    @property
+    def enabled(self) -> bool:
+        return self.rate > 0
+
+    def take(self, key: str) -> float:
+        """Consume one token. Returns 0 if allowed, else seconds until a token is available."""
+        now = time.monotonic()
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = [float(self.burst), now]
+            self._buckets[key] = bucket
+            if len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+            tokens, last = bucket
+            bucket[0] = min(self.burst, tokens + (now - last) * self.rate)
+            bucket[1] = now
+        if bucket[0] >= 1.0:
+            bucket[0] -= 1.0
+            return 0.0
+        return (1.0 - bucket[0]) / self.rate
+
+
+# ================= CONCURRENCY =================
+
+class ConcurrencyLimiter:
+    """FIFO concurrency limit with queue-latency based shedding."""
+
+    def __init__(self, limit: int, max_queue: int, target_wait: float, max_wait: float):
+        self.limit = limit
+        self.max_queue = max_queue
+        self.target_wait = target_wait
+        self.max_wait = max_wait
+        self.active = 0
+        self.queue_wait = 0.0  # EWMA seconds
+        self.service_time = 0.0  # EWMA seconds a slot is held
+        self._shedding = False
+        # (future, enqueued_at) in arrival order
+        self._waiters: Deque[Tuple[asyncio.Future, float]] = deque()
+
+    @property
+    def enabled(self) -> bool:
+        return self.limit > 0
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    @property
+    def shedding(self) -> bool:
+        return self._shedding
+
+    def _update_shedding(self) -> None:
+        head_wait = time.perf_counter() - self._waiters[0][1] if self._waiters else 0.0
+        shedding = self.queue_wait > self.target_wait and head_wait > self.target_wait
+        if shedding != self._shedding:
+            self._shedding = shedding
+            ADMISSION_SHEDDING.set(1 if shedding else 0)
+            logger.warning(
+                "Load shedding %s (avg queue wait %.0f ms, target %.0f ms)",
+                "started" if shedding else "stopped",
+                self.queue_wait * 1000, self.target_wait * 1000,
+            )
+
+    def retry_after(self) -> float:
+        """Rough time for the current backlog to drain."""
+        backlog = self.queued + 1
+        return max(1.0, backlog * self.service_time / self.limit)
+
+    def _observe_wait(self, waited: float) -> None:
+        ADMISSION_QUEUE_SECONDS.observe(waited)
+        self.queue_wait += _EWMA_ALPHA * (waited - self.queue_wait)
+
+    async def acquire(self) -> None:
+        """
+        Wait for a slot. Raises Overloaded if the request is shed, and
+        DeadlineExceeded if its deadline passes while queued.
+        """
+        if self.active < self.limit and not self._waiters:
+            self.active += 1
+            self._observe_wait(0.0)
+            return
+        if self.queued >= self.max_queue:
+            raise Overloaded("queue_full", self.retry_after())
+        self._update_shedding()
+        if self._shedding:
+            raise Overloaded("overloaded", self.retry_after())
+
+        # Don't hold a queue place past the request's deadline
+        timeout = self.max_wait
+        left = remaining()
+        if left is not None:
+            timeout = min(timeout, max(0.0, left))
+        future = asyncio.get_running_loop().create_future()
+        start = time.perf_counter()
+        entry = (future, start)
+        self._waiters.append(entry)
+        ADMISSION_QUEUE_DEPTH.set(self.queued)
+        try:
+            await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            self._observe_wait(time.perf_counter() - start)
+            if expired():
+                raise deadline_exceeded("queue") from None
+            raise Overloaded("queue_timeout", self.retry_after()) from None
+        except asyncio.CancelledError:
+            # Slot may have been handed over just before the cancel
+            if future.done() and not future.cancelled():
+                self._release_slot()
+            raise
+        finally:
+            if entry in self._waiters:
+                self._waiters.remove(entry)
+            ADMISSION_QUEUE_DEPTH.set(self.queued)
+        self._observe_wait(time.perf_counter() - start)
+
+    def release(self, held: float) -> None:
+        """Free a slot held for ``held`` seconds, handing it to the next waiter."""
+        self.service_time += _EWMA_ALPHA * (held - self.service_time)
+        self._release_slot()
+        self._update_shedding()
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        """
+        Hold a slot for the block. Raises HTTPException 503 (with
+        Retry-After) when shed, and DeadlineExceeded (504) when the deadline
+        passes while queued.
+        """
+        if not self.enabled:
+            yield
+            return
+        try:
+            with stage("queue"):
+                await self.acquire()
+        except Overloaded as e:
+            record_rejection(e.reason)
+            raise HTTPException(
+                status_code=503,
+                detail="Server busy, retry later",
+                headers={"Retry-After": str(max(1, math.ceil(e.retry_after)))},
+            ) from None
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.release(time.perf_counter() - start)
+
+    def _release_slot(self) -> None:
+        while self._waiters:
+            future, _ = self._waiters.popleft()
+            if not future.done():
+                future.set_result(None)  # slot passes to the waiter; active unchanged
+                return
+        self.active -= 1
+
+
+# ================= MIDDLEWARE =================
+
+def client_key(scope) -> str:
+    """
+    Rate-limit key: the API key header if it matches ``API_KEY``, else the
+    client IP. Unchecked header values would let a client get a fresh bucket
+    per request by sending a new key each time.
+    """
+    header = API_KEY_HEADER.lower().encode()
+    for name, value in scope.get("headers", []):
+        if name == header and value and API_KEY and hmac.compare_digest(value, API_KEY.encode("latin-1")):
+            return "key:" + API_KEY
+    client = scope.get("client")
+    return "ip:" + (client[0] if client else "unknown")
+
+
+def _reject(status_code: int, detail: str, retry_after: float) -> JSONResponse:
+    return JSONResponse(
+        status_code=status_code,
+        content={"detail": detail},
+        headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+    )
+
+
+class AdmissionMiddleware:
+    """
+    ASGI middleware rate limiting ``paths`` before the body is read. The
+    concurrency limit is taken by the handlers, around inference only.
+    """
+
+    def __init__(self, app, paths: Iterable[str], rate_limiter: Optional[RateLimiter] = None):
+        self.app = app
+        self.paths = frozenset(paths)
+        self.rate_limiter = rate_limiter or RATE_LIMITER
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"] in self.paths and self.rate_limiter.enabled:
+            wait = self.rate_limiter.take(client_key(scope))
+            if wait:
+                record_rejection("rate_limited")
+                response = _reject(429, "Rate limit exceeded", wait)
+                await response(scope, receive, send)
+                return
+        await self.app(scope, receive, send)
+
+
+RATE_LIMITER = RateLimiter(RATE_LIMIT_PER_MINUTE, RATE_LIMIT_BURST)
+LIMITER = ConcurrencyLimiter(
+    INFERENCE_CONCURRENCY,
+    ADMISSION_MAX_QUEUE,
+    ADMISSION_TARGET_QUEUE_MS / 1000.0,
+    ADMISSION_MAX_QUEUE_WAIT_MS / 1000.0,
+)
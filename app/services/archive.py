@@ -0,0 +1,156 @@
+"""
+Packed archive segments for cold originals (written by app.jobs.storage_lifecycle).
+
+A segment is an append-only ``.pack`` file of concatenated image blobs with an
+``.idx`` sidecar: a table of (image_id, offset, length, crc32) sorted by image
+id. Rows point into a segment through ``images.storage_path``:
+
+    pack:<segment path>#<offset>+<length>
+
+so reading an archived image is one positioned read, without opening the
+index; the index lets the lifecycle job find, verify and compact entries
+without the DB. Entries whose row moved on stay in the file as dead bytes
+until the segment is compacted.
+"""
+import os
+import uuid
+import zlib
+from datetime import datetime
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+PACK_PREFIX = "pack:"
+SEGMENT_SUFFIX = ".pack"
+INDEX_SUFFIX = ".idx"
+INDEX_MAGIC = b"FVIDX1\0\0"
+INDEX_DTYPE = np.dtype([("image_id", "<i8"), ("offset", "<i8"), ("length", "<i8"), ("crc32", "<u4")])
+
+
+def is_packed(storage_path: str) -> bool:
+    return storage_path.startswith(PACK_PREFIX)
+
+
+def pack_ref(segment: Path, offset: int, length: int) -> str:
+    return f"{PACK_PREFIX}{segment}#{offset}+{length}"
+
+
+def parse_pack_ref(ref: str) -> Tuple[Path, int, int]:
+    """(segment path, offset, length) of a ``pack:`` storage path."""
+    path, _, span = ref[len(PACK_PREFIX):].rpartition("#")
+    offset, _, length = span.partition("+")
+    try:
+        return Path(path), int(offset), int(length)
+    except ValueError:
+        raise ValueError(f"Invalid pack reference: {ref}")
+
+
+def read_packed(ref: str) -> bytes:
+    """Bytes of one archived image."""
+    path, offset, length = parse_pack_ref(ref)
+    with open(path, "rb") as f:
+        f.seek(offset)
+        data = f.read(length)
+    if len(data) != length:
+        raise OSError(f"Truncated archive entry: {ref}")
+    return data
+
+
+def index_path(segment: Path) -> Path:
+    return segment.with_suffix(INDEX_SUFFIX)
+
+
+def load_index(segment: Path) -> np.ndarray:
+    """The segment's entries sorted by image id (empty when it has no index yet)."""
+    path = index_path(segment)
+    if not path.exists():
+        return np.empty(0, dtype=INDEX_DTYPE)
+    raw = path.read_bytes()
+    if not raw.startswith(INDEX_MAGIC):
+        raise ValueError(f"Not a segment index: {path}")
+    return np.frombuffer(raw, dtype=INDEX_DTYPE, offset=len(INDEX_MAGIC))
+
+
+def find_entry(index: np.ndarray, image_id: int) -> Optional[np.void]:
+    """Last entry written for ``image_id`` (binary search), or None."""
+    pos = np.searchsorted(index["image_id"], image_id, side="right") - 1
+    return index[pos] if pos >= 0 and index["image_id"][pos] == image_id else None
+
+
+def list_segments(root: Path) -> List[Path]:
+    """Segments under ``root``, oldest first."""
+    return sorted(root.glob(f"seg-*{SEGMENT_SUFFIX}"))
+
+
+def _fsync_dir(path: Path) -> None:
+    if os.name != "posix":
+        return
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class SegmentWriter:
+    """
+    Appends blobs to the newest segment under ``root`` (a new one once it
+    holds ``max_bytes``). Appended entries are durable, and may be referenced
+    from the DB, only after ``sync()``.
+    """
+
+    def __init__(self, root: Path, max_bytes: int):
+        self.root = root
+        self.max_bytes = max_bytes
+        root.mkdir(parents=True, exist_ok=True)
+        segments = list_segments(root)
+        if segments and segments[-1].stat().st_size < max_bytes:
+            self._open(segments[-1])
+        else:
+            self._open(None)
+
+    def _open(self, segment: Optional[Path]) -> None:
+        if segment is None:
+            segment = self.root / f"seg-{datetime.utcnow():%Y%m%d%H%M%S}-{uuid.uuid4().hex[:8]}{SEGMENT_SUFFIX}"
+        self.path = segment
+        self._file = open(segment, "ab")
+        # Continue at the end of the file; bytes past the last index entry are dead
+        self.size = self._file.seek(0, os.SEEK_END)
+        self._entries = load_index(segment).tolist()
+        self._dirty = False
+        _fsync_dir(self.root)
+
+    def append(self, image_id: int, data: bytes) -> str:
+        """Append one image; returns its storage path (valid after ``sync()``)."""
+        if self.size >= self.max_bytes:
+            self.close()
+            self._open(None)
+        offset = self.size
+        self._file.write(data)
+        self.size += len(data)
+        self._entries.append((image_id, offset, len(data), zlib.crc32(data)))
+        self._dirty = True
+        return pack_ref(self.path, offset, len(data))
+
+    def sync(self) -> None:
+        """Make appended entries durable, then rewrite the index atomically."""
+        if not self._dirty:
+            return
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        index = np.array(self._entries, dtype=INDEX_DTYPE)
+        index.sort(order=["image_id", "offset"], kind="stable")
+        tmp = index_path(self.path).with_suffix(INDEX_SUFFIX + ".tmp")
+        with open(tmp, "wb") as f:
+            f.write(INDEX_MAGIC)
+            f.write(index.tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, index_path(self.path))
+        _fsync_dir(self.root)
+        self._dirty = False
+
+    def close(self) -> None:
+        self.sync()
+        self._file.close()
@@ -0,0 +1,148 @@
+"""
+Job sources for bulk verification (``POST /api/verify-bulk``).
+
+- ZIP archive: one directory per job (the directory path is the job id)
+  holding its images; the first three by name are used.
+- NDJSON manifest: one job per line,
+  ``{"id": "job-1", "images": [17, {"image_id": 18}, {"path": "batch/a.jpg"}]}``.
+  Integers / ``image_id`` are stored images (``images.id``); strings /
+  ``path`` are files under BULK_LOCAL_ROOT.
+
+Jobs are produced lazily as ``(index, job_id, load)``. ``load()`` reads the
+job's three images (blocking; run it off the event loop) and raises
+HTTPException when the job is invalid, so image bytes are only held for jobs
+in flight.
+"""
+import json
+import zipfile
+from functools import partial
+from pathlib import Path, PurePosixPath
+from typing import Callable, Dict, Iterable, Iterator, List, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import select
+
+from app.config import BULK_LOCAL_ROOT, MAX_IMAGE_SIZE_BYTES, MAX_IMAGE_SIZE_MB
+from app.db.database import SessionLocal
+from app.db.models import Image
+from app.utils.upload import check_image_bytes
+from .storage import load_image_bytes
+
+IMAGES_PER_JOB = 3
+ARCHIVE_SUFFIXES = (".jpg", ".jpeg", ".png")
+
+# (position in the request, job id, loader returning the job's image bytes)
+BulkJob = Tuple[int, str, Callable[[], List[bytes]]]
+
+
+def _image_name(i: int) -> str:
+    return f"image{i + 1}"
+
+
+def _too_large(name: str) -> HTTPException:
+    return HTTPException(status_code=413, detail=f"{name}: Image size exceeds {MAX_IMAGE_SIZE_MB}MB")
+
+
+def _invalid_job(message: str) -> Callable[[], List[bytes]]:
+    def load() -> List[bytes]:
+        raise HTTPException(status_code=400, detail=message)
+
+    return load
+
+
+# ================= ARCHIVE =================
+
+def _read_members(archive: zipfile.ZipFile, infos: List[zipfile.ZipInfo]) -> List[bytes]:
+    blobs = []
+    for i, info in enumerate(infos):
+        name = _image_name(i)
+        # file_size comes from the archive directory; the bounded read guards against lies
+        if info.file_size > MAX_IMAGE_SIZE_BYTES:
+            raise _too_large(name)
+        with archive.open(info) as f:
+            data = f.read(MAX_IMAGE_SIZE_BYTES + 1)
+        blobs.append(check_image_bytes(data, name))
+    return blobs
+
+
+def iter_archive_jobs(archive: zipfile.ZipFile) -> Iterator[BulkJob]:
+    """Jobs from a ZIP archive: images grouped by their directory."""
+    members: Dict[str, List[zipfile.ZipInfo]] = {}
+    for info in archive.infolist():
+        path = PurePosixPath(info.filename)
+        if info.is_dir() or path.suffix.lower() not in ARCHIVE_SUFFIXES or str(path.parent) == ".":
+            continue
+        members.setdefault(str(path.parent), []).append(info)
+    for index, job_id in enumerate(sorted(members)):
+        infos = sorted(members[job_id], key=lambda info: info.filename)
+        if len(infos) < IMAGES_PER_JOB:
+            yield index, job_id, _invalid_job(f"Job needs {IMAGES_PER_JOB} images, found {len(infos)}")
+        else:
+            yield index, job_id, partial(_read_members, archive, infos[:IMAGES_PER_JOB])
+
+
+# ================= MANIFEST =================
+
+def _read_local(relative: str, name: str) -> bytes:
+    if not BULK_LOCAL_ROOT:
+        raise HTTPException(status_code=403, detail=f"{name}: local paths are disabled (BULK_LOCAL_ROOT not set)")
+    root = Path(BULK_LOCAL_ROOT).resolve()
+    path = (root / relative).resolve()
+    if not path.is_relative_to(root):
+        raise HTTPException(status_code=403, detail=f"{name}: path is outside BULK_LOCAL_ROOT")
+    try:
+        if path.stat().st_size > MAX_IMAGE_SIZE_BYTES:
+            raise _too_large(name)
+        return path.read_bytes()
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail=f"{name}: file not found: {relative}")
+
+
+def _storage_paths(image_ids: List[int]) -> Dict[int, str]:
+    if not image_ids:
+        return {}
+    with SessionLocal() as db:
+        rows = db.execute(select(Image.id, Image.storage_path).where(Image.id.in_(image_ids))).all()
+    return {row.id: row.storage_path for row in rows}
+
+
+def _load_refs(refs: List) -> List[bytes]:
+    """Read a manifest job's images: stored ids with one DB query, then paths under BULK_LOCAL_ROOT."""
+    refs = [ref.get("image_id", ref.get("path")) if isinstance(ref, dict) else ref for ref in refs]
+    storage_paths = _storage_paths([r for r in refs if isinstance(r, int) and not isinstance(r, bool)])
+    blobs = []
+    for i, ref in enumerate(refs):
+        name = _image_name(i)
+        if isinstance(ref, str):
+            data = _read_local(ref, name)
+        elif isinstance(ref, int) and not isinstance(ref, bool):
+            if ref not in storage_paths:
+                raise HTTPException(status_code=404, detail=f"{name}: stored image {ref} not found")
+            try:
+                data = load_image_bytes(storage_paths[ref])
+            except OSError as e:
+                raise HTTPException(status_code=502, detail=f"{name}: could not read stored image {ref}: {e}")
+        else:
+            raise HTTPException(status_code=400, detail=f"{name}: expected a stored image id or a path")
+        blobs.append(check_image_bytes(data, name))
+    return blobs
+
+
+def iter_manifest_jobs(lines: Iterable[bytes]) -> Iterator[BulkJob]:
+    """Jobs from NDJSON manifest lines; an invalid line becomes a failed job."""
+    index = 0
+    for line_no, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            spec = json.loads(line)
+            refs = spec["images"]
+            if not isinstance(refs, list) or len(refs) != IMAGES_PER_JOB:
+                raise ValueError(f"'images' must list {IMAGES_PER_JOB} images")
+            job_id = str(spec.get("id", index))
+        except (ValueError, KeyError, TypeError, AttributeError) as e:
+            yield index, f"line {line_no}", _invalid_job(f"Invalid manifest line {line_no}: {e}")
+        else:
+            yield index, job_id, partial(_load_refs, refs)
+        index += 1
@@ -0,0 +1,319 @@
+"""
+Per-image result cache: detection, quality and embedding, keyed by image
+content hash + model version.
+
+Two tiers: an in-process LRU (always on) and an optional shared tier so
+replicas behind a load balancer share results:
+
+- ``sqlite``: file-based store for single-host deployments (CACHE_URL = path)
+- ``redis``: any Redis-protocol server (CACHE_URL = redis://...)
+
+Entries are encoded compactly: a small JSON header followed by the raw
+little-endian float32 embedding. Cache failures are logged and never fail a
+request.
+"""
+import json
+import logging
+from abc import ABC, abstractmethod
+import sqlite3
+import struct
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Optional
+
+import numpy as np
+
+from app.config import (
+    CACHE_BACKEND,
+    CACHE_MAX_ENTRIES,
+    CACHE_SHARED_MAX_ENTRIES,
+    CACHE_TTL_SECONDS,
+    CACHE_URL,
+)
+from .metrics import CACHE_REQUESTS
+
+logger = logging.getLogger(__name__)
+
+_MAGIC = b"FVC1"
+_HEADER = struct.Struct("<4sI")
+
+
+# ================= ENCODING =================
+
+def _json_default(o):
+    if isinstance(o, np.generic):
+        return o.item()
+    if isinstance(o, np.ndarray):
+        return o.tolist()
+    raise TypeError(f"Not JSON serializable: {type(o).__name__}")
+
+
+def encode_entry(entry: Dict) -> bytes:
+    """Serialize a result dict; ``entry["embedding"]`` (if any) is stored as raw float32."""
+    meta = {k: v for k, v in entry.items() if k != "embedding"}
+    embedding = entry.get("embedding")
+    if embedding is not None:
+        meta["embedding_dim"] = int(embedding.shape[0])
+    header = json.dumps(meta, separators=(",", ":"), default=_json_default).encode()
+    parts = [_HEADER.pack(_MAGIC, len(header)), header]
+    if embedding is not None:
+        parts.append(np.ascontiguousarray(embedding, dtype="<f4").tobytes())
+    return b"".join(parts)
+
+
+def decode_entry(data: bytes) -> Dict:
+    magic, header_len = _HEADER.unpack_from(data)
+    if magic != _MAGIC:
+        raise ValueError("Not a cache entry")
+    offset = _HEADER.size
+    entry = json.loads(data[offset:offset + header_len])
+    dim = entry.pop("embedding_dim", None)
+    if dim is not None:
+        entry["embedding"] = np.frombuffer(
+            data, dtype="<f4", count=dim, offset=offset + header_len
+        ).astype(np.float32)
+    return entry
+
+
+# ================= BACKENDS =================
+
+class CacheBackend(ABC):
+    """Byte-oriented key/value store with per-entry TTL."""
+
+    name = "base"
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[bytes]:
+        """Stored bytes, or None when missing or expired."""
+
+    @abstractmethod
+    def set(self, key: str, value: bytes, ttl: Optional[float]) -> None:
+        """Store ``value``; ``ttl`` in seconds, None or 0 = no expiry."""
+
+    @abstractmethod
+    def delete(self, key: str) -> None:
+        """Remove ``key`` if present."""
+
+
+class MemoryCache(CacheBackend):
+    """Thread-safe in-process LRU with TTL and an entry cap."""
+
+    name = "memory"
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires_at = item
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: bytes, ttl: Optional[float]) -> None:
+        expires_at = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+
+class SQLiteCache(CacheBackend):
+    """
+    File-based shared tier for replicas on one host (WAL mode, LRU by access
+    time). Access times are refreshed at most every ``_TOUCH_SECONDS`` per
+    entry, so hits are plain reads and processes sharing the file do not
+    serialize on the write lock; eviction order is approximate to that
+    granularity.
+    """
+
+    name = "sqlite"
+    # Trim to the cap every N writes instead of on each one
+    _TRIM_EVERY = 100
+    _TOUCH_SECONDS = 300.0
+
+    def __init__(self, path: str, max_entries: int):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=5.0)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            " key TEXT PRIMARY KEY, value BLOB NOT NULL,"
+            " expires_at REAL, accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ix_cache_accessed ON cache (accessed_at)")
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[bytes]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at, accessed_at FROM cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            value, expires_at, accessed_at = row
+            if expires_at is not None and expires_at <= now:
+                self._conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+                self._conn.commit()
+                return None
+            if now - accessed_at >= self._TOUCH_SECONDS:
+                self._conn.execute("UPDATE cache SET accessed_at = ? WHERE key = ?", (now, key))
+                self._conn.commit()
+            return bytes(value)
+
+    def set(self, key: str, value: bytes, ttl: Optional[float]) -> None:
+        now = time.time()
+        expires_at = now + ttl if ttl else None
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, sqlite3.Binary(value), expires_at, now),
+            )
+            self._writes += 1
+            if self._writes % self._TRIM_EVERY == 0:
+                self._trim(now)
+            self._conn.commit()
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+            self._conn.commit()
+
+    def _trim(self, now: float) -> None:
+        self._conn.execute("DELETE FROM cache WHERE expires_at IS NOT NULL AND expires_at <= ?", (now,))
+        self._conn.execute(
+            "DELETE FROM cache WHERE key IN ("
+            " SELECT key FROM cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,),
+        )
+
+
+class RedisCache(CacheBackend):
+    """
+    Shared tier on any Redis-protocol server. Size cap is the server's
+    maxmemory policy. ``client`` replaces the connection built from ``url``,
+    e.g. ``fakeredis.FakeRedis()`` to run without a server.
+    """
+
+    name = "redis"
+
+    def __init__(self, url: str = "", client=None):
+        if client is None:
+            import redis  # optional dependency, only needed for this backend
+
+            client = redis.Redis.from_url(url, socket_timeout=0.5, socket_connect_timeout=0.5)
+        self._client = client
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self._client.get(key)
+
+    def set(self, key: str, value: bytes, ttl: Optional[float]) -> None:
+        if ttl:
+            self._client.set(key, value, px=int(ttl * 1000))
+        else:
+            self._client.set(key, value)
+
+    def delete(self, key: str) -> None:
+        self._client.delete(key)
+
+
+# ================= TIERED CACHE =================
+
+class ResultCache:
+    """In-process tier in front of an optional shared tier."""
+
+    def __init__(self, local: CacheBackend, shared: Optional[CacheBackend] = None, ttl: Optional[float] = None):
+        self.local = local
+        self.shared = shared
+        self.ttl = ttl
+
+    def get(self, key: str) -> Optional[Dict]:
+        data = self.local.get(key)
+        if data is not None:
+            CACHE_REQUESTS.labels(tier=self.local.name, result="hit").inc()
+        else:
+            CACHE_REQUESTS.labels(tier=self.local.name, result="miss").inc()
+            if self.shared is None:
+                return None
+            try:
+                data = self.shared.get(key)
+            except Exception as e:
+                logger.warning("Shared cache get failed (%s): %s", self.shared.name, e)
+                return None
+            CACHE_REQUESTS.labels(tier=self.shared.name, result="miss" if data is None else "hit").inc()
+            if data is None:
+                return None
+            self.local.set(key, data, self.ttl)
+        try:
+            return decode_entry(data)
+        except Exception as e:
+            logger.warning("Dropping undecodable cache entry %s: %s", key, e)
+            self.local.delete(key)
+            return None
+
+    def set(self, key: str, entry: Dict) -> None:
+        data = encode_entry(entry)
+        self.local.set(key, data, self.ttl)
+        if self.shared is not None:
+            try:
+                self.shared.set(key, data, self.ttl)
+            except Exception as e:
+                logger.warning("Shared cache set failed (%s): %s", self.shared.name, e)
+
+
+def _build_shared() -> Optional[CacheBackend]:
+    if CACHE_BACKEND in ("", "memory", "none"):
+        return None
+    if CACHE_BACKEND == "sqlite":
+        return SQLiteCache(CACHE_URL or "cache/face_cache.db", CACHE_SHARED_MAX_ENTRIES)
+    if CACHE_BACKEND == "redis":
+        return RedisCache(CACHE_URL or "redis://localhost:6379/0")
+    raise ValueError(f"Unknown CACHE_BACKEND {CACHE_BACKEND!r}")
+
+
+_cache: Optional[ResultCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> Optional[ResultCache]:
+    """Process-wide result cache from config; None when CACHE_BACKEND=none."""
+    global _cache
+    if CACHE_BACKEND == "none":
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                try:
+                    shared = _build_shared()
+                except Exception as e:
+                    logger.warning("Shared cache tier unavailable, using in-process only: %s", e)
+                    shared = None
+                _cache = ResultCache(MemoryCache(CACHE_MAX_ENTRIES), shared, CACHE_TTL_SECONDS or None)
+                logger.info(
+                    "Result cache: memory(%d)%s",
+                    CACHE_MAX_ENTRIES,
+                    f" + {shared.name}" if shared else "",
+                )
+    return _cache
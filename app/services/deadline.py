@@ -0,0 +1,100 @@
+"""
+Per-request deadlines and cooperative cancellation.
+
+A request's budget comes from the ``X-Request-Timeout-Ms`` header (the
+caller's remaining time, e.g. the gateway timeout) and REQUEST_TIMEOUT_MS,
+whichever is shorter, counted from when the request arrives. The absolute
+deadline lives in a context variable, so it follows the request into worker
+threads (``run_in_threadpool`` copies the context).
+
+Nothing is interrupted mid-step: the admission queue wait is capped at the
+deadline, and pipeline code calls ``check_deadline(step)`` between steps,
+which raises ``DeadlineExceeded`` (504) once the caller has given up so the
+remaining decode / inference / storage work is dropped.
+"""
+import logging
+import time
+from contextvars import ContextVar
+from typing import Iterable, Optional
+
+from fastapi import HTTPException
+from starlette.responses import JSONResponse
+
+from app.config import REQUEST_DEADLINE_HEADER, REQUEST_TIMEOUT_MS
+from .metrics import DEADLINE_EXCEEDED, record_rejection
+
+logger = logging.getLogger(__name__)
+
+_deadline: ContextVar[Optional[float]] = ContextVar("request_deadline", default=None)
+
+
+class DeadlineExceeded(HTTPException):
+    """The request's deadline passed before ``step``; nobody is waiting for the result."""
+
+    def __init__(self, step: str):
+        super().__init__(status_code=504, detail=f"Request deadline exceeded before {step}")
+        self.step = step
+
+
+def remaining() -> Optional[float]:
+    """Seconds left (may be negative), or None without a deadline."""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def expired() -> bool:
+    left = remaining()
+    return left is not None and left <= 0
+
+
+def deadline_exceeded(step: str) -> DeadlineExceeded:
+    """Record an abandoned request and return the exception to raise."""
+    record_rejection("deadline_exceeded")
+    DEADLINE_EXCEEDED.labels(step=step).inc()
+    logger.info("Deadline exceeded before %s; abandoning the request", step)
+    return DeadlineExceeded(step)
+
+
+def check_deadline(step: str) -> None:
+    """Raise DeadlineExceeded if the current request's deadline has passed."""
+    if expired():
+        raise deadline_exceeded(step)
+
+
+def request_budget(scope) -> Optional[float]:
+    """Budget in seconds from the header and REQUEST_TIMEOUT_MS; None = unlimited."""
+    budgets = [REQUEST_TIMEOUT_MS / 1000.0] if REQUEST_TIMEOUT_MS > 0 else []
+    header = REQUEST_DEADLINE_HEADER.lower().encode()
+    for name, value in scope.get("headers", []):
+        if name == header:
+            try:
+                budgets.append(float(value) / 1000.0)
+            except ValueError:
+                logger.debug("Ignoring invalid %s header: %r", REQUEST_DEADLINE_HEADER, value)
+            break
+    return min(budgets) if budgets else None
+
+
+class DeadlineMiddleware:
+    """ASGI middleware giving requests to ``paths`` their deadline."""
+
+    def __init__(self, app, paths: Iterable[str]):
+        self.app = app
+        self.paths = frozenset(paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+        budget = request_budget(scope)
+        if budget is not None and budget <= 0:
+            # Already out of time on arrival: don't even read the body
+            e = deadline_exceeded("read")
+            response = JSONResponse(status_code=e.status_code, content={"detail": e.detail})
+            await response(scope, receive, send)
+            return
+        token = _deadline.set(None if budget is None else time.monotonic() + budget)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _deadline.reset(token)
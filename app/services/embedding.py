@@ -46,6 +46,15 @@ class EmbeddingExtractor:
             embeddings.append(emb)
         return embeddings
     
+    @staticmethod
+    def to_bytes(embedding: np.ndarray) -> bytes:
+        """Compact storage form: little-endian float32."""
+        return np.ascontiguousarray(embedding, dtype="<f4").tobytes()
+
+    @staticmethod
+    def from_bytes(data: bytes) -> np.ndarray:
+        return np.frombuffer(data, dtype="<f4").astype(np.float32)
+
     def validate_embedding(self, embedding: np.ndarray) -> bool:
         if embedding is None:
             return False
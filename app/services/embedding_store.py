@@ -0,0 +1,221 @@
+"""
+Compact embedding matrix for galleries and offline jobs.
+
+Embeddings are held row-major in one contiguous array, either as float16
+(half the memory of float32) or int8 with a per-row float32 scale (a quarter).
+Rows are kept in a C-contiguous block so similarity can run as tiled BLAS
+matmuls over zero-copy views.
+
+On-disk format (little-endian), memory-mappable so large stores open instantly:
+
+    offset 0   magic      8s   b"FVEMB\\x00\\x01\\x00"
+    offset 8   dtype      u8   1 = float16, 2 = int8 (+ scales)
+    offset 9   reserved   3x
+    offset 12  dim        u32
+    offset 16  count      u64
+    offset 24  name_len   u16
+    offset 26  model name utf-8 (name_len bytes)
+    ...        ids        int64[count]     (64-byte aligned)
+    ...        scales     float32[count]   (int8 only, 64-byte aligned)
+    ...        data       dtype[count, dim] (64-byte aligned)
+"""
+import struct
+from pathlib import Path
+from typing import Iterator, Optional, Tuple, Union
+
+import numpy as np
+
+_MAGIC = b"FVEMB\x00\x01\x00"
+_HEADER = struct.Struct("<8sB3xIQH")
+_ALIGN = 64
+_DTYPE_CODES = {"float16": 1, "int8": 2}
+_NP_DTYPES = {"float16": np.dtype("<f2"), "int8": np.dtype("i1")}
+_CODE_DTYPES = {v: k for k, v in _DTYPE_CODES.items()}
+
+
+def _align(offset: int) -> int:
+    return (offset + _ALIGN - 1) // _ALIGN * _ALIGN
+
+
+class EmbeddingStore:
+    """Growable float16 / int8 embedding matrix with ids and model metadata."""
+
+    __slots__ = ("model_name", "dim", "dtype", "_ids", "_data", "_scales", "_count", "_readonly")
+
+    def __init__(self, model_name: str, dim: int, dtype: str = "float16", capacity: int = 1024):
+        if dtype not in _DTYPE_CODES:
+            raise ValueError(f"Unsupported dtype {dtype!r}. Use one of {list(_DTYPE_CODES)}")
+        self.model_name = model_name
+        self.dim = dim
+        self.dtype = dtype
+        self._ids = np.empty(capacity, dtype=np.int64)
+        self._data = np.empty((capacity, dim), dtype=_NP_DTYPES[dtype])
+        self._scales = np.empty(capacity, dtype=np.float32) if dtype == "int8" else None
+        self._count = 0
+        self._readonly = False
+
+    def __len__(self) -> int:
+        return self._count
+
+    @property
+    def nbytes(self) -> int:
+        n = self._count
+        total = self._ids[:n].nbytes + self._data[:n].nbytes
+        if self._scales is not None:
+            total += self._scales[:n].nbytes
+        return total
+
+    # ---------------- building ----------------
+
+    def _grow(self, needed: int) -> None:
+        capacity = len(self._ids)
+        if needed <= capacity:
+            return
+        new_capacity = max(needed, capacity * 2)
+        ids = np.empty(new_capacity, dtype=np.int64)
+        ids[:self._count] = self._ids[:self._count]
+        data = np.empty((new_capacity, self.dim), dtype=self._data.dtype)
+        data[:self._count] = self._data[:self._count]
+        self._ids, self._data = ids, data
+        if self._scales is not None:
+            scales = np.empty(new_capacity, dtype=np.float32)
+            scales[:self._count] = self._scales[:self._count]
+            self._scales = scales
+
+    def add(self, ids: np.ndarray, embeddings: np.ndarray) -> None:
+        """Append rows. ``embeddings`` is (n, dim) float, ideally L2-normalized."""
+        if self._readonly:
+            raise ValueError("Store is read-only (memory-mapped)")
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        if embeddings.ndim == 1:
+            embeddings = embeddings[None, :]
+        if embeddings.shape[1] != self.dim:
+            raise ValueError(f"Expected dim {self.dim}, got {embeddings.shape[1]}")
+        n = embeddings.shape[0]
+        start = self._count
+        self._grow(start + n)
+        self._ids[start:start + n] = ids
+        if self.dtype == "int8":
+            scales = np.abs(embeddings).max(axis=1) / 127.0
+            scales[scales == 0] = 1.0
+            self._scales[start:start + n] = scales
+            self._data[start:start + n] = np.rint(embeddings / scales[:, None])
+        else:
+            self._data[start:start + n] = embeddings
+        self._count += n
+
+    # ---------------- views ----------------
+
+    @property
+    def ids(self) -> np.ndarray:
+        """Zero-copy view of the row ids."""
+        return self._ids[:self._count]
+
+    def view(self) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+        """Zero-copy (data, scales) views; scales is None for float16."""
+        n = self._count
+        return self._data[:n], (self._scales[:n] if self._scales is not None else None)
+
+    def block(self, start: int, rows: int) -> np.ndarray:
+        """Rows ``start:start + rows`` as a float32 copy (dequantized for int8)."""
+        data, scales = self.view()
+        block = data[start:start + rows].astype(np.float32)
+        if scales is not None:
+            block *= scales[start:start + rows, None]
+        return block
+
+    def iter_blocks(self, block_rows: int = 65536) -> Iterator[Tuple[int, np.ndarray]]:
+        """
+        Yield (start_row, float32 block) for tiled computation. Only one block
+        is materialized as float32 at a time.
+        """
+        for start in range(0, self._count, block_rows):
+            yield start, self.block(start, block_rows)
+
+    def similarities(self, query: np.ndarray, block_rows: int = 65536) -> np.ndarray:
+        """Dot product (cosine for normalized rows) of ``query`` (dim,) or (q, dim) against every row."""
+        query = np.asarray(query, dtype=np.float32)
+        single = query.ndim == 1
+        q = query[None, :] if single else query
+        out = np.empty((q.shape[0], self._count), dtype=np.float32)
+        for start, block in self.iter_blocks(block_rows):
+            np.matmul(q, block.T, out=out[:, start:start + block.shape[0]])
+        return out[0] if single else out
+
+    def top_k(self, query: np.ndarray, k: int = 10) -> Tuple[np.ndarray, np.ndarray]:
+        """(ids, scores) of the k most similar rows, best first."""
+        scores = self.similarities(query)
+        k = min(k, len(scores))
+        if k == 0:
+            return self.ids[:0], scores[:0]
+        idx = np.argpartition(-scores, k - 1)[:k]
+        idx = idx[np.argsort(-scores[idx])]
+        return self.ids[idx], scores[idx]
+
+    # ---------------- persistence ----------------
+
+    def _layout(self, count: int) -> Tuple[bytes, int, Optional[int], int]:
+        name = self.model_name.encode()
+        header = _HEADER.pack(_MAGIC, _DTYPE_CODES[self.dtype], self.dim, count, len(name)) + name
+        ids_offset = _align(len(header))
+        cursor = ids_offset + count * 8
+        scales_offset = None
+        if self.dtype == "int8":
+            scales_offset = _align(cursor)
+            cursor = scales_offset + count * 4
+        data_offset = _align(cursor)
+        return header, ids_offset, scales_offset, data_offset
+
+    def save(self, path: Union[str, Path]) -> None:
+        """Write the store; written to a temp file and renamed into place."""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        n = self._count
+        header, ids_offset, scales_offset, data_offset = self._layout(n)
+        tmp = path.with_suffix(path.suffix + ".tmp")
+        with open(tmp, "wb") as f:
+            f.write(header)
+            f.seek(ids_offset)
+            f.write(self._ids[:n].astype("<i8").tobytes())
+            if scales_offset is not None:
+                f.seek(scales_offset)
+                f.write(self._scales[:n].astype("<f4").tobytes())
+            f.seek(data_offset)
+            f.write(np.ascontiguousarray(self._data[:n]).tobytes())
+        tmp.replace(path)
+
+    @classmethod
+    def load(cls, path: Union[str, Path], mmap: bool = True) -> "EmbeddingStore":
+        """Open a saved store; with ``mmap`` the arrays are read-only views of the file."""
+        path = Path(path)
+        with open(path, "rb") as f:
+            head = f.read(_HEADER.size)
+            magic, code, dim, count, name_len = _HEADER.unpack(head)
+            if magic != _MAGIC:
+                raise ValueError(f"{path} is not an embedding store")
+            model_name = f.read(name_len).decode()
+        dtype = _CODE_DTYPES[code]
+        store = cls.__new__(cls)
+        store.model_name = model_name
+        store.dim = dim
+        store.dtype = dtype
+        store._count = count
+        store._readonly = mmap
+        _, ids_offset, scales_offset, data_offset = store._layout(count)
+        if count == 0:
+            store._ids = np.empty(0, dtype=np.int64)
+            store._data = np.empty((0, dim), dtype=_NP_DTYPES[dtype])
+            store._scales = np.empty(0, dtype=np.float32) if dtype == "int8" else None
+            return store
+
+        def read(offset: int, dt, shape):
+            if mmap:
+                return np.memmap(path, dtype=dt, mode="r", offset=offset, shape=shape)
+            with open(path, "rb") as f:
+                f.seek(offset)
+                return np.fromfile(f, dtype=dt, count=int(np.prod(shape))).reshape(shape)
+
+        store._ids = read(ids_offset, "<i8", (count,))
+        store._scales = read(scales_offset, "<f4", (count,)) if scales_offset is not None else None
+        store._data = read(data_offset, _NP_DTYPES[dtype], (count, dim))
+        return store
@@ -1,32 +1,229 @@
 import logging
+import os
+import threading
+import time
+from pathlib import Path
 
 import cv2
 import numpy as np
-from deepface import DeepFace
-from typing import Dict, Optional, Tuple
+from typing import Dict, List, Optional, Tuple
+
+from app.config import (
+    DETECTION_MAX_SIZE,
+    FACE_DOMINANCE_RATIO,
+    FACE_SELECTION_MODE,
+    MODEL_ALLOW_DOWNLOAD,
+    MODEL_DIR,
+)
+from app.utils.buffer_pool import frame_buffer
+from app.utils.image_utils import ImageProcessor
+from .deadline import DeadlineExceeded, check_deadline
+from .metrics import record_startup, stage
+from .runtime import configure_tensorflow
 
 logger = logging.getLogger(__name__)
 
+# Weight files DeepFace looks for under $DEEPFACE_HOME/.deepface/weights
+WEIGHT_FILES = {
+    "Facenet512": "facenet512_weights.h5",
+}
+
+DeepFace = None
+_deepface_lock = threading.Lock()
+
+
+def weights_dir() -> Path:
+    home = MODEL_DIR or os.getenv("DEEPFACE_HOME") or str(Path.home())
+    return Path(home) / ".deepface" / "weights"
+
+
+def _load_deepface():
+    """
+    Import DeepFace (and with it TensorFlow) on first use, not at module import.
+
+    DEEPFACE_HOME is pointed at MODEL_DIR first so weights resolve to the
+    bundled copy.
+    """
+    global DeepFace
+    if DeepFace is None:
+        with _deepface_lock:
+            if DeepFace is None:
+                if MODEL_DIR:
+                    os.environ["DEEPFACE_HOME"] = str(Path(MODEL_DIR).resolve())
+                start = time.perf_counter()
+                from deepface import DeepFace as _DeepFace
+
+                configure_tensorflow()
+                record_startup("deepface_import", time.perf_counter() - start)
+                DeepFace = _DeepFace
+    return DeepFace
+
 
 class FaceDetector:
-    def __init__(self):
+    SELECTION_MODES = ("single", "dominant")
+    # Margin around the selected face when re-cropping it for embedding
+    CROP_MARGIN = 0.25
+    # Recognition model input side; the two-resolution path crops to this directly
+    EMBED_INPUT_SIZE = 160
+
+    def __init__(
+        self,
+        selection_mode: str = FACE_SELECTION_MODE,
+        dominance_ratio: float = FACE_DOMINANCE_RATIO,
+        detection_size: int = DETECTION_MAX_SIZE,
+    ):
         """Initialize DeepFace model."""
+        if selection_mode not in self.SELECTION_MODES:
+            raise ValueError(f"Unknown face selection mode {selection_mode!r}. Use one of {self.SELECTION_MODES}")
         self.model_name = "Facenet512"
         self.detector_backend = "opencv"
-        logger.info("DeepFace model initialized successfully")
+        self.selection_mode = selection_mode
+        self.dominance_ratio = dominance_ratio
+        # 0 = detect on the full frame and let DeepFace embed from it
+        self.detection_size = detection_size
+        self._loaded = False
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded
+
+    def load(self) -> None:
+        """
+        Import DeepFace and build the recognition model from local weights.
+
+        Raises FileNotFoundError when the weights are missing and
+        MODEL_ALLOW_DOWNLOAD is off, instead of letting DeepFace fetch them.
+        """
+        if self._loaded:
+            return
+        weight_file = WEIGHT_FILES.get(self.model_name)
+        if weight_file and not MODEL_ALLOW_DOWNLOAD:
+            path = weights_dir() / weight_file
+            if not path.is_file():
+                raise FileNotFoundError(
+                    f"Model weights not found at {path}. Bundle them into MODEL_DIR "
+                    "or set MODEL_ALLOW_DOWNLOAD=1"
+                )
+        deepface = _load_deepface()
+        start = time.perf_counter()
+        deepface.build_model(self.model_name)
+        record_startup("model_build", time.perf_counter() - start)
+        self._loaded = True
+        logger.info("DeepFace model %s loaded from %s", self.model_name, weights_dir())
+
+    @property
+    def model_version(self) -> str:
+        """Identifies detector/embedding output; part of result cache keys."""
+        if self.detection_size:
+            return f"{self.model_name}-{self.detector_backend}-det{self.detection_size}-v1"
+        return f"{self.model_name}-{self.detector_backend}-v1"
+
+    @property
+    def result_key(self) -> str:
+        """model_version plus settings that change which images pass detection."""
+        if self.selection_mode == "single":
+            return self.model_version
+        return f"{self.model_version}-{self.selection_mode}{self.dominance_ratio:g}"
+
+    @staticmethod
+    def _face_score(face_obj: Dict) -> Tuple[int, float, float]:
+        area = face_obj["facial_area"]
+        face_area = int(area["w"] * area["h"])
+        confidence = float(face_obj.get("confidence", 1.0))
+        return face_area, confidence, face_area * confidence
+
+    def select_dominant_face(self, face_objs: List[Dict]) -> Tuple[Optional[int], Dict]:
+        """
+        Pick the face whose area x confidence beats the runner-up by dominance_ratio.
+
+        Returns:
+            (index or None, selection report for face_info)
+        """
+        candidates = []
+        for i, face_obj in enumerate(face_objs):
+            face_area, confidence, score = self._face_score(face_obj)
+            area = face_obj["facial_area"]
+            candidates.append({
+                "index": i,
+                "bbox": [area["x"], area["y"], area["x"] + area["w"], area["y"] + area["h"]],
+                "face_area": face_area,
+                "confidence": round(confidence, 3),
+                "score": round(score, 1),
+            })
+        ranked = sorted(candidates, key=lambda c: c["score"], reverse=True)
+        best, runner_up = ranked[0], ranked[1]
+        ratio = best["score"] / runner_up["score"] if runner_up["score"] > 0 else float("inf")
+        selected = best["index"] if ratio >= self.dominance_ratio else None
+        report = {
+            "mode": self.selection_mode,
+            "faces_detected": len(face_objs),
+            "dominance_ratio": round(ratio, 2) if ratio != float("inf") else None,
+            "required_ratio": self.dominance_ratio,
+            "selected_index": selected,
+            "candidates": ranked,
+        }
+        return selected, report
+
+    def _crop_face(self, rgb_image: np.ndarray, facial_area: Dict) -> np.ndarray:
+        h, w = rgb_image.shape[:2]
+        mx = int(facial_area["w"] * self.CROP_MARGIN)
+        my = int(facial_area["h"] * self.CROP_MARGIN)
+        x1 = max(0, facial_area["x"] - mx)
+        y1 = max(0, facial_area["y"] - my)
+        x2 = min(w, facial_area["x"] + facial_area["w"] + mx)
+        y2 = min(h, facial_area["y"] + facial_area["h"] + my)
+        return np.ascontiguousarray(rgb_image[y1:y2, x1:x2])
+
+    @staticmethod
+    def _scale_area(facial_area: Dict, sx: float, sy: float) -> Dict:
+        """Map a facial_area (box and eye points) from proxy to full-frame coordinates."""
+        area = dict(facial_area)
+        area["x"], area["w"] = int(round(area["x"] * sx)), int(round(area["w"] * sx))
+        area["y"], area["h"] = int(round(area["y"] * sy)), int(round(area["h"] * sy))
+        for eye in ("left_eye", "right_eye"):
+            if area.get(eye) is not None:
+                area[eye] = (int(round(area[eye][0] * sx)), int(round(area[eye][1] * sy)))
+        return area
+
+    def _aligned_crop(self, image: np.ndarray, facial_area: Dict) -> np.ndarray:
+        """Eye-aligned EMBED_INPUT_SIZE crop (RGB) of the face box, cut from the full frame."""
+        eyes = [facial_area.get("left_eye"), facial_area.get("right_eye")]
+        x, y, w, h = facial_area["x"], facial_area["y"], facial_area["w"], facial_area["h"]
+        crop = ImageProcessor.face_thumbnail(
+            image,
+            [x, y, x + w, y + h],
+            eyes if all(e is not None for e in eyes) else None,
+            size=self.EMBED_INPUT_SIZE,
+            margin=0.0,  # same tight box DeepFace crops before embedding
+        )
+        return cv2.cvtColor(crop, cv2.COLOR_BGR2RGB)
 
     def _initialize_model(self):
         pass
 
     def detect_single_face(self, image: np.ndarray) -> Tuple[bool, Optional[Dict], str]:
+        """
+        Detect exactly one face (or a dominant one) and embed it.
+
+        With ``detection_size``, detection runs on a downscaled proxy of
+        ``image``; the boxes are mapped back and the embedding is taken from
+        an aligned crop of the full-resolution ``image``, so the full frame
+        is never scanned by the detector.
+        """
         try:
-            rgb_image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+            self.load()
+            detect_input = image
+            if self.detection_size and max(image.shape[:2]) > self.detection_size:
+                with stage("resize"):
+                    detect_input = ImageProcessor.resize_image(image, self.detection_size)
+            rgb_image = cv2.cvtColor(detect_input, cv2.COLOR_BGR2RGB, dst=frame_buffer(detect_input.shape))
             try:
-                face_objs = DeepFace.extract_faces(
-                    img_path=rgb_image,
-                    detector_backend=self.detector_backend,
-                    enforce_detection=True
-                )
+                with stage("detect"):
+                    face_objs = DeepFace.extract_faces(
+                        img_path=rgb_image,
+                        detector_backend=self.detector_backend,
+                        enforce_detection=True
+                    )
             except ValueError as e:
                 if "Face could not be detected" in str(e):
                     return False, None, "No face detected in image"
@@ -35,33 +232,87 @@ class FaceDetector:
             # Validate exactly one face
             if len(face_objs) == 0:
                 return False, None, "No face detected in image"
+
+            if detect_input is not image:
+                sx = image.shape[1] / detect_input.shape[1]
+                sy = image.shape[0] / detect_input.shape[0]
+                for face_obj in face_objs:
+                    face_obj["facial_area"] = self._scale_area(face_obj["facial_area"], sx, sy)
             
+            selection = None
             if len(face_objs) > 1:
-                return False, None, f"Multiple faces detected ({len(face_objs)}). Please upload image with single face"
-            
-            # Extract embedding using DeepFace
-            embedding_obj = DeepFace.represent(
-                img_path=rgb_image,
-                model_name=self.model_name,
-                detector_backend=self.detector_backend,
-                enforce_detection=True
-            )
-            
-            face_obj = face_objs[0]
+                if self.selection_mode != "dominant":
+                    return False, None, f"Multiple faces detected ({len(face_objs)}). Please upload image with single face"
+                selected, selection = self.select_dominant_face(face_objs)
+                if selected is None:
+                    return False, None, (
+                        f"Multiple faces detected ({len(face_objs)}) and none is dominant "
+                        f"(ratio {selection['dominance_ratio']} < {self.dominance_ratio:g}). "
+                        "Please upload image with single face"
+                    )
+                face_obj = face_objs[selected]
+            else:
+                face_obj = face_objs[0]
+
+            # Embedding is the most expensive step; skip it if the caller has given up
+            check_deadline("embed")
+            if self.detection_size:
+                # Boxes are known: embed the aligned crop, no second detection pass
+                with stage("crop"):
+                    crop = self._aligned_crop(image, face_obj["facial_area"])
+                encoding = self.embed_aligned_face(crop)
+            else:
+                if selection is not None:
+                    # Embed only the selected face: crop it (with margin) so the
+                    # background faces are never run through the model
+                    embed_input = self._crop_face(rgb_image, face_obj["facial_area"])
+                else:
+                    embed_input = rgb_image
+                with stage("embed"):
+                    embedding_obj = DeepFace.represent(
+                        img_path=embed_input,
+                        model_name=self.model_name,
+                        detector_backend=self.detector_backend,
+                        enforce_detection=selection is None
+                    )
+                if selection is not None and len(embedding_obj) > 1:
+                    # Crop margin may catch part of a neighbour; keep the largest face
+                    embedding_obj = sorted(
+                        embedding_obj,
+                        key=lambda r: r["facial_area"]["w"] * r["facial_area"]["h"],
+                        reverse=True,
+                    )
+                encoding = np.array(embedding_obj[0]['embedding'])
             
             # Create face data object
             face_data = {
-                'facial_area': face_obj['facial_area'],  # {x, y, w, h}
+                'facial_area': face_obj['facial_area'],  # {x, y, w, h}, full-frame coordinates
                 'confidence': face_obj.get('confidence', 1.0),
-                'encoding': np.array(embedding_obj[0]['embedding']),
+                'encoding': encoding,
                 'image': rgb_image
             }
+            if selection is not None:
+                face_data['selection'] = selection
             
             return True, face_data, "Face detected successfully"
 
+        except DeadlineExceeded:
+            raise
         except Exception as e:
             return False, None, f"Face detection error: {str(e)}"
 
+    def embed_aligned_face(self, face_rgb: np.ndarray) -> np.ndarray:
+        """Embed an already cropped and aligned face (e.g. a stored thumbnail), skipping detection."""
+        self.load()
+        with stage("embed"):
+            embedding_obj = DeepFace.represent(
+                img_path=face_rgb,
+                model_name=self.model_name,
+                detector_backend="skip",
+                enforce_detection=False,
+            )
+        return np.array(embedding_obj[0]["embedding"])
+
     def get_face_info(self, face) -> Dict:
         area = face["facial_area"]
         x, y, w, h = area['x'], area['y'], area['w'], area['h']
@@ -72,6 +323,12 @@ class FaceDetector:
             "face_area": int(w * h),
             "embedding_shape": face["encoding"].shape if face["encoding"] is not None else None,
         }
+        # Eye centers (newer DeepFace detectors report them); used to align thumbnails
+        eyes = [area.get("left_eye"), area.get("right_eye")]
+        if all(e is not None for e in eyes):
+            info["eyes"] = [[int(e[0]), int(e[1])] for e in eyes]
+        if "selection" in face:
+            info["selection"] = face["selection"]
         return info
 
     def visualize_detection(self, image: np.ndarray, face) -> np.ndarray:
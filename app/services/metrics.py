@@ -0,0 +1,180 @@
+"""
+Prometheus metrics and per-request stage timing.
+
+Stages are timed with ``stage(name)``; every observation goes into the
+``face_verify_stage_seconds`` histogram and, when a request timer is active
+(set by the HTTP middleware), into that request's Server-Timing breakdown.
+"""
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, Optional
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+)
+
+from app.utils.buffer_pool import FRAME_POOL, process_memory
+
+STAGES = (
+    "queue",
+    "read",
+    "cache",
+    "decode",
+    "resize",
+    "detect",
+    "crop",
+    "quality",
+    "embed",
+    "thumbnail",
+    "similarity",
+    "storage_upload",
+    "db_commit",
+)
+
+STAGE_SECONDS = Histogram(
+    "face_verify_stage_seconds",
+    "Time spent in each verification pipeline stage",
+    ["stage"],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+)
+REQUEST_SECONDS = Histogram(
+    "face_verify_request_seconds",
+    "End-to-end request latency",
+    ["endpoint"],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0),
+)
+REJECTIONS = Counter(
+    "face_verify_rejections_total",
+    "Verification requests rejected, by reason",
+    ["reason"],
+)
+IN_FLIGHT = Gauge(
+    "face_verify_in_flight_requests",
+    "Requests currently being processed",
+    ["endpoint"],
+)
+COALESCED = Counter(
+    "face_verify_coalesced_requests_total",
+    "Requests served by awaiting an identical in-flight job",
+    ["job"],
+)
+CACHE_REQUESTS = Counter(
+    "face_verify_cache_requests_total",
+    "Result cache lookups by tier and outcome",
+    ["tier", "result"],
+)
+MODEL_LOAD_SECONDS = Gauge(
+    "face_verify_model_load_seconds",
+    "Time taken to initialize the face services",
+)
+ADMISSION_QUEUE_SECONDS = Histogram(
+    "face_verify_admission_queue_seconds",
+    "Time admitted requests waited for an inference slot",
+    buckets=(0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+)
+ADMISSION_QUEUE_DEPTH = Gauge(
+    "face_verify_admission_queue_depth",
+    "Requests waiting for an inference slot",
+)
+ADMISSION_SHEDDING = Gauge(
+    "face_verify_admission_shedding",
+    "1 while queue latency is above target and queued admissions are shed",
+)
+STARTUP_SECONDS = Gauge(
+    "face_verify_startup_seconds",
+    "Cold-start timings: app import, model load and time to ready",
+    ["phase"],
+)
+FRAME_POOL_BYTES = Gauge(
+    "face_verify_frame_pool_bytes",
+    "Frame buffer pool memory: in_use, idle, peak_in_use (bytes)",
+    ["state"],
+)
+FRAME_POOL_OVERFLOWS = Gauge(
+    "face_verify_frame_pool_overflows",
+    "Frame buffers allocated outside the pool because it was full (since start)",
+)
+PROCESS_MEMORY_BYTES = Gauge(
+    "face_verify_process_memory_bytes",
+    "Resident set size of the worker process: rss, peak_rss",
+    ["kind"],
+)
+DEADLINE_EXCEEDED = Counter(
+    "face_verify_deadline_exceeded_total",
+    "Requests abandoned because their deadline passed, by the step that was skipped",
+    ["step"],
+)
+
+# phase -> seconds, also reported by /api/health
+STARTUP_TIMINGS: Dict[str, float] = {}
+
+
+class StageTimer:
+    """Accumulates per-stage durations for one request (seconds)."""
+
+    def __init__(self):
+        self.durations: Dict[str, float] = {}
+
+    def add(self, name: str, seconds: float) -> None:
+        self.durations[name] = self.durations.get(name, 0.0) + seconds
+
+    def server_timing(self) -> str:
+        """Format as a Server-Timing header value (durations in ms)."""
+        return ", ".join(
+            f"{name};dur={seconds * 1000:.1f}" for name, seconds in self.durations.items()
+        )
+
+
+_current_timer: ContextVar[Optional[StageTimer]] = ContextVar("stage_timer", default=None)
+
+
+def start_request_timer() -> StageTimer:
+    """Bind a fresh StageTimer to the current context and return it."""
+    timer = StageTimer()
+    _current_timer.set(timer)
+    return timer
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Time a pipeline stage into the histogram and the active request timer."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.labels(stage=name).observe(elapsed)
+        timer = _current_timer.get()
+        if timer is not None:
+            timer.add(name, elapsed)
+
+
+def record_startup(phase: str, seconds: float) -> None:
+    STARTUP_TIMINGS[phase] = round(seconds, 4)
+    STARTUP_SECONDS.labels(phase=phase).set(seconds)
+
+
+def record_rejection(reason: str) -> None:
+    REJECTIONS.labels(reason=reason).inc()
+
+
+def _update_memory_gauges() -> None:
+    pool = FRAME_POOL.stats()
+    for state in ("in_use", "idle", "peak_in_use"):
+        FRAME_POOL_BYTES.labels(state=state).set(pool[f"{state}_bytes"])
+    FRAME_POOL_OVERFLOWS.set(pool["overflows"])
+    memory = process_memory()
+    for kind in ("rss", "peak_rss"):
+        if memory[f"{kind}_mb"] is not None:
+            PROCESS_MEMORY_BYTES.labels(kind=kind).set(memory[f"{kind}_mb"] * 1024 * 1024)
+
+
+def render_latest() -> tuple[bytes, str]:
+    """Return (body, content_type) for the /metrics endpoint."""
+    _update_memory_gauges()
+    return generate_latest(), CONTENT_TYPE_LATEST
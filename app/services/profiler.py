@@ -0,0 +1,297 @@
+"""
+Opt-in production profiler.
+
+Nothing is hooked while idle: the HTTP middleware only checks ``PROFILER.armed``.
+Two modes:
+
+- ``cprofile``: deterministic cProfile of the next N requests (optionally bounded
+  by a time window); downloadable as marshalled pstats or a text report.
+- ``sample``: wall-clock stack sampling of every thread (event loop and
+  threadpool workers) for a time window; downloadable as collapsed stacks
+  (flamegraph.pl / speedscope input), rooted at the thread name.
+
+Pipeline work offloaded through ``run_in_worker`` is profiled in its worker
+thread and merged into the owning request's stats.
+
+Either mode can also trace allocations with tracemalloc and report the peak and
+the top allocation sites when the session finishes.
+"""
+import cProfile
+import io
+import logging
+import marshal
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+MODES = ("cprofile", "sample")
+MAX_REQUESTS = 1000
+MAX_SECONDS = 600.0
+
+# Worker-thread profiles collected for the request being profiled (cProfile is per-thread)
+_worker_profiles: ContextVar[Optional[list]] = ContextVar("worker_profiles", default=None)
+
+
+class ProfileSession:
+    """State of one profiling run."""
+
+    def __init__(
+        self,
+        mode: str,
+        requests: Optional[int],
+        seconds: Optional[float],
+        trace_memory: bool,
+        sample_interval: float,
+    ):
+        self.mode = mode
+        self.remaining = requests
+        self.deadline = time.monotonic() + seconds if seconds else None
+        self.trace_memory = trace_memory
+        self.sample_interval = sample_interval
+        self.started_at = time.time()
+        self.finished_at: Optional[float] = None
+        self.requests_profiled = 0
+        self.busy = False
+        self.stats: Optional[pstats.Stats] = None
+        self.samples: Counter = Counter()
+        self.memory_report: Optional[str] = None
+        self.stop_event = threading.Event()
+
+    def expired(self) -> bool:
+        if self.deadline is not None and time.monotonic() >= self.deadline:
+            return True
+        return self.remaining is not None and self.remaining <= 0 and not self.busy
+
+    def summary(self) -> Dict:
+        return {
+            "mode": self.mode,
+            "running": self.finished_at is None,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "requests_profiled": self.requests_profiled,
+            "requests_remaining": self.remaining,
+            "samples": sum(self.samples.values()),
+            "trace_memory": self.trace_memory,
+        }
+
+
+class Profiler:
+    """Process-wide profiler controller; at most one session at a time."""
+
+    def __init__(self):
+        self.armed = False
+        self._lock = threading.Lock()
+        self._session: Optional[ProfileSession] = None
+
+    # ---------------- control ----------------
+
+    def start(
+        self,
+        mode: str = "cprofile",
+        requests: Optional[int] = 10,
+        seconds: Optional[float] = None,
+        trace_memory: bool = False,
+        sample_interval: float = 0.005,
+    ) -> Dict:
+        if mode not in MODES:
+            raise ValueError(f"Unknown mode {mode!r}. Use one of {MODES}")
+        if mode == "sample" and not seconds:
+            raise ValueError("sample mode needs a time window (seconds)")
+        if mode == "cprofile" and not requests and not seconds:
+            raise ValueError("cprofile mode needs a request count or a time window")
+        if requests is not None and not 0 < requests <= MAX_REQUESTS:
+            raise ValueError(f"requests must be in 1..{MAX_REQUESTS}")
+        if seconds is not None and not 0 < seconds <= MAX_SECONDS:
+            raise ValueError(f"seconds must be in (0, {MAX_SECONDS:g}]")
+
+        with self._lock:
+            if self._session is not None and self._session.finished_at is None:
+                raise RuntimeError("A profiling session is already running")
+            session = ProfileSession(
+                mode,
+                requests if mode == "cprofile" else None,
+                seconds,
+                trace_memory,
+                sample_interval,
+            )
+            self._session = session
+            if trace_memory:
+                if not tracemalloc.is_tracing():
+                    tracemalloc.start(25)
+                tracemalloc.reset_peak()
+            if mode == "sample":
+                thread = threading.Thread(
+                    target=self._sample_loop,
+                    args=(session,),
+                    name="profiler-sampler",
+                    daemon=True,
+                )
+                thread.start()
+            else:
+                self.armed = True
+        logger.info("Profiler started: %s", session.summary())
+        return session.summary()
+
+    def stop(self) -> Dict:
+        with self._lock:
+            session = self._session
+            if session is None:
+                raise LookupError("No profiling session")
+            if session.finished_at is None:
+                self._finish_locked(session)
+            return session.summary()
+
+    def status(self) -> Optional[Dict]:
+        with self._lock:
+            session = self._session
+            if session is None:
+                return None
+            if session.finished_at is None and session.mode == "cprofile" and session.expired():
+                self._finish_locked(session)
+            return session.summary()
+
+    def _finish_locked(self, session: ProfileSession) -> None:
+        self.armed = False
+        session.stop_event.set()
+        session.finished_at = time.time()
+        if session.trace_memory and tracemalloc.is_tracing():
+            session.memory_report = _memory_report(tracemalloc.take_snapshot())
+            tracemalloc.stop()
+        logger.info("Profiler finished: %s", session.summary())
+
+    # ---------------- cProfile request hook ----------------
+
+    async def profile_request(self, call_next, request):
+        """Run ``call_next`` under cProfile if the armed session still wants requests."""
+        session = self._claim()
+        if session is None:
+            return await call_next(request)
+        worker_profiles: list = []
+        token = _worker_profiles.set(worker_profiles)
+        prof = cProfile.Profile()
+        prof.enable()
+        try:
+            return await call_next(request)
+        finally:
+            prof.disable()
+            _worker_profiles.reset(token)
+            self._record(session, [prof, *worker_profiles])
+
+    @staticmethod
+    def run_in_worker(fn, *args):
+        """Call ``fn`` in a threadpool worker, under cProfile if its request is being profiled."""
+        profiles = _worker_profiles.get()
+        if profiles is None:
+            return fn(*args)
+        prof = cProfile.Profile()
+        try:
+            return prof.runcall(fn, *args)
+        finally:
+            profiles.append(prof)
+
+    def _claim(self) -> Optional[ProfileSession]:
+        with self._lock:
+            session = self._session
+            if session is None or session.finished_at is not None or session.mode != "cprofile":
+                return None
+            if session.expired():
+                self._finish_locked(session)
+                return None
+            # cProfile is per-thread: profile one request at a time
+            if session.busy:
+                return None
+            session.busy = True
+            if session.remaining is not None:
+                session.remaining -= 1
+            return session
+
+    def _record(self, session: ProfileSession, profiles: list) -> None:
+        with self._lock:
+            if session.stats is None:
+                session.stats = pstats.Stats(*profiles)
+            else:
+                session.stats.add(*profiles)
+            session.requests_profiled += 1
+            session.busy = False
+            if session.finished_at is None and session.expired():
+                self._finish_locked(session)
+
+    # ---------------- sampling ----------------
+
+    def _sample_loop(self, session: ProfileSession) -> None:
+        own_id = threading.get_ident()
+        while not session.stop_event.wait(session.sample_interval):
+            if session.deadline is not None and time.monotonic() >= session.deadline:
+                break
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id != own_id:
+                    thread_name = names.get(thread_id, str(thread_id))
+                    session.samples[f"{thread_name};{_collapse(frame)}"] += 1
+        with self._lock:
+            if session.finished_at is None:
+                self._finish_locked(session)
+
+    # ---------------- output ----------------
+
+    def export(self, fmt: str) -> bytes:
+        """Return the finished session's output: pstats, text, collapsed or memory."""
+        with self._lock:
+            session = self._session
+            if session is None:
+                raise LookupError("No profiling session")
+            if session.finished_at is None:
+                raise RuntimeError("Profiling session is still running")
+        if fmt == "memory":
+            if session.memory_report is None:
+                raise LookupError("Session did not trace memory")
+            return session.memory_report.encode()
+        if fmt == "collapsed":
+            if session.mode != "sample":
+                raise LookupError("Collapsed stacks are only available in sample mode")
+            lines = [f"{stack} {count}" for stack, count in session.samples.most_common()]
+            return ("\n".join(lines) + "\n").encode()
+        if session.stats is None:
+            raise LookupError("No requests were profiled")
+        if fmt == "pstats":
+            return marshal.dumps(session.stats.stats)
+        if fmt == "text":
+            buf = io.StringIO()
+            stats = pstats.Stats(stream=buf)
+            stats.add(session.stats)
+            stats.sort_stats("cumulative").print_stats(60)
+            return buf.getvalue().encode()
+        raise ValueError(f"Unknown format {fmt!r}")
+
+
+def _collapse(frame) -> str:
+    parts = []
+    while frame is not None:
+        code = frame.f_code
+        parts.append(f"{code.co_name} ({Path(code.co_filename).name}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return ";".join(reversed(parts))
+
+
+def _memory_report(snapshot: tracemalloc.Snapshot, limit: int = 30) -> str:
+    current, peak = tracemalloc.get_traced_memory()
+    lines = [
+        f"current: {current / 1024 / 1024:.1f} MiB",
+        f"peak: {peak / 1024 / 1024:.1f} MiB",
+        "",
+        f"top {limit} allocation sites:",
+    ]
+    for stat in snapshot.statistics("lineno")[:limit]:
+        lines.append(str(stat))
+    return "\n".join(lines) + "\n"
+
+
+PROFILER = Profiler()
@@ -2,6 +2,8 @@ import cv2
 import numpy as np
 from typing import Dict, Tuple, Literal
 
+from app.utils.buffer_pool import scratch_buffer
+
 
 class QualityChecker:
     # ================= THRESHOLDS =================
@@ -16,9 +18,14 @@ class QualityChecker:
     @staticmethod
     def calculate_blur(image: np.ndarray) -> float:
         try:
-            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-            gray = cv2.equalizeHist(gray)
-            return float(cv2.Laplacian(gray, cv2.CV_64F).var())
+            shape = image.shape[:2]
+            with scratch_buffer(shape) as gray, scratch_buffer(shape, np.float64) as laplacian:
+                cv2.cvtColor(image, cv2.COLOR_BGR2GRAY, dst=gray)
+                cv2.equalizeHist(gray, dst=gray)
+                cv2.Laplacian(gray, cv2.CV_64F, dst=laplacian)
+                # variance without a full-size temporary
+                _, std = cv2.meanStdDev(laplacian)
+                return float(std[0, 0] ** 2)
         except Exception:
             # never crash on blur
             return 0.0
@@ -26,8 +33,9 @@ class QualityChecker:
     @staticmethod
     def calculate_brightness(image: np.ndarray) -> float:
         try:
-            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-            return float(np.mean(gray))
+            with scratch_buffer(image.shape[:2]) as gray:
+                cv2.cvtColor(image, cv2.COLOR_BGR2GRAY, dst=gray)
+                return float(np.mean(gray))
         except Exception:
             return 0.0
 
@@ -0,0 +1,163 @@
+"""
+Process-wide CPU / thread-pool configuration.
+
+OpenCV, TensorFlow (intra- and inter-op pools) and the BLAS behind NumPy each
+size their thread pools to the host's core count, which oversubscribes a
+CPU-limited container. ``configure_runtime`` sizes all of them from one
+setting (``CPU_THREADS``, default: CPUs actually available to the process,
+cgroup quota and affinity included) and optionally pins the process to
+``CPU_AFFINITY``.
+
+BLAS and TensorFlow read their thread env vars when they load, so this must
+run before NumPy / OpenCV / TensorFlow are imported (``app.main`` calls it
+first thing). Explicitly set per-library env vars (``OMP_NUM_THREADS``, ...)
+are left alone.
+
+Imports nothing from ``app`` so ``app.config`` can use ``available_cpus``.
+"""
+import logging
+import math
+import os
+import sys
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+BLAS_ENV_VARS = (
+    "OMP_NUM_THREADS",
+    "OPENBLAS_NUM_THREADS",
+    "MKL_NUM_THREADS",
+    "BLIS_NUM_THREADS",
+    "VECLIB_MAXIMUM_THREADS",
+    "NUMEXPR_NUM_THREADS",
+)
+
+_CGROUP_ROOT = Path("/sys/fs/cgroup")
+
+# Settings applied by configure_runtime (reported by /api/health)
+RUNTIME: Dict[str, Any] = {}
+
+
+def parse_cpu_list(spec: str) -> List[int]:
+    """``"0-3,6"`` -> [0, 1, 2, 3, 6]; empty string -> []."""
+    cpus = set()
+    for part in spec.replace(" ", "").split(","):
+        if not part:
+            continue
+        first, _, last = part.partition("-")
+        cpus.update(range(int(first), int(last or first) + 1))
+    return sorted(cpus)
+
+
+def cgroup_cpu_limit() -> Optional[float]:
+    """CPU quota of this process's cgroup (e.g. 1.5), or None when unlimited / unknown."""
+    try:
+        # cgroup v2: "max 100000" or "<quota> <period>"
+        quota, period = (_CGROUP_ROOT / "cpu.max").read_text().split()
+        return None if quota == "max" else int(quota) / int(period)
+    except (OSError, ValueError):
+        pass
+    for name in ("cpu", "cpu,cpuacct"):
+        # cgroup v1: quota is -1 when unlimited
+        try:
+            quota = int((_CGROUP_ROOT / name / "cpu.cfs_quota_us").read_text())
+            period = int((_CGROUP_ROOT / name / "cpu.cfs_period_us").read_text())
+        except (OSError, ValueError):
+            continue
+        return quota / period if quota > 0 and period > 0 else None
+    return None
+
+
+def _affinity() -> List[int]:
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def available_cpus(affinity: Sequence[int] = ()) -> int:
+    """CPUs this process can use: affinity mask (or ``affinity`` if given) capped by the cgroup quota."""
+    cpus = len(affinity) or len(_affinity())
+    limit = cgroup_cpu_limit()
+    if limit:
+        cpus = min(cpus, math.ceil(limit))
+    return max(1, cpus)
+
+
+def _limit_loaded_blas(threads: int) -> bool:
+    """Resize BLAS/OpenMP pools already loaded in this process (threadpoolctl, if installed)."""
+    try:
+        from threadpoolctl import threadpool_limits
+    except ImportError:
+        return False
+    threadpool_limits(limits=threads)
+    return True
+
+
+def configure_runtime(threads: int, inter_op_threads: int, affinity: Sequence[int] = ()) -> Dict[str, Any]:
+    """Pin the process (if ``affinity``) and size every native thread pool to ``threads``."""
+    if affinity and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, affinity)
+
+    for var in BLAS_ENV_VARS:
+        os.environ.setdefault(var, str(threads))
+    os.environ.setdefault("TF_NUM_INTRAOP_THREADS", str(threads))
+    os.environ.setdefault("TF_NUM_INTEROP_THREADS", str(inter_op_threads))
+
+    blas_loaded = "numpy" in sys.modules
+    import cv2
+
+    cv2.setNumThreads(threads)
+    if not _limit_loaded_blas(threads) and blas_loaded:
+        logger.warning(
+            "NumPy was imported before the thread configuration; its BLAS pool may "
+            "ignore CPU_THREADS (set OMP_NUM_THREADS or install threadpoolctl)"
+        )
+
+    RUNTIME.update(
+        host_cpus=os.cpu_count(),
+        cgroup_cpu_limit=cgroup_cpu_limit(),
+        affinity=_affinity(),
+        cpu_threads=threads,
+        tf_inter_op_threads=inter_op_threads,
+    )
+    logger.info(
+        "Runtime: %d threads per pool (host %s CPUs, cgroup limit %s, affinity %s)",
+        threads, RUNTIME["host_cpus"], RUNTIME["cgroup_cpu_limit"], RUNTIME["affinity"],
+    )
+    return RUNTIME
+
+
+def configure_tensorflow() -> None:
+    """Apply the thread settings through tf.config once TensorFlow is imported (by DeepFace)."""
+    tf = sys.modules.get("tensorflow")
+    if tf is None or not RUNTIME:
+        return
+    try:
+        tf.config.threading.set_intra_op_parallelism_threads(RUNTIME["cpu_threads"])
+        tf.config.threading.set_inter_op_parallelism_threads(RUNTIME["tf_inter_op_threads"])
+    except RuntimeError:
+        # Already initialized: the TF_NUM_*_THREADS env vars set earlier still apply
+        logger.debug("TensorFlow already initialized; thread pools not resized")
+
+
+def runtime_info() -> Dict[str, Any]:
+    """Configured and effective thread settings."""
+    import cv2
+
+    info = dict(RUNTIME)
+    info["cv2_threads"] = cv2.getNumThreads()
+    try:
+        from threadpoolctl import threadpool_info
+
+        info["blas_threads"] = {
+            pool.get("internal_api", pool.get("prefix")): pool["num_threads"] for pool in threadpool_info()
+        }
+    except ImportError:
+        info["blas_threads"] = {var: os.environ.get(var) for var in BLAS_ENV_VARS if var in os.environ}
+    tf = sys.modules.get("tensorflow")
+    if tf is not None:
+        # 0 = TensorFlow's own default (the env vars, else all cores)
+        info["tf_intra_op_threads"] = tf.config.threading.get_intra_op_parallelism_threads()
+        info["tf_inter_op_threads"] = tf.config.threading.get_inter_op_parallelism_threads()
+    return info
@@ -1,5 +1,4 @@
 import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
 from typing import Dict, List, Tuple
 
 
@@ -12,38 +11,62 @@ class SimilarityComputer:
     
     @staticmethod
     def cosine_similarity(emb1: np.ndarray, emb2: np.ndarray) -> float:
-        # Reshape for sklearn
-        emb1 = emb1.reshape(1, -1)
-        emb2 = emb2.reshape(1, -1)
+        emb1 = emb1.ravel()
+        emb2 = emb2.ravel()
         
-        # Compute cosine similarity
-        similarity = cosine_similarity(emb1, emb2)[0][0]
+        # Compute cosine similarity (0 for a zero vector, as sklearn did)
+        denom = np.linalg.norm(emb1) * np.linalg.norm(emb2)
+        similarity = float(np.dot(emb1, emb2) / denom) if denom > 0 else 0.0
         
         # Clip to [0, 1] range (cosine can be -1 to 1)
         similarity = np.clip(similarity, 0, 1)
         
         return float(similarity)
     
+    @staticmethod
+    def pairs_above(
+        a: np.ndarray,
+        b: np.ndarray,
+        threshold: float,
+        upper: bool = False
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        (rows of a, rows of b, similarity) of every pair scoring >= threshold,
+        from one matmul of L2-normalized float32 tiles. ``upper``: a and b are
+        the same tile, keep each pair once (row < col).
+        """
+        sims = a @ b.T
+        rows, cols = np.nonzero(sims >= threshold)
+        if upper:
+            keep = rows < cols
+            rows, cols = rows[keep], cols[keep]
+        return rows, cols, sims[rows, cols]
+    
     def compute_pairwise_similarities(
         self,
-        embeddings: List[np.ndarray]
+        embeddings: List[np.ndarray],
+        partial: bool = False
     ) -> Dict[str, float]:
-        if len(embeddings) != 3:
+        # partial: fewer images (early exit) - only the pairs among them
+        if len(embeddings) != 3 and not (partial and 2 <= len(embeddings) < 3):
             raise ValueError(f"Expected 3 embeddings, got {len(embeddings)}")
         
         # Compute all pairs
-        sim_1_2 = self.cosine_similarity(embeddings[0], embeddings[1])
-        sim_1_3 = self.cosine_similarity(embeddings[0], embeddings[2])
-        sim_2_3 = self.cosine_similarity(embeddings[1], embeddings[2])
-        
-        similarities = {
-            'img1_img2': sim_1_2,
-            'img1_img3': sim_1_3,
-            'img2_img3': sim_2_3
-        }
+        similarities = {}
+        for i in range(len(embeddings)):
+            for j in range(i + 1, len(embeddings)):
+                similarities[f'img{i + 1}_img{j + 1}'] = self.cosine_similarity(embeddings[i], embeddings[j])
         
         return similarities
     
+    def is_decided_different(self, embeddings: List[np.ndarray]) -> bool:
+        """True once the newest embedding falls below threshold against any earlier one."""
+        newest = embeddings[-1]
+        return any(
+            self.cosine_similarity(earlier, newest) < self.SAME_PERSON_THRESHOLD
+            for earlier in embeddings[:-1]
+        )
+    
     def verify_same_person(
         self,
         similarities: Dict[str, float]
@@ -0,0 +1,91 @@
+"""
+In-flight request coalescing (single-flight).
+
+Requests carrying the same job key while an identical job is still running
+await that job's result (or exception) instead of starting their own. The
+job runs in its own task, so it outlives the request that started it for as
+long as any other request is still waiting on it.
+"""
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, Hashable, Iterable, Optional, TypeVar
+
+from .deadline import DeadlineExceeded, expired
+from .metrics import COALESCED
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+def content_key(kind: str, digests: Iterable[str], *extra: Optional[str]) -> tuple:
+    """Job key from the operation kind, each image's content hash, and extra fields."""
+    return (kind, tuple(digests), *extra)
+
+
+class _Flight:
+    """A running job and the number of requests awaiting it."""
+
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Deduplicate concurrent calls by key. Event-loop local; not thread-safe."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._inflight: Dict[Hashable, _Flight] = {}
+
+    def __len__(self) -> int:
+        return len(self._inflight)
+
+    def _forget(self, key: Hashable, flight: _Flight) -> None:
+        if self._inflight.get(key) is flight:
+            del self._inflight[key]
+
+    def _start(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> _Flight:
+        # The task copies this request's context, so the job runs under the
+        # starting request's deadline and records into its stage timings
+        flight = _Flight(asyncio.ensure_future(fn()))
+
+        def done(task: asyncio.Task) -> None:
+            self._forget(key, flight)
+            if not task.cancelled():
+                # waiters may all be gone; mark the exception as retrieved
+                task.exception()
+
+        flight.task.add_done_callback(done)
+        self._inflight[key] = flight
+        return flight
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        flight = self._inflight.get(key)
+        leader = flight is None
+        if leader:
+            flight = self._start(key, fn)
+        else:
+            COALESCED.labels(job=self.name).inc()
+            logger.info("Coalesced %s request onto in-flight job", self.name)
+
+        flight.waiters += 1
+        try:
+            # shield: a waiter giving up (disconnect, shutdown) must not
+            # cancel a job other requests are still waiting on
+            return await asyncio.shield(flight.task)
+        except DeadlineExceeded:
+            # The leader's caller gave up (typically the original of this
+            # retry); run the job under this request's own deadline
+            if leader or expired():
+                raise
+            self._forget(key, flight)
+            return await self.do(key, fn)
+        finally:
+            flight.waiters -= 1
+            if not flight.waiters and not flight.task.done():
+                # Last waiter gone: nobody wants the result any more
+                self._forget(key, flight)
+                flight.task.cancel()
@@ -1,20 +1,33 @@
 """
 Save verified images: Cloudinary (primary) or local disk (fallback).
 """
+import asyncio
 import io
 import logging
 import os
+import urllib.request
 import uuid
 from datetime import datetime
 from pathlib import Path
-from typing import List, Optional, Tuple
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import insert
+from starlette.concurrency import run_in_threadpool
 
 from app.config import UPLOAD_DIR
 from app.db.database import SessionLocal
 from app.db.models import Image
+from app.db.repository import get_image_repository, order_like
+from app.services.embedding import EmbeddingExtractor
+from app.services.archive import is_packed, read_packed
+from app.services.metrics import stage
 
 logger = logging.getLogger(__name__)
 
+# Local face-crop thumbnails (when Cloudinary is not used)
+THUMBNAIL_DIR = UPLOAD_DIR / "thumbs"
+
 def _env_paths() -> list[Path]:
     """Paths to try for .env: cwd first (where uvicorn was run), then project root by file."""
     paths = [Path.cwd() / ".env"]
@@ -65,17 +78,8 @@ def _get_cloudinary_config() -> tuple[str, str, str, str]:
     return cloud_name, api_key, api_secret, folder
 
 
-def _upload_to_cloudinary(
-    image_bytes: bytes,
-    original_filename: str,
-    mimetype: Optional[str],
-    user_id: Optional[str],
-) -> str:
-    """Upload image bytes to Cloudinary. Returns secure_url. Credentials from .env file only."""
-    cloud_name, api_key, api_secret, folder = _get_cloudinary_config()
-    if not all([cloud_name, api_key, api_secret]):
-        raise ValueError("Missing Cloudinary credentials in .env")
-
+def _import_cloudinary(cloud_name: str, api_key: str, api_secret: str):
+    """Import and configure the Cloudinary SDK (not imported at module load)."""
     # Set env BEFORE importing cloudinary — SDK reads os.environ on first import and caches it
     os.environ["CLOUDINARY_CLOUD_NAME"] = cloud_name
     os.environ["CLOUDINARY_API_KEY"] = api_key
@@ -88,6 +92,28 @@ def _upload_to_cloudinary(
         api_key=api_key,
         api_secret=api_secret,
     )
+    return cloudinary
+
+
+def warm_storage() -> None:
+    """Import the Cloudinary SDK at startup when configured, so the first upload doesn't pay for it."""
+    cloud_name, api_key, api_secret, _ = _get_cloudinary_config()
+    if all([cloud_name, api_key, api_secret]):
+        _import_cloudinary(cloud_name, api_key, api_secret)
+
+
+def _upload_to_cloudinary(
+    image_bytes: bytes,
+    original_filename: str,
+    mimetype: Optional[str],
+    user_id: Optional[str],
+) -> str:
+    """Upload image bytes to Cloudinary. Returns secure_url. Credentials from .env file only."""
+    cloud_name, api_key, api_secret, folder = _get_cloudinary_config()
+    if not all([cloud_name, api_key, api_secret]):
+        raise ValueError("Missing Cloudinary credentials in .env")
+
+    cloudinary = _import_cloudinary(cloud_name, api_key, api_secret)
     ext = Path(original_filename).suffix.lower() or ".jpg"
     name = f"{user_id or 'anon'}_{uuid.uuid4().hex}{ext}"
     result = cloudinary.uploader.upload(
@@ -104,13 +130,14 @@ def _save_local(
     image_bytes: bytes,
     original_filename: str,
     mimetype: Optional[str],
+    root: Path = UPLOAD_DIR,
 ) -> str:
     """Save to local disk. Returns path string."""
     now = datetime.utcnow()
-    subdir = UPLOAD_DIR / str(now.year) / f"{now.month:02d}" / f"{now.day:02d}"
+    subdir = root / str(now.year) / f"{now.month:02d}" / f"{now.day:02d}"
     subdir.mkdir(parents=True, exist_ok=True)
     ext = Path(original_filename).suffix.lower()
-    if ext not in (".jpg", ".jpeg", ".png"):
+    if ext not in (".jpg", ".jpeg", ".png", ".webp"):
         ext = ".jpg"
     name = f"{uuid.uuid4().hex}{ext}"
     path = subdir / name
@@ -118,20 +145,28 @@ def _save_local(
     return str(path)
 
 
-def save_verified_image(
+def load_image_bytes(storage_path: str, timeout: float = 30.0) -> bytes:
+    """Read a stored image back: Cloudinary/HTTP URL, archive segment entry or local path."""
+    if storage_path.startswith(("http://", "https://")):
+        with urllib.request.urlopen(storage_path, timeout=timeout) as resp:
+            return resp.read()
+    if is_packed(storage_path):
+        return read_packed(storage_path)
+    return Path(storage_path).read_bytes()
+
+
+def _store_bytes(
     image_bytes: bytes,
     original_filename: str,
     mimetype: Optional[str],
     user_id: Optional[str],
-) -> Image:
-    """Save image to Cloudinary (if configured in .env) or local disk; create DB record."""
-    cloud_name, api_key, api_secret, _ = _get_cloudinary_config()
-    use_cloudinary = bool(cloud_name and api_key and api_secret)
+    use_cloudinary: bool,
+    local_root: Path = UPLOAD_DIR,
+) -> str:
+    """Upload to Cloudinary, falling back to local disk. Returns storage path/URL."""
     if use_cloudinary:
         try:
-            storage_path = _upload_to_cloudinary(
-                image_bytes, original_filename, mimetype, user_id
-            )
+            return _upload_to_cloudinary(image_bytes, original_filename, mimetype, user_id)
         except Exception as e:
             err_msg = str(e)
             if "Invalid Signature" in err_msg:
@@ -143,35 +178,154 @@ def save_verified_image(
                 )
             else:
                 logger.warning("Cloudinary upload failed, falling back to local: %s", e)
-            storage_path = _save_local(image_bytes, original_filename, mimetype)
-    else:
-        storage_path = _save_local(image_bytes, original_filename, mimetype)
-
-    db = SessionLocal()
-    try:
-        rec = Image(
-            user_id=user_id,
-            original_filename=original_filename,
-            storage_path=storage_path,
-            mimetype=mimetype,
-            size_bytes=len(image_bytes),
-            verified=True,
-            verified_at=datetime.utcnow(),
-        )
-        db.add(rec)
-        db.commit()
-        db.refresh(rec)
-        return rec
-    finally:
-        db.close()
+    return _save_local(image_bytes, original_filename, mimetype, local_root)
+
+
+def _cloudinary_enabled() -> bool:
+    cloud_name, api_key, api_secret, _ = _get_cloudinary_config()
+    return bool(cloud_name and api_key and api_secret)
+
+
+def upload_verified_image(
+    image_bytes: bytes,
+    original_filename: str,
+    mimetype: Optional[str],
+    user_id: Optional[str],
+    thumbnail: Optional[bytes] = None,
+    use_cloudinary: Optional[bool] = None,
+) -> Tuple[str, Optional[str]]:
+    """
+    Store image bytes (and the face-crop thumbnail, if given) on Cloudinary or
+    local disk. Returns (storage_path, thumbnail_path).
+    """
+    if use_cloudinary is None:
+        use_cloudinary = _cloudinary_enabled()
+    thumbnail_path = None
+    with stage("storage_upload"):
+        storage_path = _store_bytes(image_bytes, original_filename, mimetype, user_id, use_cloudinary)
+        if thumbnail is not None:
+            try:
+                thumbnail_path = _store_bytes(
+                    thumbnail, f"{Path(original_filename).stem}_face.webp", "image/webp",
+                    user_id, use_cloudinary, THUMBNAIL_DIR,
+                )
+            except Exception as e:
+                # The original is stored; a missing thumbnail only costs a later full download
+                logger.warning("Thumbnail save failed: %s", e)
+    return storage_path, thumbnail_path
+
+
+def _image_row(
+    image_bytes: bytes,
+    original_filename: str,
+    mimetype: Optional[str],
+    user_id: Optional[str],
+    paths: Tuple[str, Optional[str]],
+    embedding: Optional[np.ndarray],
+    embedding_model: Optional[str],
+    face_confidence: Optional[float] = None,
+) -> Dict:
+    """Column values for a new verified Image row."""
+    now = datetime.utcnow()
+    return {
+        "user_id": user_id,
+        "original_filename": original_filename,
+        "storage_path": paths[0],
+        "thumbnail_path": paths[1],
+        "mimetype": mimetype,
+        "size_bytes": len(image_bytes),
+        "verified": True,
+        "verified_at": now,
+        "created_at": now,
+        "embedding": EmbeddingExtractor.to_bytes(embedding) if embedding is not None else None,
+        "embedding_model": embedding_model if embedding is not None else None,
+        "face_confidence": face_confidence,
+    }
+
+
+def save_verified_image(
+    image_bytes: bytes,
+    original_filename: str,
+    mimetype: Optional[str],
+    user_id: Optional[str],
+    embedding: Optional[np.ndarray] = None,
+    embedding_model: Optional[str] = None,
+    thumbnail: Optional[bytes] = None,
+    face_confidence: Optional[float] = None,
+) -> Image:
+    """
+    Save image (and its face-crop thumbnail, if given) to Cloudinary (if
+    configured in .env) or local disk; create DB record.
+    """
+    return save_verified_batch(
+        [(image_bytes, original_filename, mimetype)], user_id,
+        [embedding], embedding_model, [thumbnail], [face_confidence],
+    )[0]
 
 
 def save_verified_batch(
     items: List[Tuple[bytes, str, Optional[str]]],
     user_id: Optional[str],
+    embeddings: Optional[List[np.ndarray]] = None,
+    embedding_model: Optional[str] = None,
+    thumbnails: Optional[List[Optional[bytes]]] = None,
+    face_confidences: Optional[List[Optional[float]]] = None,
 ) -> List[Image]:
-    """Save multiple images; return Image records in order."""
-    return [
-        save_verified_image(data[0], data[1], data[2], user_id)
-        for data in items
+    """
+    Save multiple images (with their embeddings/thumbnails/face detection
+    confidences, if given); return Image records in order. All rows go in one
+    INSERT ... RETURNING.
+    """
+    embeddings = embeddings or [None] * len(items)
+    thumbnails = thumbnails or [None] * len(items)
+    face_confidences = face_confidences or [None] * len(items)
+    use_cloudinary = _cloudinary_enabled()
+    rows = [
+        _image_row(
+            data, filename, mimetype, user_id,
+            upload_verified_image(data, filename, mimetype, user_id, thumb, use_cloudinary),
+            emb, embedding_model, conf,
+        )
+        for (data, filename, mimetype), emb, thumb, conf in zip(items, embeddings, thumbnails, face_confidences)
+    ]
+    with SessionLocal(expire_on_commit=False) as db:
+        with stage("db_commit"):
+            records = order_like(rows, db.scalars(insert(Image).returning(Image), rows).all())
+            db.commit()
+    return records
+
+
+async def save_verified_batch_async(
+    items: List[Tuple[bytes, str, Optional[str]]],
+    user_id: Optional[str],
+    embeddings: Optional[List[np.ndarray]] = None,
+    embedding_model: Optional[str] = None,
+    thumbnails: Optional[List[Optional[bytes]]] = None,
+    face_confidences: Optional[List[Optional[float]]] = None,
+    run_blocking: Callable[..., Awaitable] = run_in_threadpool,
+) -> List[Image]:
+    """
+    Async save_verified_batch: uploads run concurrently via ``run_blocking``
+    (they are blocking I/O), the insert goes through the async engine without
+    holding a worker thread. Without an async engine the whole sync batch runs
+    via ``run_blocking``.
+    """
+    repo = get_image_repository()
+    if repo is None:
+        return await run_blocking(
+            save_verified_batch, items, user_id, embeddings, embedding_model, thumbnails, face_confidences
+        )
+    embeddings = embeddings or [None] * len(items)
+    thumbnails = thumbnails or [None] * len(items)
+    face_confidences = face_confidences or [None] * len(items)
+    use_cloudinary = await run_blocking(_cloudinary_enabled)
+    paths = await asyncio.gather(*(
+        run_blocking(upload_verified_image, data, filename, mimetype, user_id, thumb, use_cloudinary)
+        for (data, filename, mimetype), thumb in zip(items, thumbnails)
+    ))
+    rows = [
+        _image_row(data, filename, mimetype, user_id, p, emb, embedding_model, conf)
+        for (data, filename, mimetype), p, emb, conf in zip(items, paths, embeddings, face_confidences)
     ]
+    with stage("db_commit"):
+        return await repo.add_many(rows)
@@ -0,0 +1,203 @@
+"""
+Bounded pool of reusable frame buffers for the decode path.
+
+Decoding, resizing, colour conversion and the quality checks each allocate a
+multi-megabyte array per image; with concurrent requests the heap fragments
+and worker RSS creeps up. These stages write into pooled arrays instead
+(OpenCV ``dst=``):
+
+    with FRAME_POOL.lease():
+        frame = frame_buffer((h, w, 3))   # pooled until the lease ends
+        with scratch_buffer((h, w)) as gray:
+            ...                           # back in the pool after the block
+
+Buffers are bucketed by size (quarter steps between powers of two, so one
+buffer serves many frame sizes) and the pool never owns more than
+``max_bytes``: idle buffers of other sizes are dropped first, then requests
+fall back to a plain allocation. Outside a lease ``frame_buffer`` is plain
+``np.empty``, so arrays handed to callers that keep them are never recycled.
+"""
+import resource
+import sys
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from app.config import FRAME_POOL_BYTES
+
+# Smaller arrays are cheap to allocate and not worth pooling
+MIN_POOLED_BYTES = 256 * 1024
+
+
+def bucket_size(nbytes: int) -> int:
+    """Round up to a quarter step of the power of two below ``nbytes`` (<= 25% slack)."""
+    step = 1 << max(0, nbytes.bit_length() - 3)
+    return -(-nbytes // step) * step
+
+
+class BufferPool:
+    """Size-bucketed idle lists of flat uint8 buffers, capped at ``max_bytes`` in total."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._free: Dict[int, List[np.ndarray]] = {}
+        self._lock = threading.Lock()
+        self._pooled_bytes = 0  # owned by the pool: in use + idle
+        self._in_use_bytes = 0
+        self._in_use = 0
+        self._peak_in_use_bytes = 0
+        self._hits = 0
+        self._allocations = 0
+        self._overflows = 0
+        self._evictions = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def _make_room(self, size: int) -> None:
+        """Drop idle buffers, largest first, until ``size`` more bytes fit (lock held)."""
+        for bucket in sorted(self._free, reverse=True):
+            idle = self._free[bucket]
+            while idle and self._pooled_bytes + size > self.max_bytes:
+                idle.pop()
+                self._pooled_bytes -= bucket
+                self._evictions += 1
+            if self._pooled_bytes + size <= self.max_bytes:
+                return
+
+    def acquire(self, nbytes: int) -> Optional[np.ndarray]:
+        """A flat uint8 buffer of at least ``nbytes``, or None when the pool is full."""
+        size = bucket_size(nbytes)
+        with self._lock:
+            idle = self._free.get(size)
+            if idle:
+                buf = idle.pop()
+                self._hits += 1
+            else:
+                if self._pooled_bytes + size > self.max_bytes:
+                    self._make_room(size)
+                if self._pooled_bytes + size > self.max_bytes:
+                    self._overflows += 1
+                    return None
+                buf = None
+                self._pooled_bytes += size
+                self._allocations += 1
+            self._in_use += 1
+            self._in_use_bytes += size
+            self._peak_in_use_bytes = max(self._peak_in_use_bytes, self._in_use_bytes)
+        # Allocate outside the lock; the bytes are already accounted for
+        return np.empty(size, dtype=np.uint8) if buf is None else buf
+
+    def release(self, buf: np.ndarray) -> None:
+        with self._lock:
+            self._in_use -= 1
+            self._in_use_bytes -= buf.nbytes
+            self._free.setdefault(buf.nbytes, []).append(buf)
+
+    @contextmanager
+    def lease(self) -> Iterator[None]:
+        """Scope for ``frame_buffer``: everything handed out is returned on exit."""
+        held: List[np.ndarray] = []
+        token = _current_lease.set((self, held))
+        try:
+            yield
+        finally:
+            _current_lease.reset(token)
+            for buf in held:
+                self.release(buf)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            idle = sum(len(v) for v in self._free.values())
+            return {
+                "max_bytes": self.max_bytes,
+                "pooled_bytes": self._pooled_bytes,
+                "in_use_bytes": self._in_use_bytes,
+                "idle_bytes": self._pooled_bytes - self._in_use_bytes,
+                "peak_in_use_bytes": self._peak_in_use_bytes,
+                "occupancy": round(self._in_use_bytes / self.max_bytes, 4) if self.max_bytes else None,
+                "buffers_in_use": self._in_use,
+                "buffers_idle": idle,
+                "hits": self._hits,
+                "allocations": self._allocations,
+                "overflows": self._overflows,
+                "evictions": self._evictions,
+            }
+
+
+FRAME_POOL = BufferPool(FRAME_POOL_BYTES)
+
+_current_lease: ContextVar[Optional[Tuple[BufferPool, List[np.ndarray]]]] = ContextVar(
+    "frame_lease", default=None
+)
+
+
+def _take(shape: Tuple[int, ...], dtype) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    """(array, pooled buffer backing it or None)."""
+    dtype = np.dtype(dtype)
+    nbytes = int(np.prod(shape)) * dtype.itemsize
+    lease = _current_lease.get()
+    if lease is None or nbytes < MIN_POOLED_BYTES or not lease[0].enabled:
+        return np.empty(shape, dtype=dtype), None
+    buf = lease[0].acquire(nbytes)
+    if buf is None:
+        return np.empty(shape, dtype=dtype), None
+    return buf[:nbytes].view(dtype).reshape(shape), buf
+
+
+def frame_buffer(shape: Tuple[int, ...], dtype=np.uint8) -> np.ndarray:
+    """Uninitialized array, pooled for the rest of the current lease (np.empty outside one)."""
+    array, buf = _take(shape, dtype)
+    if buf is not None:
+        _current_lease.get()[1].append(buf)
+    return array
+
+
+def release_frame(array: np.ndarray) -> None:
+    """Return a ``frame_buffer`` array to the pool before the lease ends; no-op for others."""
+    lease = _current_lease.get()
+    if lease is None:
+        return
+    pool, held = lease
+    for i, buf in enumerate(held):
+        if array.base is buf:
+            pool.release(held.pop(i))
+            return
+
+
+@contextmanager
+def scratch_buffer(shape: Tuple[int, ...], dtype=np.uint8) -> Iterator[np.ndarray]:
+    """Temporary array, back in the pool as soon as the block exits."""
+    array, buf = _take(shape, dtype)
+    try:
+        yield array
+    finally:
+        if buf is not None:
+            _current_lease.get()[0].release(buf)
+
+
+def process_memory() -> Dict[str, Optional[float]]:
+    """Current and peak resident set size of this process, in MB."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    peak_mb = peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+    try:
+        with open("/proc/self/statm") as f:
+            rss_mb = int(f.read().split()[1]) * resource.getpagesize() / (1024 * 1024)
+        # ru_maxrss is updated lazily; never report a peak below the current value
+        peak_mb = max(peak_mb, rss_mb)
+    except (OSError, ValueError, IndexError):
+        rss_mb = None
+    return {
+        "rss_mb": round(rss_mb, 1) if rss_mb is not None else None,
+        "peak_rss_mb": round(peak_mb, 1),
+    }
+
+
+def memory_info() -> Dict[str, Any]:
+    """Process RSS plus frame pool occupancy (reported by /api/health)."""
+    return {**process_memory(), "frame_pool": FRAME_POOL.stats()}
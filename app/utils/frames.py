@@ -0,0 +1,49 @@
+"""
+Length-prefixed framing of several images in one binary request body
+(``POST /api/verify-raw``):
+
+    b"FVF1" | count: u32 | count x length: u32 | image bytes, back to back
+
+Integers are little-endian. ``split_frames`` returns memoryviews into the
+body, so the images reach hashing and the decoder without being copied.
+"""
+import struct
+from typing import List, Sequence, Union
+
+FRAMES_MAGIC = b"FVF1"
+FRAMES_MEDIA_TYPE = "application/x-face-verify-frames"
+_COUNT = struct.Struct("<I")
+_HEADER = len(FRAMES_MAGIC) + _COUNT.size
+
+
+def encode_frames(images: Sequence[bytes]) -> bytes:
+    """Request body for ``images`` (client side)."""
+    lengths = struct.pack(f"<{len(images)}I", *(len(image) for image in images))
+    return b"".join([FRAMES_MAGIC, _COUNT.pack(len(images)), lengths, *images])
+
+
+def split_frames(body: Union[bytes, bytearray, memoryview], max_count: int) -> List[memoryview]:
+    """
+    Images of a framed body, as views into it.
+
+    Raises:
+        ValueError: bad magic, count outside 1..max_count, or lengths that
+            do not add up to the body size
+    """
+    view = memoryview(body)
+    if len(view) < _HEADER or view[:len(FRAMES_MAGIC)] != FRAMES_MAGIC:
+        raise ValueError(f"Body is not in {FRAMES_MEDIA_TYPE} framing")
+    (count,) = _COUNT.unpack_from(view, len(FRAMES_MAGIC))
+    if not 0 < count <= max_count:
+        raise ValueError(f"Frame count {count} outside 1..{max_count}")
+    start = _HEADER + 4 * count
+    if len(view) < start:
+        raise ValueError("Truncated frame header")
+    lengths = struct.unpack_from(f"<{count}I", view, _HEADER)
+    if start + sum(lengths) != len(view):
+        raise ValueError(f"Frame lengths add up to {start + sum(lengths)} bytes, body has {len(view)}")
+    frames = []
+    for length in lengths:
+        frames.append(view[start:start + length])
+        start += length
+    return frames
@@ -1,19 +1,117 @@
+import hashlib
 import io
 import logging
+import math
+import struct
 from typing import Optional, Tuple
 
 import cv2
 import numpy as np
 from PIL import Image
 
+from app.config import MAX_IMAGE_PIXELS, MAX_IMAGE_SIZE_BYTES
+from .buffer_pool import frame_buffer
+
 logger = logging.getLogger(__name__)
 
 
+# JPEG start-of-frame markers (baseline, progressive, lossless, arithmetic)
+_JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+_JPEG_STANDALONE_MARKERS = {0x01, 0xD0, 0xD1, 0xD2, 0xD3, 0xD4, 0xD5, 0xD6, 0xD7, 0xD8}
+_PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+
+class _BufferReader(io.RawIOBase):
+    """Seekable read-only file over a bytes-like object, without copying it"""
+
+    def __init__(self, data):
+        self._view = memoryview(data).cast("B")
+        self._pos = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._pos
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self._pos, io.SEEK_END: len(self._view)}[whence]
+        self._pos = max(0, base + offset)
+        return self._pos
+
+    def readinto(self, b) -> int:
+        chunk = self._view[self._pos:self._pos + len(b)]
+        b[:len(chunk)] = chunk
+        self._pos += len(chunk)
+        return len(chunk)
+
+
 class ImageProcessor:
     """Handle image preprocessing and validation"""
     
-    MAX_FILE_SIZE = 10 * 1024 * 1024  # 10MB
+    MAX_FILE_SIZE = MAX_IMAGE_SIZE_BYTES
+    MAX_PIXELS = MAX_IMAGE_PIXELS
     ALLOWED_FORMATS = ['JPEG', 'JPG', 'PNG']
+    # Context around the face box in stored thumbnails, per side
+    FACE_THUMBNAIL_MARGIN = 0.2
+    
+    @staticmethod
+    def content_hash(image_bytes: bytes) -> str:
+        """Stable hex digest of the raw upload bytes (cache and dedup key)."""
+        return hashlib.blake2b(image_bytes, digest_size=16).hexdigest()
+    
+    @staticmethod
+    def sniff_header(data: bytes) -> Optional[Tuple[str, int, int]]:
+        """
+        Read format and pixel dimensions from the start of a JPEG/PNG file
+        without decoding it.
+        
+        Args:
+            data: Leading bytes of the file (may be a partial upload)
+            
+        Returns:
+            (format, width, height), or None if more bytes are needed
+            
+        Raises:
+            ValueError: if the data is not a JPEG or PNG
+        """
+        if len(data) < 8:
+            return None
+        if data[:8] == _PNG_SIGNATURE:
+            if len(data) < 24:
+                return None
+            if data[12:16] != b"IHDR":
+                raise ValueError("Corrupted PNG header")
+            width, height = struct.unpack(">II", data[16:24])
+            return "PNG", width, height
+        if data[:2] != b"\xff\xd8":
+            raise ValueError(f"Format not allowed. Use: {ImageProcessor.ALLOWED_FORMATS}")
+        # Walk JPEG marker segments until the start-of-frame
+        i = 2
+        while True:
+            if i + 4 > len(data):
+                return None
+            if data[i] != 0xFF:
+                raise ValueError("Corrupted JPEG header")
+            marker = data[i + 1]
+            if marker == 0xFF:  # fill byte
+                i += 1
+                continue
+            if marker in _JPEG_STANDALONE_MARKERS:
+                i += 2
+                continue
+            if marker == 0xDA:  # start of scan before any frame header
+                raise ValueError("Corrupted JPEG header")
+            if marker in _JPEG_SOF_MARKERS:
+                if i + 9 > len(data):
+                    return None
+                height, width = struct.unpack(">HH", data[i + 5:i + 9])
+                return "JPEG", width, height
+            (seg_len,) = struct.unpack(">H", data[i + 2:i + 4])
+            i += 2 + seg_len
     
     @staticmethod
     def bytes_to_numpy(image_bytes: bytes) -> Optional[np.ndarray]:
@@ -21,7 +119,7 @@ class ImageProcessor:
         Convert image bytes to numpy array (BGR format for OpenCV)
         
         Args:
-            image_bytes: Raw image bytes
+            image_bytes: Raw image bytes (or a memoryview of them)
             
         Returns:
             numpy array in BGR format or None if invalid
@@ -31,22 +129,29 @@ class ImageProcessor:
             if len(image_bytes) > ImageProcessor.MAX_FILE_SIZE:
                 raise ValueError(f"Image size exceeds {ImageProcessor.MAX_FILE_SIZE / (1024*1024)}MB")
             
-            # Open with PIL for format validation
-            pil_image = Image.open(io.BytesIO(image_bytes))
+            # Open with PIL for format validation (reads the header only);
+            # BytesIO shares a bytes object but would copy any other buffer
+            source = io.BytesIO(image_bytes) if isinstance(image_bytes, bytes) else _BufferReader(image_bytes)
+            pil_image = Image.open(source)
             
             # Validate format
             if pil_image.format not in ImageProcessor.ALLOWED_FORMATS:
                 raise ValueError(f"Format {pil_image.format} not allowed. Use: {ImageProcessor.ALLOWED_FORMATS}")
             
+            # Reject decompression bombs before decoding pixels
+            width, height = pil_image.size
+            if width * height > ImageProcessor.MAX_PIXELS:
+                raise ValueError(f"Image dimensions {width}x{height} exceed {ImageProcessor.MAX_PIXELS} pixels")
+            
             # Convert to RGB then to numpy
             if pil_image.mode != 'RGB':
                 pil_image = pil_image.convert('RGB')
             
-            # Convert to numpy array (RGB)
-            img_array = np.array(pil_image)
+            # Read-only numpy view of the decoded RGB pixels (no extra copy)
+            img_array = np.asarray(pil_image)
             
-            # Convert RGB to BGR for OpenCV
-            img_bgr = cv2.cvtColor(img_array, cv2.COLOR_RGB2BGR)
+            # Convert RGB to BGR for OpenCV, into a pooled frame
+            img_bgr = cv2.cvtColor(img_array, cv2.COLOR_RGB2BGR, dst=frame_buffer(img_array.shape))
             
             return img_bgr
             
@@ -78,9 +183,110 @@ class ImageProcessor:
             new_width = max_dimension
             new_height = int(height * (max_dimension / width))
         
-        resized = cv2.resize(image, (new_width, new_height), interpolation=cv2.INTER_AREA)
+        resized = cv2.resize(
+            image,
+            (new_width, new_height),
+            dst=frame_buffer((new_height, new_width) + image.shape[2:], image.dtype),
+            interpolation=cv2.INTER_AREA,
+        )
         return resized
     
+    @staticmethod
+    def face_thumbnail(
+        image: np.ndarray,
+        bbox,
+        eyes=None,
+        size: int = 160,
+        margin: float = FACE_THUMBNAIL_MARGIN,
+    ) -> np.ndarray:
+        """
+        Square face crop, rotated so the eyes are level, resized to size x size
+        
+        Args:
+            image: Full image (any 3-channel order; output keeps it)
+            bbox: Face box [x1, y1, x2, y2] in image coordinates
+            eyes: Optional two (x, y) eye centers used for alignment
+            size: Output side in pixels
+            margin: Extra context around the face box, per side, as a fraction of its longer side
+            
+        Returns:
+            size x size crop
+        """
+        x1, y1, x2, y2 = (float(v) for v in bbox)
+        cx, cy = (x1 + x2) / 2, (y1 + y2) / 2
+        side = max(x2 - x1, y2 - y1) * (1 + 2 * margin)
+        if side <= 0:
+            raise ValueError("Empty face box")
+        angle = 0.0
+        if eyes:
+            (ax, ay), (bx, by) = sorted(eyes)
+            angle = math.degrees(math.atan2(by - ay, bx - ax))
+        
+        # Cut out just enough to cover the rotated square (side * sqrt(2) / 2)
+        height, width = image.shape[:2]
+        half = side * 0.75
+        rx1, ry1 = max(0, int(cx - half)), max(0, int(cy - half))
+        rx2, ry2 = min(width, int(cx + half) + 1), min(height, int(cy + half) + 1)
+        region = image[ry1:ry2, rx1:rx2]
+        rcx, rcy = cx - rx1, cy - ry1
+        scale = size / side
+        if scale < 1.0:
+            # Area-average the downscale; the warp below only rotates and crops
+            region = cv2.resize(region, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+            rcx, rcy, scale = rcx * scale, rcy * scale, 1.0
+        
+        matrix = cv2.getRotationMatrix2D((rcx, rcy), angle, scale)
+        matrix[0, 2] += size / 2 - rcx
+        matrix[1, 2] += size / 2 - rcy
+        return cv2.warpAffine(
+            region, matrix, (size, size), flags=cv2.INTER_LINEAR, borderMode=cv2.BORDER_REPLICATE
+        )
+    
+    @staticmethod
+    def thumbnail_face_region(thumbnail: np.ndarray, margin: float = FACE_THUMBNAIL_MARGIN) -> np.ndarray:
+        """Center crop of a face thumbnail back to the face box (drops the margin)"""
+        size = thumbnail.shape[0]
+        inner = int(round(size / (1 + 2 * margin)))
+        start = (size - inner) // 2
+        return thumbnail[start:start + inner, start:start + inner]
+    
+    @staticmethod
+    def encode_webp(image: np.ndarray, quality: int = 90) -> bytes:
+        """Encode a BGR image as WebP"""
+        ok, buf = cv2.imencode(".webp", image, [cv2.IMWRITE_WEBP_QUALITY, quality])
+        if not ok:
+            raise ValueError("WebP encoding failed")
+        return buf.tobytes()
+
+    @staticmethod
+    def recompress_jpeg(image_bytes: bytes, max_dimension: int = 1920, quality: int = 85) -> bytes:
+        """
+        Re-encode a stored image as JPEG with its long side capped
+
+        Keeps the EXIF (orientation) and ICC profile, so the result displays
+        like the original; JPEGs are decoded at a reduced scale when possible.
+
+        Args:
+            image_bytes: Encoded image (any format PIL reads)
+            max_dimension: Maximum width or height
+            quality: JPEG quality
+
+        Returns:
+            JPEG bytes
+        """
+        pil_image = Image.open(io.BytesIO(image_bytes))
+        width, height = pil_image.size
+        if width * height > ImageProcessor.MAX_PIXELS:
+            raise ValueError(f"Image dimensions {width}x{height} exceed {ImageProcessor.MAX_PIXELS} pixels")
+        extra = {k: pil_image.info[k] for k in ("exif", "icc_profile") if pil_image.info.get(k)}
+        pil_image.draft("RGB", (max_dimension, max_dimension))
+        if pil_image.mode != 'RGB':
+            pil_image = pil_image.convert('RGB')
+        pil_image.thumbnail((max_dimension, max_dimension), Image.Resampling.LANCZOS)
+        out = io.BytesIO()
+        pil_image.save(out, "JPEG", quality=quality, optimize=True, **extra)
+        return out.getvalue()
+
     @staticmethod
     def compute_blur_score(image: np.ndarray) -> float:
         """
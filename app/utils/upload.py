@@ -0,0 +1,175 @@
+"""
+Upload ingestion with early limits.
+
+- ``MaxBodySizeMiddleware`` rejects oversized request bodies from the
+  Content-Length header, or while the body is streaming in, before
+  multipart parsing buffers it. This is the only limit applied while bytes
+  arrive.
+- ``read_image_upload`` reads an uploaded file in chunks, enforcing the
+  per-image byte limit and sniffing format/dimensions from the first bytes,
+  so oversized and decompression-bomb images never reach the decoder. It
+  runs in the handler, after FastAPI has spooled the whole form (large parts
+  go to temp files), so the upload has already been received by then.
+- ``check_image_bytes`` applies the same limits to image bytes that did not
+  arrive as an upload (bulk archives, stored images, local files).
+- ``read_request_body`` reads a raw (non-multipart) body into one buffer.
+"""
+from typing import Dict, Optional
+
+from fastapi import HTTPException, Request, UploadFile
+from starlette.responses import JSONResponse
+
+from app.config import MAX_IMAGE_SIZE_BYTES, MAX_IMAGE_SIZE_MB
+from app.services.metrics import record_rejection
+from app.utils.image_utils import ImageProcessor
+
+CHUNK_SIZE = 64 * 1024
+# JPEG metadata (EXIF/ICC) can push the frame header this far into the file
+HEADER_PROBE_BYTES = 512 * 1024
+
+
+class MaxBodySizeMiddleware:
+    """ASGI middleware capping the request body size."""
+
+    def __init__(self, app, max_bytes: int, path_limits: Optional[Dict[str, int]] = None):
+        self.app = app
+        self.max_bytes = max_bytes
+        # per-path overrides, e.g. a larger limit for bulk archives
+        self.path_limits = path_limits or {}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        max_bytes = self.path_limits.get(scope["path"], self.max_bytes)
+
+        for name, value in scope.get("headers", []):
+            if name == b"content-length":
+                try:
+                    too_large = int(value) > max_bytes
+                except ValueError:
+                    too_large = False
+                if too_large:
+                    record_rejection("too_large")
+                    response = JSONResponse(
+                        status_code=413,
+                        content={"detail": f"Request body exceeds {max_bytes} bytes"},
+                    )
+                    await response(scope, receive, send)
+                    return
+                break
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > max_bytes:
+                    record_rejection("too_large")
+                    # HTTPException passes through FastAPI's body parsing unchanged
+                    raise HTTPException(
+                        status_code=413,
+                        detail=f"Request body exceeds {max_bytes} bytes",
+                    )
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+
+def _reject(status_code: int, reason: str, detail: str) -> HTTPException:
+    record_rejection(reason)
+    return HTTPException(status_code=status_code, detail=detail)
+
+
+async def read_image_upload(upload: UploadFile, name: str) -> bytes:
+    """
+    Read a spooled upload in chunks, enforcing MAX_IMAGE_SIZE_BYTES and
+    MAX_IMAGE_PIXELS as soon as the bytes/header allow (before the rest of
+    the file is copied into memory or decoded).
+
+    Raises:
+        HTTPException: 413 for oversized files or dimensions, 400 for
+            unsupported or corrupted headers
+    """
+    too_large = f"{name}: Image size exceeds {MAX_IMAGE_SIZE_MB}MB"
+    if upload.size is not None and upload.size > MAX_IMAGE_SIZE_BYTES:
+        raise _reject(413, "too_large", too_large)
+
+    buf = bytearray()
+    header = None
+    while True:
+        chunk = await upload.read(CHUNK_SIZE)
+        if not chunk:
+            break
+        if len(buf) + len(chunk) > MAX_IMAGE_SIZE_BYTES:
+            raise _reject(413, "too_large", too_large)
+        buf += chunk
+        if header is None:
+            try:
+                header = ImageProcessor.sniff_header(buf)
+            except ValueError as e:
+                raise _reject(400, "invalid_image", f"{name}: {e}")
+            if header is None and len(buf) >= HEADER_PROBE_BYTES:
+                raise _reject(400, "invalid_image", f"{name}: Unrecognized image header")
+            if header is not None:
+                _, width, height = header
+                if width * height > ImageProcessor.MAX_PIXELS:
+                    raise _reject(
+                        413,
+                        "too_large",
+                        f"{name}: Image dimensions {width}x{height} exceed {ImageProcessor.MAX_PIXELS} pixels",
+                    )
+
+    if header is None:
+        raise _reject(400, "invalid_image", f"{name}: Invalid image format")
+    return bytes(buf)
+
+
+def check_image_bytes(data: bytes, name: str) -> bytes:
+    """``read_image_upload``'s size, format and pixel limits for bytes already in memory."""
+    if len(data) > MAX_IMAGE_SIZE_BYTES:
+        raise _reject(413, "too_large", f"{name}: Image size exceeds {MAX_IMAGE_SIZE_MB}MB")
+    try:
+        header = ImageProcessor.sniff_header(data[:HEADER_PROBE_BYTES])
+    except ValueError as e:
+        raise _reject(400, "invalid_image", f"{name}: {e}")
+    if header is None:
+        raise _reject(400, "invalid_image", f"{name}: Invalid image format")
+    _, width, height = header
+    if width * height > ImageProcessor.MAX_PIXELS:
+        raise _reject(
+            413,
+            "too_large",
+            f"{name}: Image dimensions {width}x{height} exceed {ImageProcessor.MAX_PIXELS} pixels",
+        )
+    return data
+
+
+async def read_request_body(request: Request) -> bytearray:
+    """
+    The whole request body in one buffer, preallocated from Content-Length so
+    each chunk is copied once (no chunk list + join). The size limit is
+    MaxBodySizeMiddleware's.
+    """
+    try:
+        expected = int(request.headers.get("content-length", ""))
+    except ValueError:
+        expected = None
+    if expected is None:
+        body = bytearray()
+        async for chunk in request.stream():
+            body += chunk
+        return body
+    body = bytearray(expected)
+    view = memoryview(body)
+    received = 0
+    async for chunk in request.stream():
+        if received + len(chunk) > expected:
+            raise HTTPException(status_code=400, detail="Request body longer than Content-Length")
+        view[received:received + len(chunk)] = chunk
+        received += len(chunk)
+    if received != expected:
+        raise HTTPException(status_code=400, detail="Request body shorter than Content-Length")
+    return body